@@ -0,0 +1,270 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+###############################
+# Asynchronous network engine #
+###############################
+
+# Runs network I/O of work source modules on a single asyncio event loop instead of
+# one thread per request. The rest of MPBM is threaded, so requests are handed to the
+# loop from any thread and their results come back as concurrent.futures.Future objects.
+# Future callbacks run on the loop thread and must not block. Anything that calls back
+# into the core (which takes locks) should be passed to dispatch() instead.
+# This module requires Python 3, it is only imported if a work source asks for it.
+
+
+import common
+import time
+import socket
+import asyncio
+import threading
+import collections
+import concurrent.futures
+import queue
+import http.client
+
+
+class AsyncEngine(object):
+  def __init__(self, miner):
+    self.miner = miner
+    self.loop = asyncio.new_event_loop()
+    self.dispatchqueue = queue.Queue()
+    self.loopthread = threading.Thread(None, self.runloop, "asyncengine")
+    self.loopthread.daemon = True
+    self.loopthread.start()
+    self.dispatcherthread = threading.Thread(None, self.dispatcher, "asyncengine_dispatcher")
+    self.dispatcherthread.daemon = True
+    self.dispatcherthread.start()
+
+  def runloop(self):
+    asyncio.set_event_loop(self.loop)
+    self.loop.run_forever()
+
+  # Schedules a coroutine on the loop, returns a concurrent.futures.Future
+  def submit(self, coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+  def calllater(self, delay, function, *args):
+    self.loop.call_soon_threadsafe(self.loop.call_later, delay, function, *args)
+
+  # Runs a function on the dispatcher thread, which may block without stalling the loop
+  def dispatch(self, function, *args):
+    self.dispatchqueue.put((function, args))
+
+  def dispatcher(self):
+    while True:
+      (function, args) = self.dispatchqueue.get()
+      try: function(*args)
+      except Exception as e:
+        self.miner.log("Async engine: Error in %s: %s\n" % (getattr(function, "__name__", function), e), "rB")
+
+  def completed(self, result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+  # Returns a future for function(result of future). If the function returns
+  # another future, the returned future completes when that one does.
+  def then(self, future, function):
+    chained = concurrent.futures.Future()
+    def forward(source):
+      try: chained.set_result(source.result())
+      except Exception as e: chained.set_exception(e)
+    def done(source):
+      try: result = function(source.result())
+      except Exception as e: return chained.set_exception(e)
+      if isinstance(result, concurrent.futures.Future): result.add_done_callback(forward)
+      else: chained.set_result(result)
+    future.add_done_callback(done)
+    return chained
+
+  # Creates a resolver whose periodic refreshes are scheduled on the loop
+  # (and run in the loop's executor), instead of having a thread of its own
+  def createresolver(self, host, port, ttl = 300):
+    resolver = common.Resolver(host, port, ttl, refresh = False)
+    def refresh():
+      self.loop.run_in_executor(None, resolver.resolve).add_done_callback(lambda future: future.exception())
+      self.loop.call_later(ttl, refresh)
+    self.loop.call_soon_threadsafe(refresh)
+    return resolver
+
+
+enginelock = threading.Lock()
+engine = None
+
+# All work sources share a single engine
+def getengine(miner):
+  global engine
+  with enginelock:
+    if engine == None: engine = AsyncEngine(miner)
+    return engine
+
+
+class AsyncHTTPResponse(object):
+  def __init__(self, version, status, reason, headers):
+    self.version = version
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    connection = self.getheader("Connection", "").lower()
+    self.will_close = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+
+  def getheader(self, name, default = None):
+    name = name.lower()
+    for h in self.headers:
+      if h[0].lower() == name: return h[1]
+    return default
+
+  def getheaders(self):
+    return list(self.headers)
+
+
+# Same interface and statistics as common.HTTPConnectionPool, but requests run on the engine's loop.
+# request() blocks the calling thread and must not be used from the loop thread itself.
+class AsyncHTTPConnectionPool(object):
+  def __init__(self, engine, host, port, maxidle = 4, idletime = 60, resolver = None):
+    self.engine = engine
+    self.host = host
+    self.port = int(port)
+    self.resolver = resolver
+    self.maxidle = maxidle
+    self.idletime = idletime
+    self.idle = collections.deque()
+    self.requests = 0
+    self.reused = 0
+    self.connects = 0
+    self.latency = common.LatencyMeter()
+
+  def request(self, method, path, body, headers, timeout, fresh = False):
+    return self.requestfuture(method, path, body, headers, timeout, fresh).result()
+
+  # Returns a future for the (response, data) tuple
+  def requestfuture(self, method, path, body, headers, timeout, fresh = False):
+    return self.engine.submit(self.asyncrequest(method, path, body, headers, timeout, fresh))
+
+  def close(self):
+    self.engine.loop.call_soon_threadsafe(self.closeidle)
+
+  def closeidle(self):
+    for reader, writer, lastused in self.idle: writer.close()
+    self.idle.clear()
+
+  async def asyncrequest(self, method, path, body, headers, timeout, fresh):
+    starttime = time.time()
+    while True:
+      (reader, writer, reused) = await self.acquire(timeout, fresh)
+      try:
+        (response, data) = await asyncio.wait_for(self.exchange(reader, writer, method, path, body, headers), timeout)
+        break
+      except BaseException as e:
+        writer.close()
+        # Retry if a kept alive connection turned out to be dead, ending up on a fresh one
+        if not reused or not common.deadconnection(e): raise
+    self.requests = self.requests + 1
+    if reused: self.reused = self.reused + 1
+    self.latency.record(time.time() - starttime)
+    if response.will_close or len(self.idle) >= self.maxidle: writer.close()
+    else: self.idle.append((reader, writer, time.time()))
+    return (response, data)
+
+  async def acquire(self, timeout, fresh):
+    while len(self.idle) > 0 and not fresh:
+      (reader, writer, lastused) = self.idle.pop()
+      # The server may have closed the connection while it was idle
+      if time.time() - lastused < self.idletime and not reader.at_eof() and not writer.is_closing():
+        return (reader, writer, True)
+      writer.close()
+    self.connects = self.connects + 1
+    (reader, writer) = await self.connect(timeout)
+    return (reader, writer, False)
+
+  # Same as common.Resolver.connect: connects to all known addresses of the host,
+  # starting a new attempt every stagger seconds, and uses the first one that succeeds.
+  async def connect(self, timeout):
+    if self.resolver == None:
+      return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+    loop = asyncio.get_event_loop()
+    error = None
+    with self.resolver.lock: known = len(self.resolver.addresses) > 0
+    # The lookup blocks, so it runs on the executor, also when falling back after a failure
+    if not known:
+      try: await loop.run_in_executor(None, self.resolver.resolve)
+      except Exception as e: error = e
+    addresses = self.resolver.knownaddresses()
+    deadline = loop.time() + timeout
+    pending = {}
+    try:
+      while True:
+        if len(addresses) > 0:
+          (family, address) = addresses.pop(0)
+          pending[asyncio.ensure_future(asyncio.open_connection(address[0], address[1], family = family))] = (family, address)
+        if len(pending) == 0: raise error if error != None else socket.error("No known addresses for %s" % self.host)
+        wait = deadline - loop.time()
+        if wait <= 0: raise socket.timeout("Connection to %s timed out" % self.host)
+        if len(addresses) > 0: wait = min(wait, self.resolver.stagger)
+        (done, notdone) = await asyncio.wait(list(pending), timeout = wait, return_when = asyncio.FIRST_COMPLETED)
+        winner = None
+        for task in done:
+          address = pending.pop(task)
+          if task.exception() != None: error = task.exception()
+          elif winner == None: winner = (task.result(), address)
+          else: task.result()[1].close()
+        if winner != None:
+          with self.resolver.lock: self.resolver.lastgood = winner[1]
+          return winner[0]
+    finally:
+      for task in pending: task.cancel()
+
+  async def exchange(self, reader, writer, method, path, body, headers):
+    lines = ["%s %s HTTP/1.1" % (method, path)]
+    names = [name.lower() for name in headers]
+    if "host" not in names: lines.append("Host: %s:%d" % (self.host, self.port))
+    if body != None and "content-length" not in names: lines.append("Content-Length: %d" % len(body))
+    for name, value in headers.items(): lines.append("%s: %s" % (name, value))
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin_1") + (body if body != None else b""))
+    await writer.drain()
+    statusline = await reader.readline()
+    if len(statusline) == 0: raise http.client.RemoteDisconnected("Connection closed by %s" % self.host)
+    parts = statusline.decode("latin_1").strip().split(" ", 2)
+    headers = []
+    while True:
+      line = await reader.readline()
+      if line.strip() == b"": break
+      (name, value) = line.decode("latin_1").split(":", 1)
+      headers.append((name.strip(), value.strip()))
+    response = AsyncHTTPResponse(parts[0], int(parts[1]), parts[2] if len(parts) > 2 else "", headers)
+    length = response.getheader("Content-Length")
+    if method == "HEAD" or response.status in (204, 304) or response.status < 200: data = b""
+    elif "chunked" in response.getheader("Transfer-Encoding", "").lower():
+      chunks = []
+      while True:
+        size = int((await reader.readline()).split(b";", 1)[0].strip(), 16)
+        if size == 0: break
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+      # Skip trailers
+      while (await reader.readline()).strip() != b"": pass
+      data = b"".join(chunks)
+    elif length != None: data = await reader.readexactly(int(length))
+    else:
+      data = await reader.read()
+      response.will_close = True
+    return (response, data)
@@ -25,8 +25,445 @@
 
 
 import binascii
+import copy
 import struct
 import hashlib
+import hmac
+import os
+import threading
+import collections
+import select
+import socket
+import errno
+import time
+try: import http.client as http_client
+except ImportError: import httplib as http_client
+
+sha256k = [ \
+  0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5, \
+  0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174, \
+  0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da, \
+  0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967, \
+  0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85, \
+  0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070, \
+  0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3, \
+  0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2, \
+]
+sha256iv = [0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]
+
+def rotr(x, n):
+  return ((x >> n) | (x << (32 - n))) & 0xffffffff
+
+# Runs the SHA256 compression function on a single 64 byte block
+def sha256compress(state, block):
+  w = list(struct.unpack(">16I", block))
+  for i in range(16, 64):
+    s0 = rotr(w[i - 15], 7) ^ rotr(w[i - 15], 18) ^ (w[i - 15] >> 3)
+    s1 = rotr(w[i - 2], 17) ^ rotr(w[i - 2], 19) ^ (w[i - 2] >> 10)
+    w.append((w[i - 16] + s0 + w[i - 7] + s1) & 0xffffffff)
+  (a, b, c, d, e, f, g, h) = state
+  for i in range(64):
+    t1 = (h + (rotr(e, 6) ^ rotr(e, 11) ^ rotr(e, 25)) + ((e & f) ^ (~e & g)) + sha256k[i] + w[i]) & 0xffffffff
+    t2 = ((rotr(a, 2) ^ rotr(a, 13) ^ rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))) & 0xffffffff
+    (a, b, c, d, e, f, g, h) = ((t1 + t2) & 0xffffffff, a, b, c, (d + t1) & 0xffffffff, e, f, g)
+  return [(x + y) & 0xffffffff for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+# Calculates the midstate for work data in getwork byte order
+def midstate(data):
+  return struct.pack("<8I", *sha256compress(sha256iv, struct.pack("<16I", *struct.unpack(">16I", data[:64]))))
+
+def doublesha256(data):
+  return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+targetcache = {}
+targetlock = threading.Lock()
+
+def difficulty(value):
+  return 65535. * 2**48 / max(1, value >> 160)
+
+# Decodes the network target from the compact representation (nBits) in work data
+def blocktarget(data):
+  bits = struct.unpack(">I", data[72:76])[0]
+  shift = 8 * ((bits >> 24) - 3)
+  return (bits & 0x7fffff) << shift if shift >= 0 else (bits & 0x7fffff) >> -shift
+
+def targetinfo(target):
+  with targetlock:
+    info = targetcache.get(target)
+    if info == None:
+      if len(targetcache) >= 256: targetcache.clear()
+      value = int(binascii.hexlify(target[::-1]), 16)
+      info = (value, difficulty(value))
+      targetcache[target] = info
+    return info
+
+class LatencyMeter(object):
+  def __init__(self, weight = 0.05, window = 100):
+    self.lock = threading.Lock()
+    self.weight = weight
+    self.count = 0
+    self.average = 0
+    self.maximum = 0
+    self.samples = collections.deque(maxlen = window)
+    # Percentiles are asked for much more often than samples come in
+    self.percentiles = {}
+
+  def record(self, seconds):
+    with self.lock:
+      if self.count == 0: self.average = seconds
+      else: self.average = (1 - self.weight) * self.average + self.weight * seconds
+      self.maximum = max(self.maximum, seconds)
+      self.count = self.count + 1
+      self.samples.append(seconds)
+      self.percentiles = {}
+
+  def percentile(self, percent):
+    with self.lock:
+      if percent in self.percentiles: return self.percentiles[percent]
+      samples = sorted(self.samples)
+      result = samples[int(round((len(samples) - 1) * percent / 100.))] if len(samples) > 0 else 0
+      self.percentiles[percent] = result
+    return result
+
+# Closed: requests flow normally. Open: the work source is not used until the
+# open time has passed. Half open: a single probe is running, its outcome
+# decides whether we close again or stay open for twice as long.
+class CircuitBreaker(object):
+  def __init__(self, threshold = 3, opentime = 5, maxopentime = 300):
+    self.lock = threading.Lock()
+    self.threshold = threshold
+    self.minopentime = opentime
+    self.maxopentime = maxopentime
+    self.opentime = opentime
+    self.state = "closed"
+    self.failures = 0
+    self.openuntil = 0
+    self.trips = 0
+
+  def available(self):
+    return self.state == "closed"
+
+  def probedue(self):
+    with self.lock:
+      if self.state != "open" or time.time() < self.openuntil: return False
+      self.state = "halfopen"
+      return True
+
+  def success(self):
+    with self.lock:
+      self.state = "closed"
+      self.failures = 0
+      self.opentime = self.minopentime
+
+  def failure(self):
+    with self.lock:
+      self.failures = self.failures + 1
+      if self.state == "halfopen":
+        self.opentime = min(self.maxopentime, self.opentime * 2)
+      elif self.state == "open" or self.failures < self.threshold: return False
+      else: self.trips = self.trips + 1
+      self.state = "open"
+      self.openuntil = time.time() + self.opentime
+      return True
+
+# Limits the number of concurrent work requests to a work source (AIMD, like TCP congestion
+# control). Every request that comes back in time raises the limit by 1/limit, i.e. by about
+# one per round of requests. A request that failed or took longer than slowlatency halves it.
+# Only one decrease per round is made, requests that were started before the last decrease
+# were affected by the same congestion.
+class ConcurrencyLimiter(object):
+  def __init__(self, initial = 4, maximum = 32, slowlatency = 1):
+    self.lock = threading.Lock()
+    self.limit = float(initial)
+    self.maximum = maximum
+    self.slowlatency = slowlatency
+    self.inflight = 0
+    self.lastdecrease = 0
+    self.decreases = 0
+
+  def available(self):
+    return self.inflight < int(self.limit)
+
+  # Returns a token that needs to be passed to success() or failure()
+  def acquire(self):
+    with self.lock: self.inflight = self.inflight + 1
+    return time.time()
+
+  # Returns a slot without a verdict, e.g. if no request was sent
+  def release(self):
+    with self.lock: self.inflight = self.inflight - 1
+
+  def success(self, starttime):
+    with self.lock:
+      self.inflight = self.inflight - 1
+      if time.time() - starttime > self.slowlatency: self.congested(starttime)
+      else: self.limit = min(self.maximum, self.limit + 1. / self.limit)
+
+  def failure(self, starttime):
+    with self.lock:
+      self.inflight = self.inflight - 1
+      self.congested(starttime)
+
+  def congested(self, starttime):
+    if starttime < self.lastdecrease: return
+    self.limit = max(1., self.limit / 2)
+    self.lastdecrease = time.time()
+    self.decreases = self.decreases + 1
+
+class Resolver(object):
+  def __init__(self, host, port, ttl = 300, stagger = 0.25, refresh = True):
+    self.host = host
+    self.port = int(port)
+    self.ttl = ttl
+    self.stagger = stagger
+    self.lock = threading.Lock()
+    self.addresses = []
+    self.lastgood = None
+    self.lookups = 0
+    self.failures = 0
+    # Without a refresh thread, the owner needs to call resolve() every ttl seconds
+    if refresh:
+      self.refreshthread = threading.Thread(None, self.refresher, "resolver_" + host)
+      self.refreshthread.daemon = True
+      self.refreshthread.start()
+
+  def refresher(self):
+    while True:
+      try: self.resolve()
+      except: pass
+      time.sleep(self.ttl)
+
+  def resolve(self):
+    try:
+      result = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)
+      with self.lock:
+        self.lookups = self.lookups + 1
+        self.addresses = [(family, address) for family, type, proto, name, address in result]
+    except:
+      # Keep using the addresses that we already know
+      with self.lock: self.failures = self.failures + 1
+      raise
+
+  def getaddresses(self):
+    with self.lock: addresses = list(self.addresses)
+    if len(addresses) == 0:
+      try: self.resolve()
+      except:
+        with self.lock:
+          if self.lastgood == None: raise
+    return self.knownaddresses()
+
+  # Same as getaddresses(), but never resolves the host name, for callers that must not block
+  def knownaddresses(self):
+    with self.lock:
+      addresses = list(self.addresses)
+      lastgood = self.lastgood
+    if lastgood in addresses: addresses.remove(lastgood)
+    if lastgood != None: addresses.insert(0, lastgood)
+    return addresses
+
+  # Connects to all known addresses of the host, starting a new attempt every
+  # stagger seconds, and returns the first socket that could be connected.
+  def connect(self, timeout = None):
+    addresses = self.getaddresses()
+    deadline = None if timeout == None else time.time() + timeout
+    pending = {}
+    error = None
+    winner = None
+    nextstart = time.time()
+    try:
+      while winner == None:
+        now = time.time()
+        if len(addresses) > 0 and (now >= nextstart or len(pending) == 0):
+          (family, address) = addresses.pop(0)
+          sock = socket.socket(family, socket.SOCK_STREAM)
+          sock.setblocking(0)
+          result = sock.connect_ex(address)
+          if result == 0: winner = (sock, (family, address))
+          elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", None)): pending[sock] = (family, address)
+          else:
+            sock.close()
+            error = socket.error(result, "Connection to %s failed" % str(address))
+          nextstart = now + self.stagger
+          continue
+        if len(pending) == 0: raise error if error != None else socket.error("No known addresses for %s" % self.host)
+        if deadline != None and now >= deadline: raise socket.timeout("Connection to %s timed out" % self.host)
+        wait = None if deadline == None else deadline - now
+        if len(addresses) > 0: wait = nextstart - now if wait == None else min(wait, nextstart - now)
+        (readable, writable, exceptional) = select.select([], list(pending), list(pending), max(0, wait) if wait != None else None)
+        for sock in set(writable + exceptional):
+          address = pending.pop(sock)
+          result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+          if result == 0 and winner == None: winner = (sock, address)
+          else:
+            sock.close()
+            if result != 0: error = socket.error(result, "Connection to %s failed" % str(address[1]))
+    finally:
+      for sock in pending: sock.close()
+    (sock, address) = winner
+    with self.lock: self.lastgood = address
+    sock.setblocking(1)
+    sock.settimeout(timeout)
+    return sock
+
+class ResolvingHTTPConnection(http_client.HTTPConnection):
+  def __init__(self, resolver, *args, **kwargs):
+    http_client.HTTPConnection.__init__(self, *args, **kwargs)
+    self.resolver = resolver
+
+  def connect(self):
+    self.sock = self.resolver.connect(self.timeout)
+
+# Checks whether a request on a kept alive connection failed because the server had already
+# closed the connection before answering. Only then is it safe to retry the request. A timeout
+# or anything else may mean that the server is (still) processing it, e.g. a share upload.
+def deadconnection(error):
+  if isinstance(error, http_client.BadStatusLine): return True
+  if isinstance(error, socket.timeout): return False
+  return isinstance(error, socket.error) and error.errno in (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+class HTTPConnectionPool(object):
+  def __init__(self, host, port, maxidle = 4, idletime = 60, resolver = None):
+    self.host = host
+    self.port = port
+    self.resolver = resolver
+    self.maxidle = maxidle
+    self.idletime = idletime
+    self.lock = threading.Lock()
+    self.idle = collections.deque()
+    self.requests = 0
+    self.reused = 0
+    self.connects = 0
+    self.latency = LatencyMeter()
+
+  def acquire(self, timeout, fresh = False):
+    with self.lock:
+      while len(self.idle) > 0 and not fresh:
+        (conn, lastused) = self.idle.pop()
+        if time.time() - lastused < self.idletime and conn.sock != None:
+          # A keep-alive connection shouldn't be readable while idle. If it is,
+          # the server has closed it (or sent garbage), so it can't be reused.
+          try:
+            if len(select.select([conn.sock], [], [], 0)[0]) == 0:
+              conn.sock.settimeout(timeout)
+              return (conn, True)
+          except: pass
+        conn.close()
+      self.connects = self.connects + 1
+    if self.resolver != None: return (ResolvingHTTPConnection(self.resolver, self.host, self.port, timeout = timeout), False)
+    return (http_client.HTTPConnection(self.host, self.port, timeout = timeout), False)
+
+  def release(self, conn):
+    with self.lock:
+      if len(self.idle) < self.maxidle:
+        self.idle.append((conn, time.time()))
+        return
+    conn.close()
+
+  def close(self):
+    with self.lock:
+      for conn, lastused in self.idle: conn.close()
+      self.idle.clear()
+
+  # If fresh is set, a new connection is used even if there are idle ones
+  def request(self, method, path, body, headers, timeout, fresh = False):
+    starttime = time.time()
+    while True:
+      (conn, reused) = self.acquire(timeout, fresh)
+      try:
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        data = response.read()
+        break
+      except BaseException as e:
+        conn.close()
+        # Retry if a kept alive connection turned out to be dead, ending up on a fresh one
+        if not reused or not deadconnection(e): raise
+    with self.lock:
+      self.requests = self.requests + 1
+      if reused: self.reused = self.reused + 1
+    self.latency.record(time.time() - starttime)
+    if response.will_close: conn.close()
+    else: self.release(conn)
+    return (response, data)
+
+# Cluster protocol frame types and payloads. Every frame starts with a type byte and a
+# 32 bit payload length. Work and shares are sent as fixed size binary structures,
+# only the (infrequent) statistics updates are JSON encoded.
+clusterhello = 1    # Agent -> coordinator: JSON encoded agent name, response and agent challenge
+clusterrequest = 2  # Agent -> coordinator: number of jobs wanted
+clusterjob = 3      # Coordinator -> agent: job ID, cancel epoch, midstate, first 80 bytes of data, target
+clustercancel = 4   # Coordinator -> agent: a new block was found, new cancel epoch
+clustershare = 5    # Agent -> coordinator: job ID, nonce
+clusterresult = 6   # Coordinator -> agent: job ID, nonce, accepted flag, rejection reason
+clusterstats = 7    # Agent -> coordinator: JSON encoded hash rate and worker statistics
+clusterchallenge = 8  # Coordinator -> agent: random challenge, sent right after accepting the connection
+clusterwelcome = 9    # Coordinator -> agent: response to the agent's challenge
+clusterheader = struct.Struct(">BI")
+clusterrequestdata = struct.Struct(">H")
+clusterjobdata = struct.Struct(">II32s80s32s")
+clustercanceldata = struct.Struct(">I")
+clustersharedata = struct.Struct(">I4s")
+clusterresultdata = struct.Struct(">I4s?")
+
+# Both sides prove that they know the shared secret by answering the other side's challenge.
+# The role is mixed in, so that a response can't simply be reflected back to its sender.
+def clusterchallengedata():
+  return os.urandom(32)
+
+def clusterresponse(secret, role, challenge):
+  return hmac.new(secret.encode("utf_8"), role + challenge, hashlib.sha256).digest()
+
+def clusterverify(secret, role, challenge, response):
+  return hmac.compare_digest(clusterresponse(secret, role, challenge), response)
+
+class ClusterConnection(object):
+  def __init__(self, sock):
+    self.socket = sock
+    self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self.reader = sock.makefile("rb")
+    self.sendlock = threading.Lock()
+
+  def send(self, type, payload = b""):
+    with self.sendlock: self.socket.sendall(clusterheader.pack(type, len(payload)) + payload)
+
+  def receive(self):
+    (type, length) = clusterheader.unpack(self.read(clusterheader.size))
+    return (type, self.read(length))
+
+  def read(self, length):
+    data = self.reader.read(length)
+    if len(data) < length: raise Exception("Connection closed")
+    return data
+
+  def close(self):
+    try: self.socket.shutdown(socket.SHUT_RDWR)
+    except: pass
+    try: self.socket.close()
+    except: pass
+
+class JobHistory(object):
+  def __init__(self, size = 3):
+    self.size = size
+    self.lock = threading.Lock()
+    self.jobs = collections.deque()
+
+  def add(self, job):
+    if job.pool == None: return
+    with self.lock:
+      self.jobs.appendleft(job)
+      while len(self.jobs) > self.size: self.jobs.pop().retire()
+
+  def clear(self):
+    with self.lock:
+      for job in self.jobs: job.retire()
+      self.jobs.clear()
+
+  def sendresult(self, nonce, worker, pending = None):
+    with self.lock: jobs = list(self.jobs)
+    if pending != None and pending.pool != None: jobs.insert(0, pending)
+    if len(jobs) == 0: return
+    jobs[0].miner.queueshare(jobs, nonce, worker)
 
 class Job(object):
   def __init__(self, miner, pool, longpollepoch, state, data, target, check = None):
@@ -36,43 +473,112 @@ class Job(object):
     self.state = state
     self.data = data
     self.target = target
+    self.targetvalue = None
+    self.difficulty = None
+    if target != None: (self.targetvalue, self.difficulty) = targetinfo(target)
+    self.blocktargetvalue = None
     self.check = check
     self.starttime = None
+    self.startnonce = 0
+    self.endnonce = 2**32
+    self.parent = None
+    self.noncelock = threading.Lock()
+    self.nonces = set()
+    self.noncehistory = collections.deque()
 
-  def sendresult(self, nonce, worker):
+  def slice(self, count):
+    size = (self.endnonce - self.startnonce) // count
+    slices = []
+    for i in range(count):
+      # A shallow copy shares the duplicate share tracking and any work source specific data
+      job = copy.copy(self)
+      job.startnonce = self.startnonce + i * size
+      job.endnonce = job.startnonce + size if i < count - 1 else self.endnonce
+      job.parent = self if self.parent == None else self.parent
+      slices.append(job)
+    return slices
+
+  # The hash can be passed if it was already calculated, e.g. by verifynonce()
+  def sendresult(self, nonce, worker, hash = None):
     if self.pool == None: return
+    self.miner.queueshare([self], nonce, worker, hash)
+
+  def registernonce(self, nonce):
+    with self.noncelock:
+      if nonce in self.nonces: return False
+      if len(self.noncehistory) >= 64: self.nonces.discard(self.noncehistory.popleft())
+      self.nonces.add(nonce)
+      self.noncehistory.append(nonce)
+      return True
+
+  def retire(self):
+    if self.parent != None: return
+    with self.noncelock:
+      self.nonces.clear()
+      self.noncehistory.clear()
+
+  # Quick check for shares that arrive from other MPBM instances or downstream miners,
+  # returns the reason for rejecting it (None if the share is worth being queued) and its hash
+  def verifynonce(self, nonce):
+    with self.noncelock:
+      if nonce in self.nonces: return ("duplicate", None)
+    hash = self.hashnonce(nonce)
+    if hash[-4:] != b"\0\0\0\0": return ("invalid", hash)
+    if int(binascii.hexlify(hash[::-1]), 16) > self.targetvalue: return ("high-hash", hash)
+    return (None, hash)
+
+  def hashnonce(self, nonce):
+    data = self.data[:76] + nonce + self.data[80:]
+    return hashlib.sha256(hashlib.sha256(struct.pack("<20I", *struct.unpack(">20I", data[:80]))).digest()).digest()
+
+  def checkresult(self, nonce, worker, hash = None):
     self.miner.log(worker.name + " found share: %s:%s:%s:%s\n" % (self.pool.name, binascii.hexlify(self.state).decode("ascii"), binascii.hexlify(self.data[64:76]).decode("ascii"), binascii.hexlify(nonce).decode("ascii")), "g")
     data = self.data[:76] + nonce + self.data[80:]
-    hash = hashlib.sha256(hashlib.sha256(struct.pack("<20I", *struct.unpack(">20I", data[:80]))).digest()).digest()
+    if hash == None: hash = self.hashnonce(nonce)
     if hash[-4:] != b"\0\0\0\0":
       self.miner.log("%s sent K-not-zero share %s\n" % (worker.name, binascii.hexlify(nonce).decode("ascii")), "rB")
       with worker.statlock: worker.invalid = worker.invalid + 1
-      return
-    self.difficulty = 65535. * 2**48 / struct.unpack("<Q", self.target[-12:-4])[0]
-    self.realdiff = 65535. * 2**48 / struct.unpack("<Q", hash[-12:-4])[0]
-    if hash[::-1] > self.target[::-1]:
-      self.miner.log("Share %s (difficulty %.5f) didn't meet difficulty %.5f\n" % (binascii.hexlify(nonce).decode("ascii"), self.realdiff, self.difficulty), "g")
-      return
-    self.pool.sendresult(self, data, nonce, self.realdiff, worker)
-
-  def uploadcallback(self, nonce, worker, result):
+      return None
+    hashvalue = int(binascii.hexlify(hash[::-1]), 16)
+    realdiff = difficulty(hashvalue)
+    if hashvalue > self.targetvalue:
+      self.miner.log("Share %s (difficulty %.5f) didn't meet difficulty %.5f\n" % (binascii.hexlify(nonce).decode("ascii"), realdiff, self.difficulty), "g")
+      return None
+    return (data, realdiff)
+
+  # Checks whether a share doesn't only meet the share target, but solves a block
+  def solvesblock(self, hash):
+    if self.blocktargetvalue == None: self.blocktargetvalue = blocktarget(self.data)
+    return int(binascii.hexlify(hash[::-1]), 16) <= self.blocktargetvalue
+
+  # Work sources pass the share's difficulty that they got with it, several shares
+  # of the same job may be on their way at the same time
+  def uploadcallback(self, nonce, worker, result, realdiff = None):
+    if realdiff == None: realdiff = self.difficulty
     if result == True:
-      self.miner.log("%s accepted share %s (difficulty %.5f)\n" % (self.pool.name, binascii.hexlify(nonce).decode("ascii"), self.realdiff), "gB")
+      self.miner.log("%s accepted share %s (difficulty %.5f)\n" % (self.pool.name, binascii.hexlify(nonce).decode("ascii"), realdiff), "gB")
       with worker.statlock: worker.accepted = worker.accepted + self.difficulty
       with self.pool.statlock:
         self.pool.accepted = self.pool.accepted + 1
         self.pool.score = self.pool.score + self.miner.sharebias
     else:
       if result == False or result == None or len(result) == 0: result = "Unknown reason"
-      self.miner.log("%s rejected share %s (difficulty %.5f): %s\n" % (self.pool.name, binascii.hexlify(nonce).decode("ascii"), self.realdiff, result), "rB")
+      self.miner.log("%s rejected share %s (difficulty %.5f): %s\n" % (self.pool.name, binascii.hexlify(nonce).decode("ascii"), realdiff, result), "rB")
       with worker.statlock: worker.rejected = worker.rejected + self.difficulty
       with self.pool.statlock:
         self.pool.rejected = self.pool.rejected + 1
         self.pool.score = self.pool.score + self.miner.stalebias
+    if hasattr(worker, "uploadcallback"): worker.uploadcallback(self, nonce, result)
 
   def finish(self, mhashes, worker):
     with self.pool.statlock:
       self.pool.mhashes = self.pool.mhashes + mhashes
       self.pool.score = self.pool.score + self.miner.jobfinishbias
     with worker.statlock: worker.mhashes = worker.mhashes + mhashes
+
+  # For workers that can't tell when a job is done (e.g. downstream miners): credits the work
+  # represented by a share, without the bias for a finished job
+  def creditwork(self, mhashes, worker):
+    with self.pool.statlock: self.pool.mhashes = self.pool.mhashes + mhashes
+    with worker.statlock: worker.mhashes = worker.mhashes + mhashes
     
\ No newline at end of file
@@ -8,9 +8,16 @@
 
 import frontend.theseven.cursesui
 import frontend.theseven.simplelogger
+#import frontend.theseven.getworkproxy
+#import frontend.theseven.clustercoordinator
 import pool.theseven.bcjsonrpc
+#import pool.theseven.stratum
+#import pool.theseven.gbt
+#import pool.theseven.clusteragent
 #import worker.theseven.simplers232
 #import worker.theseven.icarus
+#import worker.theseven.numpycpu
+#import worker.theseven.synthetic
 #import worker.fpgamining.x6500
 import worker.fpgamining.x6500hotplug
 
@@ -63,6 +70,45 @@ import worker.fpgamining.x6500hotplug
 #                    # getwork on any work source (default: 0.9995). Helps ensuring that
 #                    # work sources will be favored after they recover from temporary
 #                    # failures until they have caught up with the configured priority.
+#sharequeuelength = 1000  # Maximum number of found shares that may be waiting for verification
+#                         # (default: 1000). Shares that arrive while the queue is full are
+#                         # dropped rather than stalling the device.
+#shareverifiers = 2  # Number of threads that verify found shares and hand them over to the
+#                    # work source (default: 2)
+#latencypenalty = 0  # Penalty (in MHashes per second of latency) that is added to the score of
+#                    # a work source based on the 90th percentile of its getwork and share
+#                    # submission latencies (default: 0). Slow work sources cause more stale
+#                    # shares, setting this will make them less favored.
+#getworkbatchsize = 8  # Maximum number of jobs that are requested from a work source at once,
+#                      # if it supports that (default: 8)
+#jobslices = 4  # Number of nonce range slices that a job is split into for workers which
+#               # can process partial nonce ranges, e.g. software workers (default: 4)
+#breakerthreshold = 3  # Number of consecutive failed work requests after which a work source
+#                      # is taken out of service (default: 3)
+#breakeropentime = 5  # Time (in seconds) after which a work source that was taken out of service
+#                     # is probed again (default: 5). Doubled after every failed probe.
+#breakermaxopentime = 300  # Upper limit for breakeropentime (default: 300)
+#standbyjobs = 2  # Number of jobs that are kept pre-fetched for work sources which are
+#                 # currently not in use, for instant failover (default: 2)
+#standbyrefresh = 30  # Standby jobs are only fetched for work sources which no work has been
+#                     # requested from for that many seconds (default: 30). They are kept until
+#                     # a new block is found or they reach the work source's rollexpire/maxshareage.
+#getworkconcurrency = 4  # Initial limit for the number of concurrent work requests to a single work
+#                        # source (default: 4). It grows while requests are answered quickly and is
+#                        # halved if they fail or take longer than getworkcongestion seconds
+#                        # (default: half of getworktimeout).
+#maxgetworkconcurrency = 32  # Upper limit for getworkconcurrency (default: 32)
+#prewarm = True  # Request one job from every work source in parallel at startup, while the workers
+#                # are still initializing, and seed the work source scores from that (default: True)
+#prewarmtimeout = 5  # Maximum time (in seconds) that normal work fetching is held back while
+#                    # the work sources are being pre-warmed (default: 5)
+#prewarmlatencybias = -2000  # Bias (in MHashes per second) that is multiplied with the amount of time
+#                            # that a work source took longer to answer the pre-warm request than
+#                            # the fastest one and credited to it (default: -2000)
+#prewarmlongpollbias = -1000  # Bias (in MHashes) that is credited to work sources which don't support
+#                             # long polling after they were pre-warmed (default: -1000)
+#blocklog = "blocks.log"  # Shares which solve a block are appended to this file as soon as their
+#                         # upload has been started (default: "blocks.log", None to disable)
 
 
 ###########################
@@ -87,6 +133,28 @@ interfaces = [ \
     "logfile": "miner.log", \
   }, \
 
+#  # Getwork proxy for downstream miners on the LAN
+#  { \
+#    # User interface module
+#    "type": frontend.theseven.getworkproxy.GetworkProxy, \
+#    # Listen on all interfaces instead of just localhost (default: "127.0.0.1")
+#    "bind": "", \
+#    # TCP port to listen on (default)
+#    "port": 8330, \
+#    # Password that downstream miners need to send (default: no authentication)
+#    "password": "secret", \
+#  }, \
+
+#  # Cluster coordinator, hands out work to MPBM instances running the cluster agent work source
+#  { \
+#    # User interface module
+#    "type": frontend.theseven.clustercoordinator.ClusterCoordinator, \
+#    # TCP port to listen on (default)
+#    "port": 8340, \
+#    # Shared secret that the agents need to know
+#    "secret": "change me", \
+#  }, \
+
 ]
 
 
@@ -126,6 +194,26 @@ workers = [ \
 #    "port": "/dev/ttyUSB0", \
 #  }, \
 
+#  # NumPy CPU worker (for testing and benchmarking only, way too slow for real mining)
+#  { \
+#    # Worker module
+#    "type": worker.theseven.numpycpu.NumPyCPUWorker, \
+#    # Number of hashing processes (default: number of CPU cores)
+#    "processes": 2, \
+#  }, \
+
+#  # Synthetic load generator (doesn't hash, produces fake shares for stress testing)
+#  { \
+#    # Worker module
+#    "type": worker.theseven.synthetic.SyntheticWorker, \
+#    # Number of shares per second to produce (default: 10)
+#    "sharespersecond": 100, \
+#    # Fraction of invalid shares (default: 0)
+#    "invalidfraction": 0.1, \
+#    # Work sources that aren't on localhost, but may get shares anyway (default: none)
+#    "testpools": ["Test pool"], \
+#  }, \
+
 ]
 
 
@@ -232,6 +320,61 @@ blockchains = [ \
 #       "username": "MyUsername", \
 #       # HTTP authentication password (default: empty)
 #       "password": "MyPassword", \
+#     }, \
+
+#     # Your own stratum pool entry
+#     { \
+#       # Pool interface module
+#       "type": pool.theseven.stratum.StratumPool, \
+#       # Display name of the pool (default: host name)
+#       "name": "My stratum pool", \
+#       # Priority (default: 1)
+#       "priority": 1000, \
+#       # Host name of the pool
+#       "host": "stratum.mypool.com", \
+#       # TCP port of the pool (default: 3333)
+#       "port": 3333, \
+#       # Worker user name (default: empty)
+#       "username": "MyUsername", \
+#       # Worker password (default: empty)
+#       "password": "MyPassword", \
+#     }, \
+
+#     # Solo mining against your own bitcoin node
+#     { \
+#       # Pool interface module
+#       "type": pool.theseven.gbt.GetBlockTemplatePool, \
+#       # Display name of the pool (default: host name)
+#       "name": "My bitcoin node", \
+#       # Priority (default: 1)
+#       "priority": 1000, \
+#       # Host name of the node
+#       "host": "127.0.0.1", \
+#       # JSON RPC port of the node (default: 8332)
+#       "port": 8332, \
+#       # JSON RPC user name (default: no authentication)
+#       "username": "MyUsername", \
+#       # JSON RPC password (default: empty)
+#       "password": "MyPassword", \
+#       # Address that the block reward will be paid to
+#       "address": "1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh", \
+#     }, \
+
+#     # Cluster agent, gets all work from a cluster coordinator. If you use this,
+#     # it should be the only work source of this MPBM instance.
+#     { \
+#       # Pool interface module
+#       "type": pool.theseven.clusteragent.ClusterAgentPool, \
+#       # Display name of the pool (default: host name)
+#       "name": "Cluster coordinator", \
+#       # Host name of the coordinator
+#       "host": "192.168.0.10", \
+#       # TCP port of the coordinator (default: 8340)
+#       "port": 8340, \
+#       # Name of this agent in the coordinator's statistics (default: local host name)
+#       "agentname": "Rack 1", \
+#       # Shared secret, needs to match the one of the coordinator
+#       "secret": "change me", \
 #     }, \
 
     ], \
@@ -0,0 +1,280 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+##############################
+# Cluster coordinator module #
+##############################
+
+# Module configuration options:
+#   name: Display name of the coordinator in the worker statistics (default: "Cluster")
+#   bind: IP address to listen on (default: all interfaces)
+#   port: TCP port to listen on (default: 8340)
+#   secret: Shared secret that the agents need to know (mandantory). Both sides prove that
+#           they know it when connecting, but the connection itself is not encrypted.
+#   jobhistory: Number of recently sent jobs per agent that shares are accepted for (default: 1000)
+
+# Runs the work sources and the scheduler for a cluster of MPBM instances. The agents
+# (see pool/theseven/clusteragent.py) only run workers, they request jobs from the
+# coordinator's work buffer and send their shares back to it over a persistent TCP
+# connection. Block changes are forwarded to all agents as soon as they are detected.
+# Each agent shows up as a child of the coordinator in the worker statistics.
+
+
+import common
+import json
+import time
+import binascii
+import socket
+import threading
+import collections
+
+
+# Pseudo worker representing a connected agent
+class ClusterAgent(object):
+  def __init__(self, coordinator, name):
+    self.coordinator = coordinator
+    self.miner = coordinator.miner
+    self.name = name
+    self.children = []
+    self.connection = None
+    self.mhps = 0
+    self.jobspersecond = 0
+    self.mhashes = 0
+    self.jobsaccepted = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.invalid = 0
+    self.duplicates = 0
+    self.starttime = time.time()
+    self.statlock = threading.RLock()
+    self.workerstats = []
+    self.job = None
+    self.requested = 0
+    self.jobcondition = threading.Condition()
+    self.jobid = 0
+    self.jobs = {}
+    self.joborder = collections.deque()
+    self.pending = {}
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": self.workerstats, \
+        "mhashes": self.mhashes, \
+        "mhps": self.mhps, \
+        "jobsaccepted": self.jobsaccepted, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
+        "starttime": self.starttime, \
+        "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
+      }
+    return statistics
+
+  def cancel(self, blockchain): pass
+
+  def run(self, connection):
+    with self.jobcondition:
+      self.connection = connection
+      self.requested = 0
+    feeder = threading.Thread(None, self.feeder, self.name + "_feeder", (connection,))
+    feeder.daemon = True
+    feeder.start()
+    try:
+      while True:
+        (type, payload) = connection.receive()
+        if type == common.clusterrequest:
+          with self.jobcondition:
+            self.requested = self.requested + common.clusterrequestdata.unpack(payload)[0]
+            self.jobcondition.notify()
+        elif type == common.clustershare: self.handleshare(*common.clustersharedata.unpack(payload))
+        elif type == common.clusterstats: self.handlestats(json.loads(payload.decode("utf_8")))
+    except Exception as e:
+      self.miner.log("%s: Agent %s disconnected: %s\n" % (self.coordinator.name, self.name, e), "rB")
+    connection.close()
+    with self.jobcondition:
+      if self.connection == connection: self.connection = None
+      self.jobcondition.notify()
+    with self.statlock:
+      self.mhps = 0
+      self.jobspersecond = 0
+    self.miner.updatehashrate(self)
+
+  # Hands out jobs from the coordinator's work buffer as requested by the agent
+  def feeder(self, connection):
+    while True:
+      with self.jobcondition:
+        while self.connection == connection and self.requested <= 0: self.jobcondition.wait()
+        if self.connection != connection: return
+        self.requested = self.requested - 1
+      job = self.miner.getjob(self)
+      # The block may change while the job is on its way, its cancel epoch tells the agent
+      # whether the job is older than the last cancel frame. Both are checked atomically
+      # with the block change, which happens under queuelock.
+      with self.miner.queuelock:
+        stale = job.longpollepoch != job.pool.blockchain.longpollepoch
+        epoch = self.coordinator.epoch
+      if stale:
+        with self.jobcondition: self.requested = self.requested + 1
+        continue
+      with self.statlock:
+        self.jobid = (self.jobid + 1) & 0xffffffff
+        jobid = self.jobid
+        self.jobs[jobid] = job
+        self.joborder.append(jobid)
+        while len(self.joborder) > self.coordinator.jobhistory: del self.jobs[self.joborder.popleft()]
+        self.job = job
+        self.jobsaccepted = self.jobsaccepted + 1
+      try: connection.send(common.clusterjob, common.clusterjobdata.pack(jobid, epoch, job.state, job.data[:80], job.target))
+      except:
+        # The agent is gone, give the job to someone else
+        self.miner.requeuejob(job)
+        return
+
+  def handleshare(self, jobid, nonce):
+    with self.statlock: job = self.jobs.get(jobid)
+    (reason, hash) = ("unknown-work", None) if job == None else job.verifynonce(nonce)
+    if reason != None:
+      with self.statlock:
+        if reason == "duplicate": self.duplicates = self.duplicates + 1
+        elif reason == "invalid": self.invalid = self.invalid + 1
+      return self.sendresult(jobid, nonce, reason)
+    # The agent reports hash rates, but we need to credit the work to the work source
+    mhashes = job.difficulty * 2**32 / 1000000.
+    job.creditwork(mhashes, self)
+    with self.statlock: self.pending[(job, nonce)] = jobid
+    job.sendresult(nonce, self, hash)
+
+  def uploadcallback(self, job, nonce, result):
+    with self.statlock: jobid = self.pending.pop((job, nonce), None)
+    if jobid != None: self.sendresult(jobid, nonce, result)
+
+  def sendresult(self, jobid, nonce, result):
+    reason = b"" if result == True else str(result).encode("utf_8")
+    connection = self.connection
+    if connection == None: return
+    try: connection.send(common.clusterresult, common.clusterresultdata.pack(jobid, nonce, result == True) + reason)
+    except: pass
+
+  def handlestats(self, stats):
+    with self.statlock:
+      self.mhps = stats["mhps"]
+      self.jobspersecond = stats["jobspersecond"]
+      self.workerstats = stats["workers"]
+    self.miner.updatehashrate(self)
+
+
+class ClusterCoordinator(object):
+  def __init__(self, miner, dict):
+    self.__dict__ = dict
+    self.miner = miner
+    if not hasattr(self, "secret"): raise Exception("Missing attribute: secret")
+    self.name = getattr(self, "name", "Cluster")
+    self.bind = getattr(self, "bind", "")
+    self.port = getattr(self, "port", 8340)
+    self.jobhistory = getattr(self, "jobhistory", 1000)
+    # Incremented on every new block, protected by the core's queuelock
+    self.epoch = 0
+    # The coordinator shows up as a worker, with the agents as its children
+    self.children = []
+    self.mhps = 0
+    self.jobspersecond = 0
+    self.starttime = time.time()
+    self.statlock = threading.RLock()
+    self.miner.workers.append(self)
+    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    self.socket.bind((self.bind, self.port))
+    self.socket.listen(16)
+    self.listenerthread = threading.Thread(None, self.listener, "clustercoordinator")
+    self.listenerthread.daemon = True
+    self.listenerthread.start()
+
+  def message(self, date, str, format): pass
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "mhashes": self.miner.calculatefieldsum(childstats, "mhashes"), \
+        "mhps": self.miner.calculatefieldsum(childstats, "mhps"), \
+        "jobsaccepted": self.miner.calculatefieldsum(childstats, "jobsaccepted"), \
+        "accepted": self.miner.calculatefieldsum(childstats, "accepted"), \
+        "rejected": self.miner.calculatefieldsum(childstats, "rejected"), \
+        "invalid": self.miner.calculatefieldsum(childstats, "invalid"), \
+        "duplicates": self.miner.calculatefieldsum(childstats, "duplicates"), \
+        "starttime": self.starttime, \
+        "currentpool": "Not applicable", \
+      }
+    return statistics
+
+  # Called by the core (with queuelock held) once per new block, before the work buffer is flushed
+  def cancel(self, blockchain):
+    self.epoch = (self.epoch + 1) & 0xffffffff
+    payload = common.clustercanceldata.pack(self.epoch)
+    with self.statlock: agents = list(self.children)
+    for agent in agents:
+      connection = agent.connection
+      if connection == None: continue
+      try: connection.send(common.clustercancel, payload)
+      except: pass
+
+  def listener(self):
+    while True:
+      try:
+        (sock, address) = self.socket.accept()
+        thread = threading.Thread(None, self.handshake, "clusteragent_%s" % address[0], (sock, address))
+        thread.daemon = True
+        thread.start()
+      except Exception as e:
+        self.miner.log("%s: Error while accepting agent connection: %s\n" % (self.name, e), "rB")
+        time.sleep(1)
+
+  def handshake(self, sock, address):
+    connection = common.ClusterConnection(sock)
+    try:
+      sock.settimeout(10)
+      challenge = common.clusterchallengedata()
+      connection.send(common.clusterchallenge, challenge)
+      (type, payload) = connection.receive()
+      if type != common.clusterhello: raise Exception("Unexpected frame type %d" % type)
+      hello = json.loads(payload.decode("utf_8"))
+      name = hello["name"]
+      response = binascii.unhexlify(hello["response"].encode("ascii"))
+      if not common.clusterverify(self.secret, b"agent", challenge, response): raise Exception("Wrong secret")
+      agentchallenge = binascii.unhexlify(hello["challenge"].encode("ascii"))
+      connection.send(common.clusterwelcome, common.clusterresponse(self.secret, b"coordinator", agentchallenge))
+      sock.settimeout(None)
+    except Exception as e:
+      self.miner.log("%s: Handshake with %s failed: %s\n" % (self.name, address[0], e), "rB")
+      return connection.close()
+    with self.statlock:
+      agent = None
+      for child in self.children:
+        if child.name == name: agent = child
+      if agent == None:
+        agent = ClusterAgent(self, name)
+        self.children.append(agent)
+    self.miner.log("%s: Agent %s connected from %s\n" % (self.name, name, address[0]), "B")
+    agent.run(connection)
@@ -41,7 +41,7 @@ class CursesUI(object):
     self.__dict__ = dict
     self.miner = miner
     self.updateinterval = getattr(self, "updateinterval", 1)
-    self.ysplit = 10 + len(self.miner.pools) + self.countchildren(self.miner.workers)
+    self.ysplit = 11 + len(self.miner.pools) + self.countchildren(self.miner.workers)
     atexit.register(self.shutdown)
     self.mainwin = curses.initscr()
     curses.start_color()
@@ -99,6 +99,9 @@ class CursesUI(object):
       poolstats.append({ \
         "name": (" " * indent + pool["name"], bold, "l"), \
         "longpolling": ("Yes", "g" + bold, "c") if pool["longpolling"] == True else ("No", "r" + bold, "c") if pool["longpolling"] == False else ("Unkn", "y" + bold, "c"), \
+        "circuit": ("Up", "g" + bold, "c") if pool.get("circuit") == "closed" else ("Down", "r" + bold, "c") if pool.get("circuit") == "open" else ("Probe", "y" + bold, "c") if pool.get("circuit") == "halfopen" else ("Unkn", "y" + bold, "c"), \
+        "standbyjobs": ("%d" % pool["standbyjobs"], bold, "r") if "standbyjobs" in pool else ("Unkn", bold, "c"), \
+        "concurrency": ("%d/%d" % (pool["inflight"], pool["concurrencylimit"]), "y" + bold if pool["inflight"] >= pool["concurrencylimit"] else bold, "r") if "concurrencylimit" in pool else ("Unkn", bold, "c"), \
         "difficulty": ("%.5f" % pool["difficulty"], bold, "r"), \
         "requests": ("%d" % pool["requests"], bold, "r"), \
         "failedreqs": ("%d (%.1f%%)" % (pool["failedreqs"], failedpercent), "r" + bold if failedpercent > 5 else "g" + bold if failedpercent < 1 else "y" + bold, "r"), \
@@ -110,6 +113,8 @@ class CursesUI(object):
         "avgmhps": ("%.2f" % (pool["mhashes"] / uptime), bold, "r"), \
         "efficiency": ("%.1f%%" % efficiency, "r" + bold if efficiency < 80 else "g" + bold if efficiency > 95 else "y" + bold, "r"), \
         "score": ("%.0f" % pool["score"], bold, "r"), \
+        "getworklatency": ("%.0f/%.0f" % (pool["getworklatency"] * 1000, pool["getworklatency90"] * 1000), bold, "r") if "getworklatency" in pool else ("Unknown", bold, "c"), \
+        "submitlatency": ("%.0f/%.0f" % (pool["submitlatency"] * 1000, pool["submitlatency90"] * 1000), bold, "r") if "submitlatency" in pool else ("Unknown", bold, "c"), \
       })
       self.translatepooldata(pool["children"], poolstats, indent + 2)
     
@@ -123,6 +128,9 @@ class CursesUI(object):
       except: stalepercent = 0
       try: invalidpercent = 100. * worker["invalid"] / (worker["accepted"] + worker["rejected"] + worker["invalid"])
       except: invalidpercent = 0
+      duplicates = worker.get("duplicates", 0)
+      try: duplicatepercent = 100. * duplicates / (worker["accepted"] + worker["rejected"] + worker["invalid"])
+      except: duplicatepercent = 0
       try: efficiency = worker["accepted"] / worker["mhashes"] * 429503.2833
       except: efficiency = 0
       workerstats.append({ \
@@ -131,6 +139,7 @@ class CursesUI(object):
         "accepted": ("%.0f" % worker["accepted"], bold, "r"), \
         "rejected": ("%.0f (%.1f%%)" % (worker["rejected"], stalepercent), "r" + bold if stalepercent > 5 else "g" + bold if stalepercent < 1 else "y" + bold, "r"), \
         "invalid": ("%.0f (%.1f%%)" % (worker["invalid"], invalidpercent), "r" + bold if invalidpercent > 5 else "g" + bold if invalidpercent < 1 else "y" + bold, "r"), \
+        "duplicates": ("%d (%.1f%%)" % (duplicates, duplicatepercent), "r" + bold if duplicatepercent > 5 else "g" + bold if duplicatepercent < 1 else "y" + bold, "r"), \
         "mhps": ("%.2f" % worker["mhps"], bold, "r"), \
         "avgmhps": ("%.2f" % (worker["mhashes"] / uptime), bold, "r"), \
         "efficiency": ("%.1f%%" % efficiency, "r" + bold if efficiency < 80 else "g" + bold if efficiency > 95 else "y" + bold, "r"), \
@@ -175,6 +184,15 @@ class CursesUI(object):
         width = max(4, self.calculatemaxfieldlen(poolstats, "longpolling"))
         poolcolumns.append({"title1": "Long", "title2": "poll", "field": "longpolling", "x": x, "width": width})
         x = x + 1 + width
+        width = max(5, self.calculatemaxfieldlen(poolstats, "circuit"))
+        poolcolumns.append({"title1": "", "title2": "State", "field": "circuit", "x": x, "width": width})
+        x = x + 1 + width
+        width = max(7, self.calculatemaxfieldlen(poolstats, "standbyjobs"))
+        poolcolumns.append({"title1": "Standby", "title2": "jobs", "field": "standbyjobs", "x": x, "width": width})
+        x = x + 1 + width
+        width = max(6, self.calculatemaxfieldlen(poolstats, "concurrency"))
+        poolcolumns.append({"title1": "Active", "title2": "/limit", "field": "concurrency", "x": x, "width": width})
+        x = x + 1 + width
         width = max(10, self.calculatemaxfieldlen(poolstats, "difficulty"))
         poolcolumns.append({"title1": "", "title2": "Difficulty", "field": "difficulty", "x": x, "width": width})
         x = x + 1 + width
@@ -207,6 +225,12 @@ class CursesUI(object):
         x = x + 1 + width
         width = max(7, self.calculatemaxfieldlen(poolstats, "score"))
         poolcolumns.append({"title1": "Current", "title2": "bias", "field": "score", "x": x, "width": width})
+        x = x + 1 + width
+        width = max(11, self.calculatemaxfieldlen(poolstats, "getworklatency"))
+        poolcolumns.append({"title1": "Job latency", "title2": "avg/90% ms", "field": "getworklatency", "x": x, "width": width})
+        x = x + 1 + width
+        width = max(13, self.calculatemaxfieldlen(poolstats, "submitlatency"))
+        poolcolumns.append({"title1": "Share latency", "title2": "avg/90% ms", "field": "submitlatency", "x": x, "width": width})
         workerstats = []
         self.translateworkerdata(workerdata, workerstats)
         workercolumns = []
@@ -226,6 +250,9 @@ class CursesUI(object):
         width = max(14, self.calculatemaxfieldlen(workerstats, "invalid"))
         workercolumns.append({"title1": "Invalid shares", "title2": "(K not zero)", "field": "invalid", "x": x, "width": width})
         x = x + 1 + width
+        width = max(10, self.calculatemaxfieldlen(workerstats, "duplicates"))
+        workercolumns.append({"title1": "Duplicate", "title2": "shares", "field": "duplicates", "x": x, "width": width})
+        x = x + 1 + width
         width = max(7, self.calculatemaxfieldlen(workerstats, "mhps"))
         workercolumns.append({"title1": "Current", "title2": "MHash/s", "field": "mhps", "x": x, "width": width})
         x = x + 1 + width
@@ -242,7 +269,7 @@ class CursesUI(object):
         workercolumns.append({"title1": "Current", "title2": "pool", "field": "currentpool", "x": x, "width": width})
         with self.miner.conlock:
           try:
-            self.ysplit = 10 + len(poolstats) + len(workerstats)
+            self.ysplit = 11 + len(poolstats) + len(workerstats)
             (my, mx) = self.mainwin.getmaxyx()
             self.mainwin.erase()
             self.mainwin.hline(1, 0, curses.ACS_HLINE, mx)
@@ -261,8 +288,21 @@ class CursesUI(object):
             self.mainwin.addstr(" (", color)
             self.mainwin.addstr(("%.2f" % queueseconds), color | curses.A_BOLD)
             self.mainwin.addstr(" seconds)", color)
-            self.drawtable(4, poolcolumns, poolstats)
-            self.drawtable(7 + len(poolstats), workercolumns, workerstats)
+            self.mainwin.addstr(3, 0, "Share queue: ")
+            self.mainwin.addstr(("%d" % self.miner.sharequeue.qsize()).rjust(4), curses.A_BOLD)
+            self.mainwin.addstr(" - Dropped: ")
+            self.mainwin.addstr("%d" % self.miner.sharesdropped, (self.red if self.miner.sharesdropped > 0 else self.green) | curses.A_BOLD)
+            if self.miner.blocksfound > 0:
+              self.mainwin.addstr(" - Blocks: ")
+              self.mainwin.addstr("%d" % self.miner.blocksfound, self.green | curses.A_BOLD)
+            self.mainwin.addstr(" - Latency (ms): wait ")
+            self.mainwin.addstr("%.1f" % (self.miner.sharewaitlatency.average * 1000), curses.A_BOLD)
+            self.mainwin.addstr(", verify ")
+            self.mainwin.addstr("%.1f" % (self.miner.shareverifylatency.average * 1000), curses.A_BOLD)
+            self.mainwin.addstr(", submit ")
+            self.mainwin.addstr("%.1f" % (self.miner.sharesubmitlatency.average * 1000), curses.A_BOLD)
+            self.drawtable(5, poolcolumns, poolstats)
+            self.drawtable(8 + len(poolstats), workercolumns, workerstats)
             self.mainwin.noutrefresh()
             (my, mx) = self.mainwin.getmaxyx()
             (ly, lx) = self.logwin.getmaxyx()
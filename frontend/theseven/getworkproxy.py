@@ -0,0 +1,329 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+###############################
+# Getwork proxy server module #
+###############################
+
+# Module configuration options:
+#   name: Display name of the proxy in the worker statistics (default: "Getwork proxy")
+#   bind: IP address to listen on (default: "127.0.0.1", use "" for all interfaces)
+#   port: TCP port to listen on (default: 8330)
+#   password: If set, downstream miners need to send this password (with any user name)
+#             using HTTP basic authentication (default: no authentication)
+#   jobhistory: Number of recently served jobs that shares are accepted for (default: 1000)
+#   clienttimeout: Downstream miners that haven't sent a request for that many seconds
+#                  are removed from the statistics (default: 3600)
+
+# Serves getwork and long polling to downstream miners, using the same work buffer and
+# work source scheduling as the local workers. Downstream miners are identified by their
+# HTTP user name, or by their IP address if they don't send one. Each of them shows up
+# as a child of the proxy in the worker statistics.
+# Shares are checked locally and then uploaded to the work source that the job came from.
+# The downstream miner gets the upstream response, or false if there was none within
+# sendsharetimeout (the share may have been dropped or still be waiting for its upload).
+
+
+import json
+import time
+import base64
+import binascii
+import threading
+import collections
+try: from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError: from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+try: from socketserver import ThreadingMixIn
+except ImportError: from SocketServer import ThreadingMixIn
+
+hash1 = "00000000000000000000000000000000000000000000000000000000000000000000008000000000000000000000000000000000000000000000000000010000"
+
+
+class ProxyHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+class ProxyRequestHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def log_message(self, format, *args): pass
+
+  def do_GET(self):
+    self.handle_request(b"")
+
+  def do_POST(self):
+    self.handle_request(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+  def handle_request(self, body):
+    proxy = self.server.proxy
+    (username, password) = self.credentials()
+    if proxy.password != None and password != proxy.password: return self.sendunauthorized()
+    id = None
+    try:
+      req = json.loads(body.decode("utf_8")) if len(body) > 0 else {"method": "getwork", "params": [], "id": 0}
+      id = req.get("id")
+      client = proxy.getclient(username if username != None and len(username) > 0 else self.client_address[0])
+      try:
+        if self.path == "/longpoll": result = proxy.jobresult(proxy.longpoll(client))
+        elif req.get("method") != "getwork": raise Exception("Method not found")
+        elif len(req.get("params", [])) > 0: result = proxy.submit(client, req["params"][0])
+        else: result = proxy.jobresult(proxy.getjob(client))
+      finally: proxy.releaseclient(client)
+      self.sendjson({"result": result, "error": None, "id": id})
+    except Exception as e:
+      self.sendjson({"result": None, "error": {"code": -1, "message": str(e)}, "id": id})
+
+  # Returns the user name and password from the HTTP basic authentication header, if any
+  def credentials(self):
+    auth = self.headers.get("Authorization")
+    if auth != None and auth[:6].lower() == "basic ":
+      try:
+        credentials = base64.b64decode(auth[6:].encode("ascii")).decode("utf_8").split(":", 1)
+        return (credentials[0], credentials[1] if len(credentials) > 1 else "")
+      except: pass
+    return (None, None)
+
+  def sendunauthorized(self):
+    self.send_response(401)
+    self.send_header("WWW-Authenticate", "Basic realm=\"MPBM\"")
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+  def sendjson(self, data):
+    body = json.dumps(data).encode("utf_8")
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.send_header("X-Long-Polling", "/longpoll")
+    self.end_headers()
+    self.wfile.write(body)
+
+
+# Pseudo worker representing a downstream miner
+class ProxyClient(object):
+  def __init__(self, proxy, name):
+    self.proxy = proxy
+    self.miner = proxy.miner
+    self.name = name
+    self.children = []
+    self.mhps = 0
+    self.mhashes = 0
+    self.jobsaccepted = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.invalid = 0
+    self.duplicates = 0
+    self.starttime = time.time()
+    self.statlock = threading.RLock()
+    self.job = None
+    self.lastrequest = None
+    self.jobspersecond = 0
+    self.lasthashrateupdate = 0
+    self.recentwork = collections.deque()
+    self.pending = {}
+    self.activerequests = 0
+    self.lastseen = time.time()
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "mhashes": self.mhashes, \
+        "mhps": self.mhps, \
+        "jobsaccepted": self.jobsaccepted, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
+        "starttime": self.starttime, \
+        "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
+      }
+    return statistics
+
+  def cancel(self, blockchain): pass
+
+  def jobrequested(self, job):
+    now = time.time()
+    with self.statlock:
+      self.job = job
+      self.jobsaccepted = self.jobsaccepted + 1
+      if self.lastrequest != None:
+        interval = max(0.001, now - self.lastrequest)
+        self.jobspersecond = 0.9 * self.jobspersecond + 0.1 / interval if self.jobspersecond > 0 else 1. / interval
+      self.lastrequest = now
+    self.updatehashrate(now)
+
+  # We can't see the downstream miner hashing, so estimate its hash rate from the shares it sends
+  def sharesent(self, job):
+    now = time.time()
+    mhashes = job.difficulty * 2**32 / 1000000.
+    with self.statlock:
+      self.recentwork.append((now, mhashes))
+    job.creditwork(mhashes, self)
+    self.updatehashrate(now)
+
+  def updatehashrate(self, now):
+    with self.statlock:
+      while len(self.recentwork) > 0 and now - self.recentwork[0][0] > 600: self.recentwork.popleft()
+      if len(self.recentwork) > 0: self.mhps = sum(work for timestamp, work in self.recentwork) / max(60, now - self.recentwork[0][0])
+      else: self.mhps = 0
+      if now - self.lasthashrateupdate < 10: return
+      self.lasthashrateupdate = now
+    self.miner.updatehashrate(self)
+
+  def uploadcallback(self, job, nonce, result):
+    with self.statlock: event = self.pending.pop(nonce, None)
+    if event != None:
+      event.result = result
+      event.set()
+
+
+class GetworkProxy(object):
+  def __init__(self, miner, dict):
+    self.__dict__ = dict
+    self.miner = miner
+    self.name = getattr(self, "name", "Getwork proxy")
+    self.bind = getattr(self, "bind", "127.0.0.1")
+    self.port = getattr(self, "port", 8330)
+    self.password = getattr(self, "password", None)
+    self.jobhistory = getattr(self, "jobhistory", 1000)
+    self.clienttimeout = getattr(self, "clienttimeout", 3600)
+    # The proxy shows up as a worker, with the downstream miners as its children
+    self.children = []
+    self.mhps = 0
+    self.jobspersecond = 0
+    self.mhashes = 0
+    self.starttime = time.time()
+    self.statlock = threading.RLock()
+    self.jobs = {}
+    self.joborder = collections.deque()
+    self.longpollcondition = threading.Condition()
+    # Number of new blocks by blockchain, None counts all of them
+    self.longpollcounters = {}
+    self.miner.workers.append(self)
+    self.server = ProxyHTTPServer((self.bind, self.port), ProxyRequestHandler)
+    self.server.proxy = self
+    self.serverthread = threading.Thread(None, self.server.serve_forever, "getworkproxy")
+    self.serverthread.daemon = True
+    self.serverthread.start()
+
+  def message(self, date, str, format): pass
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "mhashes": self.miner.calculatefieldsum(childstats, "mhashes"), \
+        "mhps": self.miner.calculatefieldsum(childstats, "mhps"), \
+        "jobsaccepted": self.miner.calculatefieldsum(childstats, "jobsaccepted"), \
+        "accepted": self.miner.calculatefieldsum(childstats, "accepted"), \
+        "rejected": self.miner.calculatefieldsum(childstats, "rejected"), \
+        "invalid": self.miner.calculatefieldsum(childstats, "invalid"), \
+        "duplicates": self.miner.calculatefieldsum(childstats, "duplicates"), \
+        "starttime": self.starttime, \
+        "currentpool": "Not applicable", \
+      }
+    return statistics
+
+  # A new block was found. The core calls this only once per block, no matter how many
+  # work sources announced it, so this is where downstream long polls are answered.
+  def cancel(self, blockchain):
+    with self.longpollcondition:
+      for key in (blockchain, None): self.longpollcounters[key] = self.longpollcounters.get(key, 0) + 1
+      self.longpollcondition.notify_all()
+
+  # Finds or creates the client, which is kept until releaseclient() is called
+  def getclient(self, name):
+    now = time.time()
+    with self.statlock:
+      # Forget about downstream miners that went away, the user name is chosen by them after all
+      self.children = [c for c in self.children if c.activerequests > 0 or now - c.lastseen < self.clienttimeout]
+      for client in self.children:
+        if client.name == name:
+          client.activerequests = client.activerequests + 1
+          client.lastseen = now
+          return client
+      client = ProxyClient(self, name)
+      client.activerequests = 1
+      self.children.append(client)
+    self.miner.log("%s: New downstream miner: %s\n" % (self.name, name), "B")
+    return client
+
+  def releaseclient(self, client):
+    with self.statlock:
+      client.activerequests = client.activerequests - 1
+      client.lastseen = time.time()
+
+  def getjob(self, client, fresh = False):
+    job = self.miner.getjob(client)
+    # Jobs that were queued before a long poll may still be handed out while the queue is being flushed
+    while fresh and job.longpollepoch != job.pool.blockchain.longpollepoch: job = self.miner.getjob(client)
+    with self.statlock:
+      key = job.data[:76]
+      if key not in self.jobs: self.joborder.append(key)
+      self.jobs[key] = job
+      while len(self.joborder) > self.jobhistory: del self.jobs[self.joborder.popleft()]
+    client.jobrequested(job)
+    return job
+
+  def longpoll(self, client):
+    # Only answer once the block changed on the blockchain that the downstream miner is working on
+    with client.statlock: job = client.job
+    key = job.pool.blockchain if job != None and job.pool != None else None
+    with self.longpollcondition:
+      counter = self.longpollcounters.get(key, 0)
+      deadline = time.time() + self.miner.longpolltimeout
+      while self.longpollcounters.get(key, 0) == counter:
+        if time.time() >= deadline: break
+        self.longpollcondition.wait(deadline - time.time())
+    return self.getjob(client, True)
+
+  def jobresult(self, job):
+    return { \
+      "midstate": binascii.hexlify(job.state).decode("ascii"), \
+      "data": binascii.hexlify(job.data).decode("ascii"), \
+      "hash1": hash1, \
+      "target": binascii.hexlify(job.target).decode("ascii"), \
+    }
+
+  def submit(self, client, data):
+    data = binascii.unhexlify(data.encode("ascii"))
+    with self.statlock: job = self.jobs.get(data[:76])
+    if job == None: raise Exception("Unknown work")
+    nonce = data[76:80]
+    (reason, hash) = job.verifynonce(nonce)
+    if reason != None:
+      with client.statlock:
+        if reason == "duplicate": client.duplicates = client.duplicates + 1
+        elif reason == "invalid": client.invalid = client.invalid + 1
+      return False
+    # Only an actual response from the work source counts, the share may never get one
+    # if it was dropped because the share queue or the upload backlog was full
+    event = threading.Event()
+    event.result = None
+    with client.statlock: client.pending[nonce] = event
+    client.sharesent(job)
+    job.sendresult(nonce, client, hash)
+    event.wait(self.miner.sendsharetimeout)
+    with client.statlock: client.pending.pop(nonce, None)
+    return event.result == True
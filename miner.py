@@ -67,6 +67,53 @@
 #              getwork on any work source (default: 0.9995). Helps ensuring that
 #              work sources will be favored after they recover from temporary
 #              failures until they have caught up with the configured priority.
+#   sharequeuelength: Maximum number of found shares that may be waiting for
+#                     verification (default: 1000). Shares that arrive while the
+#                     queue is full are dropped rather than stalling the device.
+#                     Block solutions are recognized on arrival and never queued.
+#   shareverifiers: Number of threads that verify found shares and hand them over
+#                   to the work source (default: 2)
+#   latencypenalty: Penalty (in MHashes per second of latency) that is added to the score
+#                   of a work source based on the 90th percentile of its getwork and
+#                   share submission latencies (default: 0). Slow work sources cause
+#                   more stale shares, setting this will make them less favored.
+#   getworkbatchsize: Maximum number of jobs that are requested from a work source
+#                     at once, if it supports that (default: 8)
+#   jobslices: Number of nonce range slices that a job is split into for workers
+#              which can process partial nonce ranges, e.g. software workers
+#              (default: 4). This reduces the number of work requests needed
+#              to keep those workers busy by the same factor.
+#   breakerthreshold: Number of consecutive failed work requests after which a work
+#                     source is taken out of service (default: 3)
+#   breakeropentime: Time (in seconds) after which a work source that was taken out of
+#                    service is probed again (default: 5). This is doubled after every
+#                    failed probe, up to breakermaxopentime (default: 300).
+#   standbyjobs: Number of jobs that are kept pre-fetched for work sources which are
+#                currently not in use (default: 2). This keeps their connections warm
+#                and allows for failing over to them without leaving workers idle.
+#   standbyrefresh: A work source is considered to be on standby if no work has been
+#                   requested from it for that many seconds (default: 30). Standby jobs
+#                   are kept until a new block is found or they get older than the work
+#                   source's rollexpire or maxshareage setting, if it has one.
+#   getworkconcurrency: Initial limit for the number of concurrent work requests to a single
+#                       work source (default: 4). The limit is adjusted automatically:
+#                       It grows while requests are answered quickly and is halved if
+#                       they fail or take longer than getworkcongestion seconds (default:
+#                       half of getworktimeout). Work requests wait until a slot is free.
+#   maxgetworkconcurrency: Upper limit for the above (default: 32)
+#   prewarm: Request one job from every work source in parallel at startup, while the
+#            workers are still initializing, before any other work is requested (default: True).
+#            The responses are used to seed the work source scores, the jobs go to the buffer.
+#   prewarmtimeout: Maximum time (in seconds) that normal work fetching is held back
+#                   while the work sources are being pre-warmed (default: 5)
+#   prewarmlatencybias: Bias (in MHashes per second) that is multiplied with the amount of
+#                       time that a work source took longer to answer the pre-warm request
+#                       than the fastest one and credited to it (default: -2000)
+#   prewarmlongpollbias: Bias (in MHashes) that is credited to work sources which don't
+#                        support long polling after they were pre-warmed (default: -1000)
+#   blocklog: Path of a file that shares which solve a block are appended to. Each entry is
+#             synced to disk right after the upload has been started (default: "blocks.log",
+#             None to disable)
 
 
 import os
@@ -78,6 +125,8 @@ import traceback
 import struct
 import binascii
 import traceback
+import collections
+import common
 try: import queue
 except ImportError: import Queue as queue
 
@@ -139,11 +188,39 @@ class Miner(object):
     self.uploadfailbias = getattr(self.config, "uploadfailbias", -100)
     self.stalebias = getattr(self.config, "stalebias", -15000)
     self.biasdecay = getattr(self.config, "biasdecay", 0.9995)
+    self.sharequeuelength = getattr(self.config, "sharequeuelength", 1000)
+    self.shareverifiers = getattr(self.config, "shareverifiers", 2)
+    self.jobslices = max(1, getattr(self.config, "jobslices", 4))
+    self.getworkbatchsize = getattr(self.config, "getworkbatchsize", 8)
+    self.latencypenalty = getattr(self.config, "latencypenalty", 0)
+    self.breakerthreshold = getattr(self.config, "breakerthreshold", 3)
+    self.breakeropentime = getattr(self.config, "breakeropentime", 5)
+    self.breakermaxopentime = getattr(self.config, "breakermaxopentime", 300)
+    self.standbyjobs = getattr(self.config, "standbyjobs", 2)
+    self.standbyrefresh = getattr(self.config, "standbyrefresh", 30)
+    self.getworkconcurrency = getattr(self.config, "getworkconcurrency", 4)
+    self.maxgetworkconcurrency = getattr(self.config, "maxgetworkconcurrency", 32)
+    self.getworkcongestion = getattr(self.config, "getworkcongestion", self.getworktimeout / 2.)
+    self.prewarm = getattr(self.config, "prewarm", True)
+    self.prewarmtimeout = getattr(self.config, "prewarmtimeout", 5)
+    self.prewarmlatencybias = getattr(self.config, "prewarmlatencybias", -2000)
+    self.prewarmlongpollbias = getattr(self.config, "prewarmlongpollbias", -1000)
+    self.blocklog = getattr(self.config, "blocklog", "blocks.log")
     self.queue = queue.Queue()
+    self.slicestash = collections.deque()
+    self.sharequeue = queue.Queue(self.sharequeuelength)
+    self.sharestatlock = threading.RLock()
+    self.sharesdropped = 0
+    self.sharewaitlatency = common.LatencyMeter()
+    self.shareverifylatency = common.LatencyMeter()
+    self.sharesubmitlatency = common.LatencyMeter()
+    self.blocksfound = 0
+    self.blocklock = threading.Lock()
     self.queuelength = 3
     self.jobspersecond = 0.1
     self.mhps = 0
     self.fetchersrunning = 0
+    self.prewarming = False
     self.loglf = True
     self.interfaces = []
     self.pools = []
@@ -154,6 +231,10 @@ class Miner(object):
     self.loggerthread = threading.Thread(None, self.logger, "logger")
     self.loggerthread.daemon = True
     self.loggerthread.start()
+    for i in range(self.shareverifiers):
+      thread = threading.Thread(None, self.shareverifier, "shareverifier_%d" % i)
+      thread.daemon = True
+      thread.start()
     self.log("%s, Copyright (C) 2011-2012 Michael Sparmann (TheSeven)\n" % self.useragent, "B")
     self.log("Modular Python Bitcoin Miner comes with ABSOLUTELY NO WARRANTY.\n")
     self.log("This is free software, and you are welcome to redistribute it under certain conditions.\n")
@@ -168,88 +249,319 @@ class Miner(object):
       for p in b["pools"]:
         self.pools.append(p["type"](miner, blockchain, p))
     if len(self.pools) == 0: raise Exception("No pools defined!")
-    self.adjustfetchers()
+    for p in self.pools:
+      p.breaker = common.CircuitBreaker(self.breakerthreshold, self.breakeropentime, self.breakermaxopentime)
+      p.standbystash = collections.deque()
+      limits = [getattr(p, name) for name in ("rollexpire", "maxshareage") if hasattr(p, name)]
+      p.standbymaxage = min(limits) if len(limits) > 0 else None
+      p.standbyfetching = False
+      p.lastfetch = time.time()
+      p.limiter = common.ConcurrencyLimiter(self.getworkconcurrency, self.maxgetworkconcurrency, self.getworkcongestion)
+    # Work sources that can return futures share a single thread instead of one per request
+    if any(getattr(p, "nonblocking", False) for p in self.pools):
+      self.fetchqueue = queue.Queue()
+      self.fetchthread = threading.Thread(None, self.fetchdispatcher, "fetchdispatcher")
+      self.fetchthread.daemon = True
+      self.fetchthread.start()
+    self.healththread = threading.Thread(None, self.healthmonitor, "healthmonitor")
+    self.healththread.daemon = True
+    self.healththread.start()
+    # Workers may take a while to initialize (e.g. FPGA validation jobs), probe the work sources meanwhile
+    if self.prewarm: prewarmthreads = self.startprewarm()
+    else: self.adjustfetchers()
     for w in config.workers:
       self.workers.append(w["type"](miner, w))
     if len(self.workers) == 0: raise Exception("No workers defined!")
+    if self.prewarm: self.finishprewarm(prewarmthreads)
+    # Workers may have reported their hash rate before they were added to the list
+    self.updatehashrate(None)
     while True: time.sleep(100)
 
   def adjustfetchers(self, offset = 0):
     with self.fetcherlock:
-      while self.queuelength + offset - self.queue.qsize() - self.fetchersrunning > 0:
-        self.spawnfetcher()
+      if self.prewarming: return
+      while True:
+        missing = self.queuelength + offset - self.queue.qsize() - self.fetchersrunning
+        if missing <= 0: break
+        # If all work sources are at their concurrency limit, this is retried once a request finishes
+        if not self.spawnfetcher(missing): break
 
-  def spawnfetcher(self):
+  def spawnfetcher(self, count = 1):
     with self.fetcherlock:
-      self.fetchersrunning = self.fetchersrunning + 1
-      queuedelay = self.queuelength / self.jobspersecond
+      queuedelay = self.queuelength / max(0.01, self.jobspersecond)
       while True:
         now = time.time()
         best = None
         pool = None
+        limited = False
         for p in self.pools:
           p.score = p.score * self.biasdecay
           excessmhashes = p.mhashes - ((now - p.starttime) + queuedelay) * p.hashrate
-          score = excessmhashes - p.score
+          score = excessmhashes - p.score + self.latencypenalty * self.poollatency(p)
           if excessmhashes - max(0, p.score) >= 0:
             if p.priority > 0: score = max(0, score / p.priority)
-            else: score = "inf"
-          if now >= p.blockeduntil and (best == None or score < best):
+            else: score = float("inf")
+          if now < p.blockeduntil or not p.breaker.available(): continue
+          if not p.limiter.available(): limited = True
+          elif best == None or score < best:
             best = score
             pool = p
+        if pool == None and limited: return False
         if pool != None:
-          pool.score = pool.score + self.getworkbias
-          thread = threading.Thread(None, self.fetcher, pool.name + "_fetcher", kwargs = {"pool": pool})
+          if hasattr(pool, "getworkbatch"): count = max(1, min(count, self.getworkbatchsize))
+          else: count = 1
+          self.fetchersrunning = self.fetchersrunning + count
+          pool.score = pool.score + self.getworkbias * count
+          pool.lastfetch = now
+          token = pool.limiter.acquire()
+          if getattr(pool, "nonblocking", False):
+            self.fetchqueue.put((pool, count, token, None, None))
+            return True
+          thread = threading.Thread(None, self.fetcher, pool.name + "_fetcher", (pool, count, token))
           thread.daemon = True
           thread.start()
-          break
+          return True
         time.sleep(0.1)
 
-  def fetcher(self, pool):
+  def poollatency(self, pool):
+    if self.latencypenalty == 0: return 0
+    latency = 0
+    for meter in (getattr(pool, "getworklatency", None), getattr(pool, "submitlatency", None)):
+      if meter != None: latency = latency + meter.percentile(90)
+    return latency
+
+  def syncepoch(self, pool):
     with self.queuelock:
       if (time.time() - pool.blockchain.lastlongpoll) > self.longpollgrouptime:
         pool.longpollepoch = pool.blockchain.longpollepoch
-      epoch = pool.longpollepoch
+      return pool.longpollepoch
+
+  def fetcher(self, pool, count, token):
+    epoch = self.beginfetch(pool, count)
+    if epoch == None: return
+    jobs = self.takestandbyjobs(pool, count)
+    if len(jobs) > 0: pool.limiter.release()
+    else:
+      try:
+        jobs = self.requestjobs(pool, count)
+        pool.limiter.success(token)
+        pool.breaker.success()
+      except Exception as e:
+        jobs = []
+        pool.limiter.failure(token)
+        self.fetchfailed(pool, e)
+    self.endfetch(pool, count, epoch, jobs)
+
+  # Same as fetcher(), for work sources that return futures. Requests are started and their
+  # results are processed by this thread, the work source's network I/O doesn't need any.
+  def fetchdispatcher(self):
+    while True:
+      (pool, count, token, epoch, future) = self.fetchqueue.get()
+      try:
+        if future == None:
+          epoch = self.beginfetch(pool, count)
+          if epoch == None: continue
+          jobs = self.takestandbyjobs(pool, count)
+          if len(jobs) > 0: pool.limiter.release()
+          else:
+            try:
+              future = pool.getworkfuture(count)
+              future.add_done_callback(lambda future, pool = pool, count = count, token = token, epoch = epoch: self.fetchqueue.put((pool, count, token, epoch, future)))
+              continue
+            except Exception as e:
+              pool.limiter.failure(token)
+              self.fetchfailed(pool, e)
+          self.endfetch(pool, count, epoch, jobs)
+          continue
+        try:
+          jobs = self.requestjobs(pool, count, future)
+          pool.limiter.success(token)
+          pool.breaker.success()
+        except Exception as e:
+          jobs = []
+          pool.limiter.failure(token)
+          self.fetchfailed(pool, e)
+        self.endfetch(pool, count, epoch, jobs)
+      except Exception as e:
+        self.log("Error while processing work from %s: %s\n" % (pool.name, e), "rB")
+
+  # Returns the long poll epoch that the requested jobs will belong to,
+  # or None if the work source is blocked until the long poll grouping time has passed.
+  def beginfetch(self, pool, count):
+    with self.queuelock:
+      epoch = self.syncepoch(pool)
       if epoch < pool.blockchain.longpollepoch:
         pool.blockeduntil = pool.blockchain.lastlongpoll + self.longpollgrouptime
+        pool.limiter.release()
         with self.fetcherlock:
-          self.fetchersrunning = self.fetchersrunning - 1
+          self.fetchersrunning = self.fetchersrunning - count
           self.adjustfetchers()
-        with pool.statlock: pool.score = pool.score - self.getworkbias
-        return
-    job = None
-    try:
-      with pool.statlock: pool.requests = pool.requests + 1
-      job = pool.getwork()
-    except Exception as e:
-      self.log("Error while requesting job from %s: %s\n" % (pool.name, e), "rB")
-      with pool.statlock:
-        pool.failedreqs = pool.failedreqs + 1
-        pool.score = pool.score + self.getworkfailbias
-      with self.queuelock:
-        pool.blockeduntil = time.time() + 3
-    if job != None:
+        with pool.statlock: pool.score = pool.score - self.getworkbias * count
+        return None
+      return epoch
+
+  def fetchfailed(self, pool, error):
+    self.log("Error while requesting job from %s: %s\n" % (pool.name, error), "rB")
+    with pool.statlock: pool.score = pool.score + self.getworkfailbias
+    # Don't let all fetchers hammer a failing work source until the breaker trips
+    pool.blockeduntil = time.time() + 3
+    self.poolfailed(pool)
+
+  def endfetch(self, pool, count, epoch, jobs):
+    if len(jobs) > 0:
       self.queuelock.acquire()
       if epoch == pool.blockchain.longpollepoch:
-        self.queue.put(job)
+        for job in jobs: self.queue.put(job)
         self.queuelock.release()
       else:
         self.queuelock.release()
         with pool.statlock:
-          pool.longpollkilled = pool.longpollkilled + 1
-          pool.score = pool.score + self.longpollkillbias
-      pool.difficulty = 65535.0 * 2**48 / struct.unpack("<Q", job.target[-12:-4])[0]
+          pool.longpollkilled = pool.longpollkilled + len(jobs)
+          pool.score = pool.score + self.longpollkillbias * len(jobs)
+      pool.difficulty = jobs[-1].difficulty
+    if len(jobs) < count:
+      with pool.statlock: pool.score = pool.score - self.getworkbias * (count - max(1, len(jobs)))
     with self.fetcherlock:
-      self.fetchersrunning = self.fetchersrunning - 1
+      self.fetchersrunning = self.fetchersrunning - count
       self.adjustfetchers()
     
+  def requestjobs(self, pool, count, future = None):
+    try:
+      if future != None: jobs = future.result()
+      elif count > 1: jobs = pool.getworkbatch(count)
+      else: jobs = [pool.getwork()]
+      with pool.statlock: pool.requests = pool.requests + len(jobs)
+      return jobs
+    except:
+      with pool.statlock:
+        pool.requests = pool.requests + 1
+        pool.failedreqs = pool.failedreqs + 1
+      raise
+
+  def poolfailed(self, pool):
+    if pool.breaker.failure():
+      with self.queuelock: pool.standbystash.clear()
+      self.log("%s failed %d times in a row, not using it for %d seconds\n" % (pool.name, pool.breaker.failures, pool.breaker.opentime), "rB")
+
+  def takestandbyjobs(self, pool, count):
+    jobs = []
+    with self.queuelock:
+      while len(pool.standbystash) > 0 and len(jobs) < count:
+        entry = pool.standbystash.popleft()
+        if not self.standbyexpired(pool, entry, time.time()): jobs.append(entry[1])
+    return jobs
+
+  def startprewarm(self):
+    self.prewarming = True
+    self.prewarmstart = time.time()
+    threads = []
+    for pool in self.pools:
+      pool.prewarmlatency = None
+      thread = threading.Thread(None, self.prewarmprobe, pool.name + "_prewarm", (pool,))
+      thread.daemon = True
+      thread.start()
+      threads.append(thread)
+    return threads
+
+  def prewarmprobe(self, pool):
+    starttime = time.time()
+    try:
+      jobs = self.requestjobs(pool, 1)
+      pool.prewarmlatency = time.time() - starttime
+      pool.breaker.success()
+      with self.queuelock:
+        for job in jobs:
+          if job.longpollepoch == pool.blockchain.longpollepoch: self.queue.put(job)
+      pool.difficulty = jobs[-1].difficulty
+    except Exception as e:
+      self.log("Error while pre-warming %s: %s\n" % (pool.name, e), "rB")
+      with pool.statlock: pool.score = pool.score + self.getworkfailbias
+      self.poolfailed(pool)
+
+  # Seeds the work source scores from the pre-warm results and starts fetching work normally
+  def finishprewarm(self, threads):
+    for thread in threads: thread.join(max(0, self.prewarmstart + self.prewarmtimeout - time.time()))
+    latencies = [p.prewarmlatency for p in self.pools if p.prewarmlatency != None]
+    fastest = min(latencies) if len(latencies) > 0 else 0
+    for pool, thread in zip(self.pools, threads):
+      latency = pool.prewarmlatency
+      capabilities = pool.capabilities() if hasattr(pool, "capabilities") else {"longpoll": getattr(pool, "longpolling", None)}
+      with pool.statlock:
+        if latency != None: pool.score = pool.score + self.prewarmlatencybias * (latency - fastest)
+        elif thread.is_alive(): pool.score = pool.score + self.getworkfailbias
+        if latency != None and capabilities.get("longpoll") == False: pool.score = pool.score + self.prewarmlongpollbias
+      if latency == None: result = "timed out" if thread.is_alive() else "failed"
+      else: result = "%d ms" % (latency * 1000)
+      for name, value in sorted(capabilities.items()):
+        if latency != None and value != None: result = result + ", %s: %s" % (name, "yes" if value else "no")
+      self.log("Pre-warmed %s: %s\n" % (pool.name, result), "B")
+    with self.fetcherlock:
+      self.prewarming = False
+      self.adjustfetchers()
+
+  def healthmonitor(self):
+    while True:
+      now = time.time()
+      for pool in self.pools:
+        if pool.breaker.probedue():
+          thread = threading.Thread(None, self.healthprobe, pool.name + "_healthprobe", (pool,))
+          thread.daemon = True
+          thread.start()
+          continue
+        with self.queuelock:
+          while len(pool.standbystash) > 0 and self.standbyexpired(pool, pool.standbystash[0], now):
+            pool.standbystash.popleft()
+          missing = self.standbyjobs - len(pool.standbystash)
+          if missing <= 0 or pool.standbyfetching or not pool.breaker.available() \
+             or now - pool.lastfetch < self.standbyrefresh: continue
+          pool.standbyfetching = True
+        thread = threading.Thread(None, self.standbyfetcher, pool.name + "_standbyfetcher", (pool, missing))
+        thread.daemon = True
+        thread.start()
+      time.sleep(1)
+
+  def healthprobe(self, pool):
+    try:
+      if hasattr(pool, "healthcheck"): pool.healthcheck()
+      else: self.stashstandbyjobs(pool, self.requestjobs(pool, 1))
+      pool.breaker.success()
+      self.log("%s is responding again\n" % pool.name, "g")
+      self.adjustfetchers()
+    except Exception as e:
+      self.log("Health probe of %s failed: %s\n" % (pool.name, e), "rB")
+      self.poolfailed(pool)
+
+  def standbyfetcher(self, pool, count):
+    try:
+      if self.syncepoch(pool) < pool.blockchain.longpollepoch: return
+      if not hasattr(pool, "getworkbatch"): count = 1
+      self.stashstandbyjobs(pool, self.requestjobs(pool, count))
+      pool.breaker.success()
+    except Exception as e:
+      self.log("Error while requesting standby job from %s: %s\n" % (pool.name, e), "rB")
+      self.poolfailed(pool)
+    finally:
+      with self.queuelock: pool.standbyfetching = False
+
+  # Standby jobs don't need to be refreshed unless the block changed or the work source limits their age
+  def standbyexpired(self, pool, entry, now):
+    (timestamp, job) = entry
+    if job.longpollepoch != pool.blockchain.longpollepoch: return True
+    return pool.standbymaxage != None and now - timestamp >= pool.standbymaxage
+
+  def stashstandbyjobs(self, pool, jobs):
+    with self.queuelock:
+      for job in jobs:
+        if job.longpollepoch == pool.blockchain.longpollepoch: pool.standbystash.append((time.time(), job))
+
   def calculatehashrate(self, children):
     mhps = 0
     jobspersec = 0
     for child in children:
       (childmhps, childjobspersec) = self.calculatehashrate(child.children)
       mhps = mhps + child.mhps + childmhps
-      jobspersec = jobspersec + child.jobspersecond + childjobspersec
+      if getattr(child, "noncerange", False): jobspersec = jobspersec + 1. * child.jobspersecond / self.jobslices + childjobspersec
+      else: jobspersec = jobspersec + child.jobspersecond + childjobspersec
     return (mhps, jobspersec)
 
   def updatehashrate(self, worker):
@@ -260,6 +572,7 @@ class Miner(object):
     self.adjustfetchers()
 
   def getjob(self, worker):
+    if self.jobslices > 1 and getattr(worker, "noncerange", False): return self.getslice(worker)
     job = self.queue.get()
     self.adjustfetchers()
     with job.pool.statlock:
@@ -268,45 +581,155 @@ class Miner(object):
     self.log("Mining %s:%s:%s on %s\n" % (job.pool.name, binascii.hexlify(job.state).decode("ascii"), binascii.hexlify(job.data[64:76]).decode("ascii"), worker.name))
     return job
 
-  def newblock(self, job):
+  # Puts a job that was taken out of the work buffer back, unless the block changed since
+  def requeuejob(self, job):
+    with self.queuelock:
+      if job.longpollepoch == job.pool.blockchain.longpollepoch: self.queue.put(job)
+
+  def getslice(self, worker):
+    job = None
+    with self.queuelock:
+      if len(self.slicestash) > 0: job = self.slicestash.popleft()
+    if job == None:
+      job = self.queue.get()
+      self.adjustfetchers()
+      with job.pool.statlock:
+        job.pool.jobsaccepted = job.pool.jobsaccepted + 1
+        job.pool.score = job.pool.score + self.jobstartbias
+      slices = job.slice(self.jobslices)
+      job = slices[0]
+      with self.queuelock:
+        if job.longpollepoch == job.pool.blockchain.longpollepoch: self.slicestash.extend(slices[1:])
+    self.log("Mining %s:%s:%s[%08x-%08x] on %s\n" % (job.pool.name, binascii.hexlify(job.state).decode("ascii"), binascii.hexlify(job.data[64:76]).decode("ascii"), job.startnonce, job.endnonce - 1, worker.name))
+    return job
+
+  # Shares are hashed as they arrive, so that block solutions can be submitted right away
+  # instead of waiting behind other shares in the queue or being dropped if it's full
+  def queueshare(self, jobs, nonce, worker, hash = None):
+    timestamp = time.time()
+    if hash != None: job = jobs[0]
+    else: (job, hash) = self.attributeshare(jobs, nonce)
+    if hash[-4:] == b"\0\0\0\0" and job.solvesblock(hash): return self.verifyshare(job, nonce, worker, hash, timestamp)
+    try: self.sharequeue.put((job, nonce, worker, hash, timestamp), False)
+    except queue.Full:
+      with self.sharestatlock: self.sharesdropped = self.sharesdropped + 1
+      self.log("Share verification queue is full, dropping share %s from %s\n" % (binascii.hexlify(nonce).decode("ascii"), worker.name), "rB")
+
+  def attributeshare(self, jobs, nonce):
+    firsthash = None
+    for job in jobs:
+      hash = job.hashnonce(nonce)
+      if hash[-4:] == b"\0\0\0\0": return (job, hash)
+      if firsthash == None: firsthash = hash
+    return (jobs[0], firsthash)
+
+  def shareverifier(self):
+    while True:
+      (job, nonce, worker, hash, timestamp) = self.sharequeue.get()
+      self.verifyshare(job, nonce, worker, hash, timestamp)
+
+  def verifyshare(self, job, nonce, worker, hash, timestamp):
+    try:
+      dequeued = time.time()
+      self.sharewaitlatency.record(dequeued - timestamp)
+      if not job.registernonce(nonce):
+        self.log("%s sent duplicate share %s\n" % (worker.name, binascii.hexlify(nonce).decode("ascii")), "y")
+        with worker.statlock: worker.duplicates = worker.duplicates + 1
+        return
+      if hash[-4:] == b"\0\0\0\0" and job.solvesblock(hash):
+        self.sendblock(job, nonce, worker, hash)
+        self.sharesubmitlatency.record(time.time() - dequeued)
+        job.checkresult(nonce, worker, hash)
+        return
+      result = job.checkresult(nonce, worker, hash)
+      verified = time.time()
+      self.shareverifylatency.record(verified - dequeued)
+      if result != None:
+        (data, difficulty) = result
+        job.pool.sendresult(job, data, nonce, difficulty, worker)
+        self.sharesubmitlatency.record(time.time() - verified)
+    except Exception as e:
+      self.log("Error while verifying share %s from %s: %s\n" % (binascii.hexlify(nonce).decode("ascii"), worker.name, e), "rB")
+
+  # Block solutions are handed to the work source's fast path if it has one, which doesn't
+  # queue them behind other shares. Logging and accounting only happen once that's done.
+  def sendblock(self, job, nonce, worker, hash):
+    data = job.data[:76] + nonce + job.data[80:]
+    difficulty = common.difficulty(int(binascii.hexlify(hash[::-1]), 16))
+    getattr(job.pool, "sendblock", job.pool.sendresult)(job, data, nonce, difficulty, worker)
+    blockhash = binascii.hexlify(hash[::-1]).decode("ascii")
+    with self.sharestatlock: self.blocksfound = self.blocksfound + 1
+    if self.blocklog != None:
+      try:
+        with self.blocklock:
+          with open(self.blocklog, "a") as f:
+            f.write("%s %s %s %s %s\n" % (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"), blockhash, \
+                                          binascii.hexlify(data[:80]).decode("ascii"), job.pool.name, worker.name))
+            f.flush()
+            os.fsync(f.fileno())
+      except Exception as e: self.log("Failed to write block log: %s\n" % e, "rB")
+    self.log("%s found block %s, submitted to %s!\n" % (worker.name, blockhash, job.pool.name), "gB")
+
+  # Work sources which get notified about new blocks without new work can pass job = None
+  # Followers are work sources that share the long poll connection of the announcing one,
+  # they are treated as if they had announced the block at the same time.
+  def newblock(self, job, pool = None, followers = []):
+    if job != None: pool = job.pool
     with self.queuelock:
-      job.pool.longpollepoch = job.pool.longpollepoch + 1
-      if job.pool.longpollepoch >= job.pool.blockchain.longpollepoch:
-        job.pool.blockeduntil = time.time()
-      if job.pool.longpollepoch > job.pool.blockchain.longpollepoch:
-        job.pool.blockchain.lastlongpoll = time.time()
-        job.pool.blockchain.longpollepoch = job.pool.longpollepoch
+      for p in [pool] + list(followers):
+        p.longpollepoch = p.longpollepoch + 1
+        if p.longpollepoch >= p.blockchain.longpollepoch:
+          p.blockeduntil = time.time()
+      if pool.longpollepoch > pool.blockchain.longpollepoch:
+        pool.blockchain.lastlongpoll = time.time()
+        pool.blockchain.longpollepoch = pool.longpollepoch
         for w in self.workers:
-          try: w.cancel(job.pool.blockchain)
+          try: w.cancel(pool.blockchain)
           except: pass
         save = []
         while True:
           try:
             j = self.queue.get(False)
-            if j.pool.blockchain != job.pool.blockchain: save.append(j)
+            if j.pool.blockchain != pool.blockchain: save.append(j)
             else:
               with j.pool.statlock:
                 j.pool.longpollkilled = j.pool.longpollkilled + 1
                 j.pool.score = j.pool.score + self.longpollkillbias
           except: break
         for j in save: self.queue.put(j)
-        with job.pool.statlock:
-          job.pool.requests = job.pool.requests + 1
-          job.pool.score = job.pool.score + self.getworkbias
-          if self.queue.qsize() <= self.queuelength * 1.5:
-            self.queue.put(job)
-          else:
-            job.pool.longpollkilled = job.pool.longpollkilled + 1
-            job.pool.score = job.pool.score + self.longpollkillbias
-          job.pool.difficulty = 65535.0 * 2**48 / struct.unpack("<Q", job.target[-12:-4])[0]
+        save = [j for j in self.slicestash if j.pool.blockchain != pool.blockchain]
+        self.slicestash.clear()
+        self.slicestash.extend(save)
+        for p in self.pools:
+          if p.blockchain == pool.blockchain: p.standbystash.clear()
+        if job != None:
+          # The job was created before the epoch was bumped, but it belongs to the new block
+          job.longpollepoch = pool.longpollepoch
+          with pool.statlock:
+            pool.requests = pool.requests + 1
+            pool.score = pool.score + self.getworkbias
+            if self.queue.qsize() <= self.queuelength * 1.5:
+              self.queue.put(job)
+            else:
+              pool.longpollkilled = pool.longpollkilled + 1
+              pool.score = pool.score + self.longpollkillbias
+            pool.difficulty = job.difficulty
     self.adjustfetchers()
-    self.log("Long polling: %s indicates that a new block was found\n" % job.pool.name, "B")
+    if len(followers) > 0:
+      self.log("Long polling: %s (shared with %s) indicates that a new block was found\n" % (pool.name, ", ".join(p.name for p in followers)), "B")
+    else: self.log("Long polling: %s indicates that a new block was found\n" % pool.name, "B")
     
   def collectstatistics(self, children):
     statistics = []
     for child in children:
       childstats = self.collectstatistics(child.children)
-      statistics.append(child.getstatistics(childstats))
+      stats = child.getstatistics(childstats)
+      if hasattr(child, "breaker"):
+        stats["circuit"] = child.breaker.state
+        stats["standbyjobs"] = len(child.standbystash)
+        stats["inflight"] = child.limiter.inflight
+        stats["concurrencylimit"] = int(child.limiter.limit)
+      statistics.append(stats)
     return statistics
 
   def calculatefieldsum(self, children, field):
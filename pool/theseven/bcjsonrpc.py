@@ -38,19 +38,106 @@
 #   getworktimeout: Timeout (in seconds) for getwork requests (default: global setting)
 #   sendsharetimeout: Share upload timeout in seconds (default: global setting)
 #   longpolltimeout: Long poll connection inactivity timeout (default: global setting)
+#   keepaliveconnections: Maximum number of idle HTTP connections that are kept open
+#                         for reuse (default: 4)
+#   keepalivetime: Idle HTTP connections are closed after that many seconds (default: 60)
+#   uploadthreads: Number of threads that upload shares to this work source (default: 4)
+#   uploadbacklog: Maximum number of shares that may be waiting for upload (default: 100).
+#                  Shares that arrive while the backlog is full are dropped.
+#   uploadretrydelay: Initial delay between share upload retries in seconds (default: 1).
+#                     This is doubled for every further retry of the same share.
+#   uploadmaxretrydelay: Maximum delay between share upload retries in seconds (default: 30)
+#   maxshareage: Shares that couldn't be uploaded within that many seconds are discarded
+#                (default: 300)
+#   hedgeuploads: If a share upload hasn't been answered after the hedgepercentile percentile of
+#                 recent share submission latencies, send the share again over a new connection
+#                 and use whichever answer comes first (default: False)
+#   hedgepercentile: Percentile of the submission latency after which uploads are hedged (default: 95)
+#   hedgemindelay: Minimum time (in seconds) before an upload is hedged (default: 0.25)
+#   blockuploads: Shares that solve a block skip the upload backlog and are sent over that many
+#                 connections in parallel (default: 3)
+#   rollntime: Generate additional work by incrementing the timestamp of work from servers
+#              that allow this using the X-Roll-NTime header (default: True)
+#   rollexpire: Rolled work is generated from a piece of work for that many seconds after
+#               it was received, unless the server specifies a limit (default: 60)
+#   maxrolls: Maximum number of jobs that are generated from a piece of work (default: 60)
+#   dnsttl: Host names are resolved again in the background after that many seconds
+#           (default: 300). If that fails, the previously resolved addresses are kept.
+#   batchrequests: Request multiple jobs at once using JSON RPC batch requests (default: True).
+#                  Servers which don't support this are detected automatically.
+#   sharelongpoll: Share a single long poll connection between all work sources of the same
+#                  blockchain whose long poll URLs are the same (default: True).
+#                  Only the work source that opened it gets work from the long poll response,
+#                  the others just learn about the new block and request new work.
+#   asyncengine: Handle all getwork requests, share uploads and long polls of this work source
+#                on an event loop that is shared by all work sources which have this enabled,
+#                instead of using threads that wait on their sockets (default: False).
+#                uploadthreads is the number of concurrent share uploads in that case.
+#                Requires Python 3.
 
 
 import sys
 import common
+import random
 import base64
 import time
 import json
 import threading
 import curses
 import binascii
-import time
+import struct
 try: import http.client as http_client
 except ImportError: import httplib as http_client
+try: import queue
+except ImportError: import Queue as queue
+
+# Work sources which share long poll connections, by blockchain, path, host name and port
+longpollgroups = {}
+longpolllock = threading.Lock()
+
+# A share upload that may be sent twice: the primary attempt (index 0) and a hedge (index 1).
+# An acceptance wins immediately. A rejection only counts once the other attempt is done,
+# because it may just be the server complaining about getting the same share twice.
+# Block solutions use the same logic for more attempts which are all started at once.
+class HedgedUpload(object):
+  def __init__(self, pool, callback, attempts = 2, hedge = True):
+    self.pool = pool
+    self.callback = callback
+    self.hedge = hedge
+    self.lock = threading.Lock()
+    self.event = threading.Event()
+    self.running = 0
+    self.outcomes = [None] * attempts
+    self.outcome = None
+    self.winner = None
+    self.decidedat = None
+
+  # Returns False if the outcome is already known, so the attempt doesn't need to be made
+  def start(self):
+    with self.lock:
+      if self.winner != None: return False
+      self.running = self.running + 1
+      return True
+
+  # The outcome is the upload result, or the exception that the attempt failed with
+  def finish(self, index, outcome):
+    with self.lock:
+      self.running = self.running - 1
+      self.outcomes[index] = outcome
+      if self.winner != None:
+        if self.hedge and self.winner == 1 and index == 0: self.pool.hedgegain.record(time.time() - self.decidedat)
+        return
+      if outcome != True:
+        if self.running > 0: return
+        results = [o for o in self.outcomes if o != None and not isinstance(o, Exception)]
+        if len(results) > 0: outcome = results[0]
+      self.outcome = outcome
+      self.winner = index
+      self.decidedat = time.time()
+    if self.hedge and index == 1 and outcome == True:
+      with self.pool.statlock: self.pool.hedgewins = self.pool.hedgewins + 1
+    try: self.callback(outcome)
+    finally: self.event.set()
 
 class JSONRPCPool(object):
   def __init__(self, miner, blockchain, dict):
@@ -65,6 +152,23 @@ class JSONRPCPool(object):
     self.longpolltimeout = getattr(self, "longpolltimeout", self.miner.longpolltimeout)
     self.priority = getattr(self, "priority", 1)
     self.hashrate = getattr(self, "hashrate", 0)
+    self.keepaliveconnections = getattr(self, "keepaliveconnections", 4)
+    self.keepalivetime = getattr(self, "keepalivetime", 60)
+    self.dnsttl = getattr(self, "dnsttl", 300)
+    self.uploadthreads = getattr(self, "uploadthreads", 4)
+    self.uploadbacklog = getattr(self, "uploadbacklog", 100)
+    self.uploadretrydelay = getattr(self, "uploadretrydelay", 1)
+    self.uploadmaxretrydelay = getattr(self, "uploadmaxretrydelay", 30)
+    self.maxshareage = getattr(self, "maxshareage", 300)
+    self.hedgeuploads = getattr(self, "hedgeuploads", False)
+    self.hedgepercentile = getattr(self, "hedgepercentile", 95)
+    self.hedgemindelay = getattr(self, "hedgemindelay", 0.25)
+    self.blockuploads = getattr(self, "blockuploads", 3)
+    self.rollntime = getattr(self, "rollntime", True)
+    self.rollexpire = getattr(self, "rollexpire", 60)
+    self.maxrolls = getattr(self, "maxrolls", 60)
+    self.batchsupport = None if getattr(self, "batchrequests", True) else False
+    self.sharelongpoll = getattr(self, "sharelongpoll", True)
     self.username = getattr(self, "username", "")
     self.password = getattr(self, "password", "")
     if self.username == "" and self.password == "": self.auth = None
@@ -72,9 +176,24 @@ class JSONRPCPool(object):
     self.port = getattr(self, "port", 8332)
     self.path = getattr(self, "path", "/")
     self.name = getattr(self, "name", self.host)
+    self.engine = None
+    if getattr(self, "asyncengine", False):
+      import asyncengine
+      self.engine = asyncengine.getengine(self.miner)
+      self.resolver = self.engine.createresolver(self.host, self.port, self.dnsttl)
+      self.connectionpool = asyncengine.AsyncHTTPConnectionPool(self.engine, self.host, self.port, self.keepaliveconnections, self.keepalivetime, self.resolver)
+    else:
+      self.resolver = common.Resolver(self.host, self.port, self.dnsttl)
+      self.connectionpool = common.HTTPConnectionPool(self.host, self.port, self.keepaliveconnections, self.keepalivetime, self.resolver)
+    # Tells the core that it can use getworkfuture() instead of running a fetcher thread
+    self.nonblocking = self.engine != None
     self.statlock = threading.RLock()
+    self.rolllock = threading.Lock()
+    self.rollbase = None
+    self.rolledjobs = 0
     self.longpolling = None
     self.longpollepoch = 0
+    self.longpollgroup = [self]
     self.requests = 0
     self.failedreqs = 0
     self.uploadretries = 0
@@ -87,6 +206,22 @@ class JSONRPCPool(object):
     self.starttime = time.time()
     self.blockeduntil = time.time()
     self.difficulty = 0
+    self.uploadsdropped = 0
+    self.uploadlatency = common.LatencyMeter()
+    self.getworklatency = common.LatencyMeter()
+    self.midstatelatency = common.LatencyMeter()
+    self.midstatescalculated = 0
+    self.submitlatency = common.LatencyMeter()
+    self.uploadsactive = 0
+    self.hedgedsubmits = 0
+    self.hedgewins = 0
+    self.hedgegain = common.LatencyMeter()
+    self.uploadqueue = queue.Queue(self.uploadbacklog)
+    if self.engine != None: return
+    for i in range(self.uploadthreads):
+      thread = threading.Thread(None, self.uploader, self.name + "_uploader_%d" % i)
+      thread.daemon = True
+      thread.start()
 
   def getstatistics(self, childstats):
     with self.statlock:
@@ -96,6 +231,7 @@ class JSONRPCPool(object):
         "longpolling": self.longpolling, \
         "difficulty": self.difficulty, \
         "requests": self.requests, \
+        "rolledjobs": self.rolledjobs, \
         "failedreqs": self.failedreqs, \
         "jobsaccepted": self.jobsaccepted, \
         "longpollkilled": self.longpollkilled, \
@@ -105,45 +241,332 @@ class JSONRPCPool(object):
         "starttime": self.starttime, \
         "mhashes": self.mhashes, \
         "score": self.score, \
+        "httprequests": self.connectionpool.requests, \
+        "httpreused": self.connectionpool.reused, \
+        "httpconnects": self.connectionpool.connects, \
+        "httplatency": self.connectionpool.latency.average, \
+        "dnslookups": self.resolver.lookups, \
+        "dnsfailures": self.resolver.failures, \
+        "uploadbacklog": self.uploadqueue.qsize(), \
+        "uploadsdropped": self.uploadsdropped, \
+        "uploadlatency": self.uploadlatency.average, \
+        "hedgedsubmits": self.hedgedsubmits, \
+        "hedgewins": self.hedgewins, \
+        "hedgegain": self.hedgegain.average, \
+        "getworklatency": self.getworklatency.average, \
+        "getworklatency90": self.getworklatency.percentile(90), \
+        "submitlatency": self.submitlatency.average, \
+        "submitlatency90": self.submitlatency.percentile(90), \
+        "midstatescalculated": self.midstatescalculated, \
+        "midstatelatency": self.midstatelatency.average, \
       }
     return statistics
 
+  # Reported by the core after the work source was pre-warmed
+  def capabilities(self):
+    with self.statlock:
+      return { \
+        "longpoll": self.longpolling, \
+        "rollntime": self.rollbase != None, \
+        "midstate": self.midstatescalculated == 0, \
+      }
+
   def sendresult(self, job, data, nonce, difficulty, worker):
-    uploader = threading.Thread(None, self.uploadresult, self.name + "_uploadresult_" + binascii.hexlify(nonce).decode("ascii"), (job, data, nonce, difficulty, worker))
-    uploader.daemon = True
-    uploader.start()
+    try: self.uploadqueue.put((job, data, nonce, difficulty, worker, time.time()), False)
+    except queue.Full:
+      with self.statlock: self.uploadsdropped = self.uploadsdropped + 1
+      self.miner.log("Upload backlog of %s is full, dropping share %s (difficulty %.5f)\n" % (self.name, binascii.hexlify(nonce).decode("ascii"), difficulty), "rB")
+    if self.engine != None: self.asyncuploadnext()
 
-  def uploadresult(self, job, data, nonce, difficulty, worker):
+  # Block solutions don't wait for the upload threads, every attempt gets a thread of its own.
+  # The first one may use a kept alive connection, the others connect in the meantime.
+  def sendblock(self, job, data, nonce, difficulty, worker):
+    if self.engine != None: return self.asyncsendblock(job, data, nonce, difficulty, worker, time.time(), self.uploadretrydelay)
+    thread = threading.Thread(None, self.blockuploader, self.name + "_block_" + binascii.hexlify(nonce).decode("ascii"), (job, data, nonce, difficulty, worker))
+    thread.daemon = True
+    thread.start()
+
+  def blockuploader(self, job, data, nonce, difficulty, worker):
+    timestamp = time.time()
+    delay = self.uploadretrydelay
     while True:
-      try:
-        conn = http_client.HTTPConnection(self.host, self.port, True, self.sendsharetimeout)
-        req = json.dumps({"method": "getwork", "params": [binascii.hexlify(data).decode("ascii")], "id": 0}).encode("utf_8")
-        headers = {"User-Agent": self.useragent, "Content-type": "application/json", "Content-Length": len(req)}
-        if self.auth != None: headers["Authorization"] = self.auth
-        conn.request("POST", self.path, req, headers)
-        response = conn.getresponse()
-        rdata = json.loads(response.read().decode("utf_8"))
-        if rdata["result"] == True: return job.uploadcallback(nonce, worker, True)
-        if rdata["error"] != None: return job.uploadcallback(nonce, worker, rdata["error"])
-        headers = response.getheaders()
-        for h in headers:
-          if h[0].lower() == "x-reject-reason":
-            return job.uploadcallback(nonce, worker, h[1])
-        return job.uploadcallback(nonce, worker, False)
-      except Exception as e:
-        self.miner.log("Error while uploading share %s (difficulty %.5f) to %s (%s:%d): %s\n" % (binascii.hexlify(nonce).decode("ascii"), difficulty, self.name, self.host, self.port, e), "rB")
-        with self.statlock:
-          self.uploadretries = self.uploadretries + 1
-          self.score = self.score + self.miner.uploadfailbias
-        time.sleep(1)
+      upload = HedgedUpload(self, lambda outcome: self.reportblock(job, nonce, difficulty, worker, outcome), self.blockuploads, False)
+      for i in range(self.blockuploads): upload.start()
+      for i in range(self.blockuploads):
+        thread = threading.Thread(None, self.blockattempt, self.name + "_block_%d" % i, (upload, i, data))
+        thread.daemon = True
+        thread.start()
+      upload.event.wait()
+      if not isinstance(upload.outcome, Exception):
+        self.uploadlatency.record(time.time() - timestamp)
+        return
+      wait = self.uploadfailed(nonce, difficulty, timestamp, delay, upload.outcome)
+      if wait == None: return
+      time.sleep(wait)
+      delay = delay * 2
 
-  def getwork(self):
-    conn = http_client.HTTPConnection(self.host, self.port, True, self.getworktimeout)
-    req = json.dumps({"method": "getwork", "params": [], "id": 0}).encode("utf_8")
+  def blockattempt(self, upload, index, data):
+    try: outcome = self.submit(data, index > 0)
+    except Exception as e: outcome = e
+    upload.finish(index, outcome)
+
+  def reportblock(self, job, nonce, difficulty, worker, outcome):
+    if not isinstance(outcome, Exception): job.uploadcallback(nonce, worker, outcome, difficulty)
+
+  def uploader(self):
+    while True:
+      (job, data, nonce, difficulty, worker, timestamp) = self.uploadqueue.get()
+      delay = self.uploadretrydelay
+      while True:
+        try:
+          self.uploadresult(job, data, nonce, difficulty, worker)
+          self.uploadlatency.record(time.time() - timestamp)
+          break
+        except Exception as e:
+          wait = self.uploadfailed(nonce, difficulty, timestamp, delay, e)
+        if wait == None: break
+        time.sleep(wait)
+        delay = delay * 2
+
+  # Same as the uploader threads, but each attempt is a callback on the async engine
+  # instead of a blocking call. Up to uploadthreads shares are being uploaded at a time.
+  def asyncuploadnext(self):
+    while True:
+      with self.statlock:
+        if self.uploadsactive >= self.uploadthreads: return
+        try: share = self.uploadqueue.get(False)
+        except queue.Empty: return
+        self.uploadsactive = self.uploadsactive + 1
+      self.asyncupload(*(share + (self.uploadretrydelay,)))
+
+  def asyncuploadfinished(self):
+    with self.statlock: self.uploadsactive = self.uploadsactive - 1
+    self.asyncuploadnext()
+
+  def asyncupload(self, job, data, nonce, difficulty, worker, timestamp, delay):
+    done = lambda outcome: self.asyncuploaddone(outcome, job, data, nonce, difficulty, worker, timestamp, delay)
+    if not self.hedgeuploads:
+      return self.asyncsubmit(data).add_done_callback(lambda future: done(self.outcome(future)))
+    upload = HedgedUpload(self, done)
+    upload.start()
+    self.asyncsubmit(data).add_done_callback(lambda future: upload.finish(0, self.outcome(future)))
+    self.engine.calllater(self.hedgedelay(), self.asynchedge, upload, data)
+
+  def asynchedge(self, upload, data):
+    if not upload.start(): return
+    with self.statlock: self.hedgedsubmits = self.hedgedsubmits + 1
+    self.asyncsubmit(data, True).add_done_callback(lambda future: upload.finish(1, self.outcome(future)))
+
+  # Returns a future for the upload result
+  def asyncsubmit(self, data, fresh = False):
+    req = self.uploadrequest(data)
+    starttime = time.time()
+    future = self.connectionpool.requestfuture("POST", self.path, req, self.requestheaders(req), self.sendsharetimeout, fresh)
+    return self.engine.then(future, lambda result: self.uploadresponse(starttime, *result))
+
+  def outcome(self, future):
+    try: return future.result()
+    except Exception as e: return e
+
+  def asyncuploaddone(self, outcome, job, data, nonce, difficulty, worker, timestamp, delay):
+    if isinstance(outcome, Exception):
+      wait = self.uploadfailed(nonce, difficulty, timestamp, delay, outcome)
+      if wait != None: return self.engine.calllater(wait, self.asyncupload, job, data, nonce, difficulty, worker, timestamp, delay * 2)
+      return self.asyncuploadfinished()
+    self.uploadlatency.record(time.time() - timestamp)
+    self.engine.dispatch(job.uploadcallback, nonce, worker, outcome, difficulty)
+    self.asyncuploadfinished()
+
+  def asyncsendblock(self, job, data, nonce, difficulty, worker, timestamp, delay):
+    upload = HedgedUpload(self, lambda outcome: self.asyncblockdone(outcome, job, data, nonce, difficulty, worker, timestamp, delay), self.blockuploads, False)
+    for i in range(self.blockuploads): upload.start()
+    for i in range(self.blockuploads):
+      self.asyncsubmit(data, i > 0).add_done_callback(lambda future, i = i: upload.finish(i, self.outcome(future)))
+
+  def asyncblockdone(self, outcome, job, data, nonce, difficulty, worker, timestamp, delay):
+    if isinstance(outcome, Exception):
+      wait = self.uploadfailed(nonce, difficulty, timestamp, delay, outcome)
+      if wait != None: self.engine.calllater(wait, self.asyncsendblock, job, data, nonce, difficulty, worker, timestamp, delay * 2)
+      return
+    self.uploadlatency.record(time.time() - timestamp)
+    self.engine.dispatch(job.uploadcallback, nonce, worker, outcome, difficulty)
+
+  def hedgedelay(self):
+    return min(self.sendsharetimeout, max(self.hedgemindelay, self.submitlatency.percentile(self.hedgepercentile)))
+
+  # Accounts for a failed upload attempt. Returns the time to wait before the next
+  # attempt, or None if the share is too old to be retried.
+  def uploadfailed(self, nonce, difficulty, timestamp, delay, error):
+    self.miner.log("Error while uploading share %s (difficulty %.5f) to %s (%s:%d): %s\n" % (binascii.hexlify(nonce).decode("ascii"), difficulty, self.name, self.host, self.port, error), "rB")
+    with self.statlock:
+      self.uploadretries = self.uploadretries + 1
+      self.score = self.score + self.miner.uploadfailbias
+    # Back off exponentially, with some jitter to avoid retrying all shares at the same time
+    remaining = timestamp + self.maxshareage - time.time()
+    wait = min(delay * random.uniform(0.5, 1), self.uploadmaxretrydelay)
+    if wait < remaining: return wait
+    with self.statlock: self.uploadsdropped = self.uploadsdropped + 1
+    self.miner.log("Giving up on share %s (difficulty %.5f) for %s\n" % (binascii.hexlify(nonce).decode("ascii"), difficulty, self.name), "rB")
+    return None
+
+  def requestheaders(self, req):
     headers = {"User-Agent": self.useragent, "Content-type": "application/json", "Content-Length": len(req)}
     if self.auth != None: headers["Authorization"] = self.auth
-    conn.request("POST", self.path, req, headers)
-    response = conn.getresponse()
+    return headers
+
+  def uploadrequest(self, data):
+    return json.dumps({"method": "getwork", "params": [binascii.hexlify(data).decode("ascii")], "id": 0}).encode("utf_8")
+
+  def uploadresult(self, job, data, nonce, difficulty, worker):
+    if not self.hedgeuploads: return job.uploadcallback(nonce, worker, self.submit(data), difficulty)
+    # The result is reported by whichever attempt decides it, the hedge doesn't wait for us
+    def report(outcome):
+      if not isinstance(outcome, Exception): job.uploadcallback(nonce, worker, outcome, difficulty)
+    upload = HedgedUpload(self, report)
+    upload.start()
+    timer = threading.Timer(self.hedgedelay(), self.hedge, (upload, data))
+    timer.daemon = True
+    timer.start()
+    try: outcome = self.submit(data)
+    except Exception as e: outcome = e
+    timer.cancel()
+    upload.finish(0, outcome)
+    upload.event.wait()
+    if isinstance(upload.outcome, Exception): raise upload.outcome
+
+  def hedge(self, upload, data):
+    if not upload.start(): return
+    with self.statlock: self.hedgedsubmits = self.hedgedsubmits + 1
+    try: outcome = self.submit(data, True)
+    except Exception as e: outcome = e
+    upload.finish(1, outcome)
+
+  def submit(self, data, fresh = False):
+    req = self.uploadrequest(data)
+    starttime = time.time()
+    (response, rdata) = self.connectionpool.request("POST", self.path, req, self.requestheaders(req), self.sendsharetimeout, fresh)
+    return self.uploadresponse(starttime, response, rdata)
+
+  def uploadresponse(self, starttime, response, rdata):
+    self.submitlatency.record(time.time() - starttime)
+    rdata = json.loads(rdata.decode("utf_8"))
+    if rdata["result"] == True: return True
+    if rdata["error"] != None: return rdata["error"]
+    headers = response.getheaders()
+    for h in headers:
+      if h[0].lower() == "x-reject-reason": return h[1]
+    return False
+
+  def getwork(self):
+    return self.getworkbatch(1)[0]
+
+  def getworkbatch(self, count):
+    jobs = self.rolljobs(count)
+    if len(jobs) > 0: return jobs
+    batch = count > 1 and self.batchsupport != False
+    req = self.getworkrequest(count if batch else 1)
+    starttime = time.time()
+    (response, rdata) = self.connectionpool.request("POST", self.path, req, self.requestheaders(req), self.getworktimeout)
+    jobs = self.getworkresponse(batch, starttime, response, rdata)
+    # The server doesn't support batch requests, try again with a single one
+    if jobs == None: return self.getworkbatch(1)
+    return jobs
+
+  # Same as getworkbatch(), but returns a future for the job list instead of blocking.
+  # Only available if the async engine is used.
+  def getworkfuture(self, count):
+    jobs = self.rolljobs(count)
+    if len(jobs) > 0: return self.engine.completed(jobs)
+    batch = count > 1 and self.batchsupport != False
+    req = self.getworkrequest(count if batch else 1)
+    starttime = time.time()
+    future = self.connectionpool.requestfuture("POST", self.path, req, self.requestheaders(req), self.getworktimeout)
+    def process(result):
+      jobs = self.getworkresponse(batch, starttime, *result)
+      if jobs == None: return self.getworkfuture(1)
+      return jobs
+    return self.engine.then(future, process)
+
+  def getworkrequest(self, count):
+    if count < 2: return json.dumps({"method": "getwork", "params": [], "id": 0}).encode("utf_8")
+    return json.dumps([{"method": "getwork", "params": [], "id": i} for i in range(count)]).encode("utf_8")
+
+  # Returns None if a batch request failed in a way that suggests that the server doesn't support them
+  def getworkresponse(self, batch, starttime, response, rdata):
+    self.getworklatency.record(time.time() - starttime)
+    self.checklongpolling(response)
+    if not batch:
+      job = self.createjob(json.loads(rdata.decode("utf_8"))["result"])
+      self.setrollbase(job, response)
+      return [job]
+    try:
+      results = json.loads(rdata.decode("utf_8"))
+      if not isinstance(results, list): raise Exception("Got a single response instead of an array")
+      jobs = []
+      for r in results:
+        if r["result"] != None: jobs.append(self.createjob(r["result"]))
+      if len(jobs) == 0: raise Exception("Batch request didn't return any jobs")
+    except Exception as e:
+      # If the server's answer to the first batch request doesn't make sense,
+      # assume that it doesn't support them. Otherwise this is a real failure.
+      if self.batchsupport == True: raise
+      self.batchsupport = False
+      self.miner.log("%s doesn't seem to support batch requests (%s), falling back to single requests\n" % (self.name, e), "y")
+      return None
+    self.batchsupport = True
+    self.setrollbase(jobs[-1], response)
+    return jobs
+
+  def createjob(self, result):
+    data = binascii.unhexlify(result["data"].encode("ascii"))
+    if result.get("midstate") != None: state = binascii.unhexlify(result["midstate"].encode("ascii"))
+    else:
+      # Modern getwork proxies don't send a midstate, so calculate it ourselves
+      starttime = time.time()
+      state = common.midstate(data)
+      self.midstatelatency.record(time.time() - starttime)
+      with self.statlock: self.midstatescalculated = self.midstatescalculated + 1
+    target = binascii.unhexlify(result["target"].encode("ascii"))
+    return common.Job(self.miner, self, self.longpollepoch, state, data, target)
+
+  def setrollbase(self, job, response):
+    if not self.rollntime: return
+    expire = None
+    for h in response.getheaders():
+      if h[0].lower() == "x-roll-ntime":
+        value = h[1].strip().lower()
+        if value[:7] == "expire=": expire = int(value[7:])
+        elif value not in ("", "n", "0", "false"): expire = self.rollexpire
+        break
+    with self.rolllock:
+      if expire == None or expire <= 0: self.rollbase = None
+      else: self.rollbase = (job, time.time() + expire, self.longpollepoch, 0)
+
+  def rolljob(self):
+    with self.rolllock:
+      if self.rollbase == None: return None
+      (job, expiry, epoch, rolls) = self.rollbase
+      if epoch != self.longpollepoch or rolls >= self.maxrolls or time.time() >= expiry:
+        self.rollbase = None
+        return None
+      rolls = rolls + 1
+      self.rollbase = (job, expiry, epoch, rolls)
+    # The timestamp is in the second SHA256 block, so the midstate doesn't change
+    ntime = struct.unpack(">I", job.data[68:72])[0] + rolls
+    data = job.data[:68] + struct.pack(">I", ntime & 0xffffffff) + job.data[72:]
+    with self.statlock: self.rolledjobs = self.rolledjobs + 1
+    return common.Job(self.miner, self, epoch, job.state, data, job.target)
+
+  def rolljobs(self, count):
+    jobs = []
+    while len(jobs) < count:
+      job = self.rolljob()
+      if job == None: break
+      jobs.append(job)
+    return jobs
+
+  def checklongpolling(self, response):
+    longpollurl = None
     with self.statlock:
       if not self.longpolling:
         self.longpolling = False
@@ -159,37 +582,70 @@ class JSONRPCPool(object):
               else: path = "/"
               parts = parts[0].split(":")
               if len(parts) != 2: raise Exception("Long poll URL contains host but no port!")
-              host = parts[0]
-              port = parts[1]
+              longpollurl = (parts[0], int(parts[1]), path)
               self.miner.log("Found long polling URL for %s: %s\n" % (self.name, url), "g")
               self.longpolling = True
-              self.longpollingthread = threading.Thread(None, self.longpollingworker, self.name + "_longpolling", (host, port, path))
-              self.longpollingthread.daemon = True
-              self.longpollingthread.start()
             except:
               self.miner.log("Invalid long polling URL for %s: %s\n" % (self.name, url), "y")
             break
-    response = json.loads(response.read().decode("utf_8"))
-    state = binascii.unhexlify(response["result"]["midstate"].encode("ascii"))
-    data = binascii.unhexlify(response["result"]["data"].encode("ascii"))
-    target = binascii.unhexlify(response["result"]["target"].encode("ascii"))
-    return common.Job(self.miner, self, self.longpollepoch, state, data, target)
+    # Setting up the long poll connection may take a while, don't block stats readers meanwhile
+    if longpollurl != None: self.startlongpolling(*longpollurl)
+
+  def startlongpolling(self, host, port, path):
+    if self.sharelongpoll:
+      # Grouping by resolved addresses would need a DNS lookup, which neither the async engine's
+      # loop nor a getwork request should wait for, so this only matches identical URLs
+      key = (self.blockchain, path, host.lower(), port)
+      with longpolllock:
+        group = longpollgroups.get(key)
+        if group != None:
+          group.append(self)
+          self.longpollgroup = group
+          self.miner.log("%s shares the long polling connection of %s\n" % (self.name, group[0].name), "g")
+          return
+        longpollgroups[key] = self.longpollgroup
+    if host == self.host and port == self.port: resolver = self.resolver
+    elif self.engine != None: resolver = self.engine.createresolver(host, port, self.dnsttl)
+    else: resolver = common.Resolver(host, port, self.dnsttl)
+    if self.engine != None:
+      import asyncengine
+      connectionpool = asyncengine.AsyncHTTPConnectionPool(self.engine, host, port, 1, self.longpolltimeout, resolver)
+      return self.asynclongpoll(connectionpool, path)
+    self.longpollingthread = threading.Thread(None, self.longpollingworker, self.name + "_longpolling", (host, port, path, resolver))
+    self.longpollingthread.daemon = True
+    self.longpollingthread.start()
 
-  def longpollingworker(self, host, port, path):
+  def longpollingworker(self, host, port, path, resolver):
+    connectionpool = common.HTTPConnectionPool(host, port, 1, self.longpolltimeout, resolver)
     while True:
       try:
-        conn = http_client.HTTPConnection(host, port, True, self.longpolltimeout)
-        headers = {"User-Agent": self.useragent}
-        if self.auth != None: headers["Authorization"] = self.auth
-        conn.request("GET", path, None, headers)
-        data = conn.getresponse().read().decode("utf_8")
-        response = json.loads(data)
-        state = binascii.unhexlify(response["result"]["midstate"].encode("ascii"))
-        data = binascii.unhexlify(response["result"]["data"].encode("ascii"))
-        target = binascii.unhexlify(response["result"]["target"].encode("ascii"))
-        job = common.Job(self.miner, self, self.longpollepoch, state, data, target)
-        self.miner.newblock(job)
+        (response, data) = connectionpool.request("GET", path, None, self.longpollheaders(), self.longpolltimeout)
+        self.longpollresponse(response, data)
       except Exception as e:
         self.miner.log("%s long poll failed: %s\n" % (self.name, e), "y")
         time.sleep(3)
         pass
+
+  def asynclongpoll(self, connectionpool, path):
+    future = connectionpool.requestfuture("GET", path, None, self.longpollheaders(), self.longpolltimeout)
+    future.add_done_callback(lambda future: self.engine.dispatch(self.asynclongpolldone, future, connectionpool, path))
+
+  # Runs on the engine's dispatcher thread, because newblock() needs to take the core's locks
+  def asynclongpolldone(self, future, connectionpool, path):
+    try: self.longpollresponse(*future.result())
+    except Exception as e:
+      self.miner.log("%s long poll failed: %s\n" % (self.name, e), "y")
+      return self.engine.calllater(3, self.asynclongpoll, connectionpool, path)
+    self.asynclongpoll(connectionpool, path)
+
+  def longpollheaders(self):
+    headers = {"User-Agent": self.useragent}
+    if self.auth != None: headers["Authorization"] = self.auth
+    return headers
+
+  def longpollresponse(self, response, data):
+    data = json.loads(data.decode("utf_8"))
+    job = self.createjob(data["result"])
+    with longpolllock: followers = self.longpollgroup[1:]
+    self.miner.newblock(job, None, followers)
+    self.setrollbase(job, response)
@@ -0,0 +1,251 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+#############################
+# Cluster agent pool module #
+#############################
+
+# Module configuration options:
+#   name: Display name for this work source (default: host name)
+#   host: Host name of the cluster coordinator (mandantory)
+#   port: TCP port number of the cluster coordinator (default: 8340)
+#   secret: Shared secret, needs to match the one of the coordinator (mandantory)
+#   agentname: Name of this agent in the coordinator's statistics (default: local host name)
+#   prefetch: Number of jobs that are kept buffered locally in addition to the ones
+#             that were requested by the miner core (default: 2)
+#   statsinterval: Worker statistics are sent to the coordinator every that many seconds (default: 5)
+#   hashrate: Base hashrate for this pool (in MHash/s, default: 0)
+#   priority: Priority of the work source (default: 1)
+#   getworktimeout: Timeout (in seconds) for connecting and for waiting for work (default: global setting)
+#   dnsttl: The host name is resolved again in the background after that many seconds (default: 300)
+
+# Fetches work from a cluster coordinator (see frontend/theseven/clustercoordinator.py)
+# instead of talking to the actual work sources. The coordinator runs the work source
+# modules and the scheduler for the whole cluster, this instance only runs workers.
+
+
+import common
+import json
+import time
+import socket
+import binascii
+import threading
+import collections
+
+# SHA-256 padding of an 80 byte header, in getwork byte order
+padding = binascii.unhexlify(b"000000800000000000000000000000000000000000000000000000000000000000000000000000000000000080020000")
+
+class ClusterAgentPool(object):
+  def __init__(self, miner, blockchain, dict):
+    self.__dict__ = dict
+    self.miner = miner
+    self.blockchain = blockchain
+    self.children = []
+    if not hasattr(self, "host"): raise Exception("Missing attribute: host")
+    if not hasattr(self, "secret"): raise Exception("Missing attribute: secret")
+    self.getworktimeout = getattr(self, "getworktimeout", self.miner.getworktimeout)
+    self.priority = getattr(self, "priority", 1)
+    self.hashrate = getattr(self, "hashrate", 0)
+    self.port = getattr(self, "port", 8340)
+    self.name = getattr(self, "name", self.host)
+    self.agentname = getattr(self, "agentname", socket.gethostname())
+    self.prefetch = getattr(self, "prefetch", 2)
+    self.statsinterval = getattr(self, "statsinterval", 5)
+    self.dnsttl = getattr(self, "dnsttl", 300)
+    self.resolver = common.Resolver(self.host, self.port, self.dnsttl)
+    self.statlock = threading.RLock()
+    self.longpolling = None
+    self.longpollepoch = 0
+    self.requests = 0
+    self.failedreqs = 0
+    self.uploadretries = 0
+    self.longpollkilled = 0
+    self.jobsaccepted = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.score = 0
+    self.mhashes = 0
+    self.starttime = time.time()
+    self.blockeduntil = time.time()
+    self.difficulty = 0
+    self.submitlatency = common.LatencyMeter()
+    self.connection = None
+    self.workcondition = threading.Condition()
+    self.stash = collections.deque()
+    self.requested = 0
+    self.cancelepoch = None
+    self.pending = {}
+    self.connectionthread = threading.Thread(None, self.connectionworker, self.name + "_connection")
+    self.connectionthread.daemon = True
+    self.connectionthread.start()
+    self.statsthread = threading.Thread(None, self.statsworker, self.name + "_stats")
+    self.statsthread.daemon = True
+    self.statsthread.start()
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "longpolling": self.longpolling, \
+        "difficulty": self.difficulty, \
+        "requests": self.requests, \
+        "failedreqs": self.failedreqs, \
+        "jobsaccepted": self.jobsaccepted, \
+        "longpollkilled": self.longpollkilled, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "uploadretries": self.uploadretries, \
+        "starttime": self.starttime, \
+        "mhashes": self.mhashes, \
+        "score": self.score, \
+        "submitlatency": self.submitlatency.average, \
+        "submitlatency90": self.submitlatency.percentile(90), \
+      }
+    return statistics
+
+  def connectionworker(self):
+    while True:
+      try:
+        self.miner.log("%s: Connecting to cluster coordinator %s:%d\n" % (self.name, self.host, self.port), "B")
+        sock = self.resolver.connect(self.getworktimeout)
+        connection = common.ClusterConnection(sock)
+        self.handshake(connection)
+        sock.settimeout(None)
+        with self.workcondition:
+          self.connection = connection
+          self.stash.clear()
+          self.requested = 0
+          self.cancelepoch = None
+        with self.statlock: self.longpolling = True
+        self.requestjobs(0)
+        while True:
+          (type, payload) = connection.receive()
+          if type == common.clusterjob: self.handlejob(*common.clusterjobdata.unpack(payload))
+          elif type == common.clustercancel: self.handlecancel(*common.clustercanceldata.unpack(payload))
+          elif type == common.clusterresult:
+            (jobid, nonce, accepted) = common.clusterresultdata.unpack(payload[:common.clusterresultdata.size])
+            self.handleresult(jobid, nonce, True if accepted else payload[common.clusterresultdata.size:].decode("utf_8"))
+      except Exception as e:
+        self.miner.log("%s: Connection failed: %s\n" % (self.name, e), "rB")
+      with self.workcondition:
+        if self.connection != None: self.connection.close()
+        self.connection = None
+        self.stash.clear()
+        self.requested = 0
+        pending = self.pending
+        self.pending = {}
+      with self.statlock:
+        self.longpolling = False
+        self.uploadretries = self.uploadretries + len(pending)
+      for (jobid, nonce), (job, difficulty, worker, starttime) in pending.items():
+        self.miner.log("%s: Lost share %s (difficulty %.5f) because the connection was lost\n" % (self.name, binascii.hexlify(nonce).decode("ascii"), difficulty), "rB")
+      time.sleep(3)
+
+  # Answers the coordinator's challenge and makes sure that it knows the secret as well
+  # before accepting any work from it
+  def handshake(self, connection):
+    (type, challenge) = connection.receive()
+    if type != common.clusterchallenge: raise Exception("Unexpected frame type %d" % type)
+    agentchallenge = common.clusterchallengedata()
+    hello = { \
+      "name": self.agentname, \
+      "response": binascii.hexlify(common.clusterresponse(self.secret, b"agent", challenge)).decode("ascii"), \
+      "challenge": binascii.hexlify(agentchallenge).decode("ascii"), \
+    }
+    connection.send(common.clusterhello, json.dumps(hello).encode("utf_8"))
+    (type, response) = connection.receive()
+    if type != common.clusterwelcome: raise Exception("Unexpected frame type %d" % type)
+    if not common.clusterverify(self.secret, b"coordinator", agentchallenge, response): raise Exception("Coordinator doesn't know the secret")
+
+  # Asks the coordinator for enough jobs to satisfy the given demand plus the prefetch buffer
+  def requestjobs(self, demand):
+    with self.workcondition:
+      missing = demand + self.prefetch - len(self.stash) - self.requested
+      if missing <= 0 or self.connection == None: return
+      self.requested = self.requested + missing
+      connection = self.connection
+    connection.send(common.clusterrequest, common.clusterrequestdata.pack(min(missing, 65535)))
+
+  def handlejob(self, jobid, epoch, state, data, target):
+    with self.workcondition:
+      self.requested = max(0, self.requested - 1)
+      # The coordinator took this job out of its work buffer before the last block change
+      stale = self.cancelepoch != None and epoch != self.cancelepoch
+    if stale: return self.requestjobs(0)
+    job = common.Job(self.miner, self, self.longpollepoch, state, data + padding, target)
+    job.clusterid = jobid
+    with self.workcondition:
+      self.stash.append(job)
+      self.workcondition.notify_all()
+    self.difficulty = job.difficulty
+
+  def handlecancel(self, epoch):
+    with self.workcondition:
+      self.cancelepoch = epoch
+      self.stash.clear()
+    self.miner.newblock(None, self)
+    self.requestjobs(0)
+
+  def handleresult(self, jobid, nonce, result):
+    with self.workcondition: (job, difficulty, worker, starttime) = self.pending.pop((jobid, nonce), (None, None, None, None))
+    if job == None: return
+    self.submitlatency.record(time.time() - starttime)
+    job.uploadcallback(nonce, worker, result, difficulty)
+
+  def getwork(self):
+    return self.getworkbatch(1)[0]
+
+  def getworkbatch(self, count):
+    self.requestjobs(count)
+    jobs = []
+    with self.workcondition:
+      deadline = time.time() + self.getworktimeout
+      while len(self.stash) == 0:
+        if time.time() >= deadline: raise Exception("No work available")
+        self.workcondition.wait(deadline - time.time())
+      while len(self.stash) > 0 and len(jobs) < count: jobs.append(self.stash.popleft())
+    self.requestjobs(0)
+    return jobs
+
+  def sendresult(self, job, data, nonce, difficulty, worker):
+    with self.workcondition:
+      connection = self.connection
+      if connection != None: self.pending[(job.clusterid, nonce)] = (job, difficulty, worker, time.time())
+    try:
+      if connection == None: raise Exception("Not connected")
+      connection.send(common.clustershare, common.clustersharedata.pack(job.clusterid, nonce))
+    except Exception as e:
+      self.miner.log("Error while uploading share %s (difficulty %.5f) to %s: %s\n" % (binascii.hexlify(nonce).decode("ascii"), difficulty, self.name, e), "rB")
+      with self.statlock:
+        self.uploadretries = self.uploadretries + 1
+        self.score = self.score + self.miner.uploadfailbias
+
+  def statsworker(self):
+    while True:
+      time.sleep(self.statsinterval)
+      with self.workcondition: connection = self.connection
+      if connection == None: continue
+      try:
+        stats = {"mhps": self.miner.mhps, "jobspersecond": self.miner.jobspersecond, "workers": self.miner.collectstatistics(self.miner.workers)}
+        connection.send(common.clusterstats, json.dumps(stats).encode("utf_8"))
+      except Exception as e:
+        self.miner.log("%s: Failed to send statistics: %s\n" % (self.name, e), "y")
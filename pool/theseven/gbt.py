@@ -0,0 +1,329 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+########################################
+# Bitcoin getblocktemplate work source #
+########################################
+
+# Module configuration options:
+#   name: Display name for this work source (default: host name)
+#   host: Host name of the bitcoin node's JSON RPC server (mandantory)
+#   port: HTTP port number of the JSON RPC server (default: 8332)
+#   path: HTTP path for JSON RPC requests (default: "/")
+#   username: HTTP authentication user name (default: no authentication)
+#   password: HTTP authentication password (default: empty)
+#   address: Bitcoin address (base58, P2PKH or P2SH) that the block reward will be paid to
+#   payoutscript: Hex encoded output script that the block reward will be paid to.
+#                 Either this or address is mandantory.
+#   coinbasemessage: Text that will be put into the coinbase (default: "MPBM")
+#   templaterefresh: A new block template is fetched after that many seconds, in order to
+#                    include new transactions (default: 30). If the node supports long
+#                    polling, this is done whenever the long poll returns instead.
+#   hashrate: Base hashrate for this pool (in MHash/s, default: 0)
+#   priority: Priority of the work source (hashrate that's available in excess of the hashrate
+#             options of all pools will be distributed proportionally to this value, default: 1)
+#   getworktimeout: Timeout (in seconds) for getblocktemplate requests (default: global setting)
+#   sendsharetimeout: Block submission timeout in seconds (default: global setting)
+#   longpolltimeout: Long poll connection inactivity timeout (default: global setting)
+#   dnsttl: The host name is resolved again in the background after that many seconds
+#           (default: 300). If that fails, the previously resolved addresses are kept.
+
+# This is meant for solo mining against a local bitcoin node. The block template is fetched
+# once and all work is generated locally from it by incrementing an extranonce in the coinbase,
+# so getwork requests usually don't cause any RPC calls. Every share is a block candidate.
+
+
+import common
+import base64
+import time
+import json
+import threading
+import binascii
+import struct
+
+# SHA-256 padding of an 80 byte header, in getwork byte order
+padding = binascii.unhexlify(b"000000800000000000000000000000000000000000000000000000000000000000000000000000000000000080020000")
+
+base58alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+def varint(value):
+  if value < 0xfd: return struct.pack("<B", value)
+  if value <= 0xffff: return b"\xfd" + struct.pack("<H", value)
+  if value <= 0xffffffff: return b"\xfe" + struct.pack("<I", value)
+  return b"\xff" + struct.pack("<Q", value)
+
+def pushdata(data):
+  if len(data) < 0x4c: return struct.pack("<B", len(data)) + data
+  return b"\x4c" + struct.pack("<B", len(data)) + data
+
+def scriptnumber(value):
+  data = b""
+  while value > 0:
+    data = data + struct.pack("<B", value & 0xff)
+    value = value >> 8
+  if len(data) > 0 and ord(data[-1:]) & 0x80: data = data + b"\0"
+  return data
+
+# Pushes a number the way bitcoind does it, BIP34 requires OP_0 and OP_1 to OP_16 for small heights
+def pushnumber(value):
+  if value == 0: return b"\0"
+  if value <= 16: return struct.pack("<B", 0x50 + value)
+  return pushdata(scriptnumber(value))
+
+def addresstoscript(address):
+  value = 0
+  for char in address: value = value * 58 + base58alphabet.index(char)
+  data = binascii.unhexlify(("%050x" % value).encode("ascii"))
+  if common.doublesha256(data[:21])[:4] != data[21:]: raise Exception("Invalid address checksum: %s" % address)
+  version = ord(data[:1])
+  if version in (0, 111): return b"\x76\xa9\x14" + data[1:21] + b"\x88\xac"
+  if version in (5, 196): return b"\xa9\x14" + data[1:21] + b"\x87"
+  raise Exception("Unsupported address type: %s" % address)
+
+# Reverses the byte order of each 32 bit word, converts between getwork and header byte order
+def swapwords(data):
+  return struct.pack(">%dI" % (len(data) // 4), *struct.unpack("<%dI" % (len(data) // 4), data))
+
+class GetBlockTemplatePool(object):
+  def __init__(self, miner, blockchain, dict):
+    self.__dict__ = dict
+    self.miner = miner
+    self.blockchain = blockchain
+    self.children = []
+    if not hasattr(self, "host"): raise Exception("Missing attribute: host")
+    self.useragent = self.miner.useragent + " (gbt.GetBlockTemplatePool v0.0.1)"
+    self.getworktimeout = getattr(self, "getworktimeout", self.miner.getworktimeout)
+    self.sendsharetimeout = getattr(self, "sendsharetimeout", self.miner.sendsharetimeout)
+    self.longpolltimeout = getattr(self, "longpolltimeout", self.miner.longpolltimeout)
+    self.priority = getattr(self, "priority", 1)
+    self.hashrate = getattr(self, "hashrate", 0)
+    self.username = getattr(self, "username", "")
+    self.password = getattr(self, "password", "")
+    if self.username == "" and self.password == "": self.auth = None
+    else: self.auth = "Basic " + base64.b64encode((self.username + ":" + self.password).encode("utf_8")).decode("ascii")
+    self.port = getattr(self, "port", 8332)
+    self.path = getattr(self, "path", "/")
+    self.name = getattr(self, "name", self.host)
+    if hasattr(self, "payoutscript"): self.payoutscript = binascii.unhexlify(self.payoutscript.encode("ascii"))
+    elif hasattr(self, "address"): self.payoutscript = addresstoscript(self.address)
+    else: raise Exception("Missing attribute: address or payoutscript")
+    self.coinbasemessage = getattr(self, "coinbasemessage", "MPBM").encode("utf_8")
+    self.templaterefresh = getattr(self, "templaterefresh", 30)
+    self.dnsttl = getattr(self, "dnsttl", 300)
+    self.resolver = common.Resolver(self.host, self.port, self.dnsttl)
+    self.connectionpool = common.HTTPConnectionPool(self.host, self.port, resolver = self.resolver)
+    self.statlock = threading.RLock()
+    self.longpolling = None
+    self.longpollepoch = 0
+    self.requests = 0
+    self.failedreqs = 0
+    self.uploadretries = 0
+    self.longpollkilled = 0
+    self.jobsaccepted = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.score = 0
+    self.mhashes = 0
+    self.starttime = time.time()
+    self.blockeduntil = time.time()
+    self.difficulty = 0
+    self.templaterequests = 0
+    self.getworklatency = common.LatencyMeter()
+    self.submitlatency = common.LatencyMeter()
+    self.templatelock = threading.RLock()
+    self.refreshlock = threading.Lock()
+    self.template = None
+    self.extranonce = 0
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "longpolling": self.longpolling, \
+        "difficulty": self.difficulty, \
+        "requests": self.requests, \
+        "failedreqs": self.failedreqs, \
+        "jobsaccepted": self.jobsaccepted, \
+        "longpollkilled": self.longpollkilled, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "uploadretries": self.uploadretries, \
+        "starttime": self.starttime, \
+        "mhashes": self.mhashes, \
+        "score": self.score, \
+        "templaterequests": self.templaterequests, \
+        "getworklatency": self.getworklatency.average, \
+        "getworklatency90": self.getworklatency.percentile(90), \
+        "submitlatency": self.submitlatency.average, \
+        "submitlatency90": self.submitlatency.percentile(90), \
+      }
+    return statistics
+
+  def rpc(self, method, params, timeout, connectionpool = None):
+    if connectionpool == None: connectionpool = self.connectionpool
+    req = json.dumps({"method": method, "params": params, "id": 0}).encode("utf_8")
+    headers = {"User-Agent": self.useragent, "Content-type": "application/json", "Content-Length": len(req)}
+    if self.auth != None: headers["Authorization"] = self.auth
+    (response, data) = connectionpool.request("POST", self.path, req, headers, timeout)
+    data = json.loads(data.decode("utf_8"))
+    if data["error"] != None: raise Exception("%s failed: %s" % (method, data["error"]))
+    return data["result"]
+
+  def fetchtemplate(self, longpollid = None, connectionpool = None):
+    params = {"rules": ["segwit"], "capabilities": ["coinbasetxn", "longpoll", "workid"]}
+    if longpollid != None: params["longpollid"] = longpollid
+    starttime = time.time()
+    result = self.rpc("getblocktemplate", [params], self.getworktimeout if longpollid == None else self.longpolltimeout, connectionpool)
+    if longpollid == None: self.getworklatency.record(time.time() - starttime)
+    with self.statlock: self.templaterequests = self.templaterequests + 1
+    return self.parsetemplate(result)
+
+  def parsetemplate(self, result):
+    txids = []
+    txdata = []
+    for tx in result["transactions"]:
+      txids.append(binascii.unhexlify((tx["txid"] if "txid" in tx else tx["hash"]).encode("ascii"))[::-1])
+      txdata.append(binascii.unhexlify(tx["data"].encode("ascii")))
+    # Precalculate the merkle branch of the coinbase, that's all we need to derive the merkle root
+    branches = []
+    level = [None] + txids
+    while len(level) > 1:
+      branches.append(level[1])
+      if len(level) % 2 == 1: level.append(level[-1])
+      level = [None] + [common.doublesha256(level[i] + level[i + 1]) for i in range(2, len(level), 2)]
+    commitment = result.get("default_witness_commitment")
+    if commitment != None: commitment = binascii.unhexlify(commitment.encode("ascii"))
+    template = { \
+      "version": result["version"], \
+      "prevhash": binascii.unhexlify(result["previousblockhash"].encode("ascii"))[::-1], \
+      "bits": binascii.unhexlify(result["bits"].encode("ascii")), \
+      "target": binascii.unhexlify(result["target"].encode("ascii"))[::-1], \
+      "height": result["height"], \
+      "coinbasevalue": result["coinbasevalue"], \
+      "commitment": commitment, \
+      "curtime": result["curtime"], \
+      "fetchtime": time.time(), \
+      "longpollid": result.get("longpollid"), \
+      "branches": branches, \
+      "txdata": txdata, \
+    }
+    return template
+
+  def settemplate(self, template):
+    with self.templatelock:
+      previous = self.template
+      self.template = template
+    with self.statlock:
+      if self.longpolling == None:
+        self.longpolling = template["longpollid"] != None
+        if self.longpolling:
+          self.miner.log("%s supports long polling\n" % self.name, "g")
+          self.longpollingthread = threading.Thread(None, self.longpollingworker, self.name + "_longpolling")
+          self.longpollingthread.daemon = True
+          self.longpollingthread.start()
+    return previous == None or previous["prevhash"] != template["prevhash"]
+
+  def buildcoinbase(self, template, extranonce, witness = False):
+    script = pushnumber(template["height"]) + pushdata(extranonce) + pushdata(self.coinbasemessage[:64])
+    data = struct.pack("<I", 1)
+    if witness: data = data + b"\0\1"
+    data = data + b"\1" + b"\0" * 32 + b"\xff\xff\xff\xff" + varint(len(script)) + script + b"\xff\xff\xff\xff"
+    outputs = [(template["coinbasevalue"], self.payoutscript)]
+    if template["commitment"] != None: outputs.append((0, template["commitment"]))
+    data = data + varint(len(outputs))
+    for value, script in outputs: data = data + struct.pack("<Q", value) + varint(len(script)) + script
+    # The witness reserved value of the coinbase is all zeros
+    if witness: data = data + b"\1\x20" + b"\0" * 32
+    return data + struct.pack("<I", 0)
+
+  def createjob(self, template):
+    with self.templatelock:
+      extranonce = struct.pack("<Q", self.extranonce)
+      self.extranonce = self.extranonce + 1
+    merkleroot = common.doublesha256(self.buildcoinbase(template, extranonce))
+    for branch in template["branches"]: merkleroot = common.doublesha256(merkleroot + branch)
+    ntime = int(template["curtime"] + time.time() - template["fetchtime"])
+    data = struct.pack(">I", template["version"]) + swapwords(template["prevhash"]) + swapwords(merkleroot) \
+         + struct.pack(">I", ntime) + template["bits"] + b"\0\0\0\0" + padding
+    job = common.Job(self.miner, self, self.longpollepoch, common.midstate(data), data, template["target"])
+    job.template = template
+    job.extranonce = extranonce
+    self.difficulty = job.difficulty
+    return job
+
+  def gettemplate(self):
+    with self.templatelock: template = self.template
+    if template != None and (self.longpolling or time.time() - template["fetchtime"] <= self.templaterefresh): return template
+    # Only one fetcher refreshes the template, the others wait for it and use the result
+    with self.refreshlock:
+      with self.templatelock: current = self.template
+      if current is not template: return current
+      template = self.fetchtemplate()
+      newblock = self.settemplate(template) and current != None
+    # Without long polling, this is where we notice that the previous block has changed
+    if newblock: self.miner.newblock(self.createjob(template))
+    return template
+
+  def healthcheck(self):
+    self.rpc("getblockcount", [], self.getworktimeout)
+
+  def getwork(self):
+    return self.createjob(self.gettemplate())
+
+  def getworkbatch(self, count):
+    template = self.gettemplate()
+    return [self.createjob(template) for i in range(count)]
+
+  def sendresult(self, job, data, nonce, difficulty, worker):
+    uploader = threading.Thread(None, self.uploadresult, self.name + "_submitblock_" + binascii.hexlify(nonce).decode("ascii"), (job, data, nonce, difficulty, worker))
+    uploader.daemon = True
+    uploader.start()
+
+  def uploadresult(self, job, data, nonce, difficulty, worker):
+    template = job.template
+    block = swapwords(data[:80]) + varint(len(template["txdata"]) + 1) \
+          + self.buildcoinbase(template, job.extranonce, template["commitment"] != None) + b"".join(template["txdata"])
+    self.miner.log("%s: Submitting block %s\n" % (self.name, binascii.hexlify(common.doublesha256(block[:80])[::-1]).decode("ascii")), "gB")
+    for attempt in range(5):
+      try:
+        starttime = time.time()
+        result = self.rpc("submitblock", [binascii.hexlify(block).decode("ascii")], self.sendsharetimeout)
+        self.submitlatency.record(time.time() - starttime)
+        if result == None: return job.uploadcallback(nonce, worker, True, difficulty)
+        return job.uploadcallback(nonce, worker, result, difficulty)
+      except Exception as e:
+        self.miner.log("Error while submitting block to %s (%s:%d): %s\n" % (self.name, self.host, self.port, e), "rB")
+        with self.statlock:
+          self.uploadretries = self.uploadretries + 1
+          self.score = self.score + self.miner.uploadfailbias
+        time.sleep(1)
+
+  def longpollingworker(self):
+    connectionpool = common.HTTPConnectionPool(self.host, self.port, 1, self.longpolltimeout, self.resolver)
+    while True:
+      try:
+        with self.templatelock: template = self.template
+        template = self.fetchtemplate(template["longpollid"], connectionpool)
+        if self.settemplate(template): self.miner.newblock(self.createjob(template))
+      except Exception as e:
+        self.miner.log("%s long poll failed: %s\n" % (self.name, e), "y")
+        time.sleep(3)
@@ -0,0 +1,278 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+##############################
+# Stratum work source module #
+##############################
+
+# Module configuration options:
+#   name: Display name for this work source (default: host name)
+#   host: Host name of the stratum server (mandantory)
+#   port: TCP port number of the stratum server (default: 3333)
+#   username: Worker user name (default: empty)
+#   password: Worker password (default: empty)
+#   hashrate: Base hashrate for this pool (in MHash/s, default: 0)
+#   priority: Priority of the work source (hashrate that's available in excess of the hashrate
+#             options of all pools will be distributed proportionally to this value, default: 1)
+#   getworktimeout: Timeout (in seconds) for connecting and for waiting for the first work
+#                   after (re)connecting (default: global setting)
+#   longpolltimeout: Connection inactivity timeout (default: global setting)
+#   dnsttl: The host name is resolved again in the background after that many seconds
+#           (default: 300). If that fails, the previously resolved addresses are kept.
+
+# The stratum server pushes block templates over a persistent TCP connection.
+# All work is generated locally from those by incrementing extranonce2,
+# so getwork requests never cause any network traffic.
+
+
+import common
+import json
+import threading
+import binascii
+import struct
+import time
+
+# SHA-256 padding of an 80 byte header, in getwork byte order
+padding = binascii.unhexlify(b"000000800000000000000000000000000000000000000000000000000000000000000000000000000000000080020000")
+
+class StratumPool(object):
+  def __init__(self, miner, blockchain, dict):
+    self.__dict__ = dict
+    self.miner = miner
+    self.blockchain = blockchain
+    self.children = []
+    if not hasattr(self, "host"): raise Exception("Missing attribute: host")
+    self.useragent = self.miner.useragent + " (stratum.StratumPool v0.0.1)"
+    self.getworktimeout = getattr(self, "getworktimeout", self.miner.getworktimeout)
+    self.longpolltimeout = getattr(self, "longpolltimeout", self.miner.longpolltimeout)
+    self.priority = getattr(self, "priority", 1)
+    self.hashrate = getattr(self, "hashrate", 0)
+    self.username = getattr(self, "username", "")
+    self.password = getattr(self, "password", "")
+    self.port = getattr(self, "port", 3333)
+    self.name = getattr(self, "name", self.host)
+    self.dnsttl = getattr(self, "dnsttl", 300)
+    self.resolver = common.Resolver(self.host, self.port, self.dnsttl)
+    self.statlock = threading.RLock()
+    self.longpolling = None
+    self.longpollepoch = 0
+    self.requests = 0
+    self.failedreqs = 0
+    self.uploadretries = 0
+    self.longpollkilled = 0
+    self.jobsaccepted = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.score = 0
+    self.mhashes = 0
+    self.starttime = time.time()
+    self.blockeduntil = time.time()
+    self.difficulty = 0
+    self.submitlatency = common.LatencyMeter()
+    self.sendlock = threading.Lock()
+    self.socket = None
+    self.requestid = 0
+    self.pending = {}
+    self.workcondition = threading.Condition()
+    self.template = None
+    self.extranonce1 = None
+    self.extranonce2size = 4
+    self.extranonce2 = 0
+    self.target = self.difficultytotarget(1)
+    self.connectionthread = threading.Thread(None, self.connectionworker, self.name + "_connection")
+    self.connectionthread.daemon = True
+    self.connectionthread.start()
+
+  def getstatistics(self, childstats):
+    with self.statlock:
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "longpolling": self.longpolling, \
+        "difficulty": self.difficulty, \
+        "requests": self.requests, \
+        "failedreqs": self.failedreqs, \
+        "jobsaccepted": self.jobsaccepted, \
+        "longpollkilled": self.longpollkilled, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "uploadretries": self.uploadretries, \
+        "starttime": self.starttime, \
+        "mhashes": self.mhashes, \
+        "score": self.score, \
+        "submitlatency": self.submitlatency.average, \
+        "submitlatency90": self.submitlatency.percentile(90), \
+      }
+    return statistics
+
+  def difficultytotarget(self, difficulty):
+    target = min(2**256 - 1, int(0xffff * 2**208 / difficulty))
+    return binascii.unhexlify(("%064x" % target).encode("ascii"))[::-1]
+
+  def call(self, method, params, callback):
+    with self.sendlock:
+      if self.socket == None: raise Exception("Not connected")
+      self.requestid = self.requestid + 1
+      self.pending[self.requestid] = callback
+      self.socket.sendall((json.dumps({"id": self.requestid, "method": method, "params": params}) + "\n").encode("utf_8"))
+
+  def connectionworker(self):
+    while True:
+      try:
+        self.miner.log("%s: Connecting to %s:%d\n" % (self.name, self.host, self.port), "B")
+        sock = self.resolver.connect(self.getworktimeout)
+        sock.settimeout(self.longpolltimeout)
+        with self.sendlock:
+          self.socket = sock
+          self.pending = {}
+        self.call("mining.subscribe", [self.useragent], self.subscribed)
+        self.call("mining.authorize", [self.username, self.password], self.authorized)
+        reader = sock.makefile("rb")
+        while True:
+          line = reader.readline()
+          if len(line) == 0: raise Exception("Connection closed by server")
+          self.handlemessage(json.loads(line.decode("utf_8")))
+      except Exception as e:
+        self.miner.log("%s: Connection failed: %s\n" % (self.name, e), "rB")
+      with self.sendlock:
+        try: self.socket.close()
+        except: pass
+        self.socket = None
+        pending = self.pending
+        self.pending = {}
+      with self.workcondition:
+        hadwork = self.template != None and self.extranonce1 != None
+        self.template = None
+        self.extranonce1 = None
+      with self.statlock: self.longpolling = False
+      for callback in pending.values():
+        try: callback(None, "Connection lost")
+        except: pass
+      # Job IDs and extranonce1 are only valid within a session, so all
+      # work that was generated during this one is useless from now on
+      if hadwork: self.miner.newblock(None, self)
+      time.sleep(3)
+
+  def handlemessage(self, message):
+    if message.get("method") == None:
+      with self.sendlock: callback = self.pending.pop(message["id"], None)
+      if callback != None: callback(message["result"], message["error"])
+    elif message["method"] == "mining.notify": self.notify(*message["params"][:9])
+    elif message["method"] == "mining.set_difficulty":
+      difficulty = message["params"][0]
+      self.miner.log("%s: Difficulty set to %s\n" % (self.name, difficulty), "B")
+      with self.workcondition: self.target = self.difficultytotarget(difficulty)
+    elif message["method"] == "client.show_message":
+      self.miner.log("%s: Message from server: %s\n" % (self.name, message["params"][0]), "y")
+    elif message.get("id") != None:
+      self.sendmessage({"id": message["id"], "result": None, "error": [-3, "Method not found", None]})
+
+  def sendmessage(self, message):
+    with self.sendlock:
+      if self.socket != None: self.socket.sendall((json.dumps(message) + "\n").encode("utf_8"))
+
+  def subscribed(self, result, error):
+    if error != None or result == None:
+      self.miner.log("%s: Subscription failed: %s\n" % (self.name, error), "rB")
+      return
+    with self.workcondition:
+      self.extranonce1 = binascii.unhexlify(result[1].encode("ascii"))
+      self.extranonce2size = result[2]
+      self.extranonce2 = 0
+      self.workcondition.notify_all()
+    with self.statlock: self.longpolling = True
+
+  def authorized(self, result, error):
+    if result != True: self.miner.log("%s: Authorization failed: %s\n" % (self.name, error), "rB")
+
+  def notify(self, jobid, prevhash, coinbase1, coinbase2, branches, version, nbits, ntime, clean):
+    template = { \
+      "jobid": jobid, \
+      "prevhash": binascii.unhexlify(prevhash.encode("ascii")), \
+      "coinbase1": binascii.unhexlify(coinbase1.encode("ascii")), \
+      "coinbase2": binascii.unhexlify(coinbase2.encode("ascii")), \
+      "branches": [binascii.unhexlify(branch.encode("ascii")) for branch in branches], \
+      "version": binascii.unhexlify(version.encode("ascii")), \
+      "nbits": binascii.unhexlify(nbits.encode("ascii")), \
+      "ntime": binascii.unhexlify(ntime.encode("ascii")), \
+    }
+    with self.workcondition:
+      previous = self.template
+      self.template = template
+      self.workcondition.notify_all()
+    # The server may also ask for previous jobs to be dropped if the block didn't change,
+    # e.g. if the coinbase changed. Either way, the old jobs' shares would be rejected.
+    if clean and previous != None: self.miner.newblock(self.createjob())
+
+  def createjob(self):
+    with self.workcondition:
+      template = self.template
+      extranonce1 = self.extranonce1
+      extranonce2 = struct.pack(">Q", self.extranonce2)[-self.extranonce2size:]
+      self.extranonce2 = (self.extranonce2 + 1) % 2**(8 * self.extranonce2size)
+      target = self.target
+    merkleroot = common.doublesha256(template["coinbase1"] + extranonce1 + extranonce2 + template["coinbase2"])
+    for branch in template["branches"]: merkleroot = common.doublesha256(merkleroot + branch)
+    # Stratum sends the previous block hash in getwork byte order already, everything else needs to be swapped
+    data = template["version"] + template["prevhash"] + struct.pack(">8I", *struct.unpack("<8I", merkleroot)) \
+         + template["ntime"] + template["nbits"] + b"\0\0\0\0" + padding
+    job = common.Job(self.miner, self, self.longpollepoch, common.midstate(data), data, target)
+    job.jobid = template["jobid"]
+    job.extranonce2 = extranonce2
+    self.difficulty = job.difficulty
+    return job
+
+  def healthcheck(self):
+    with self.workcondition:
+      if self.template == None or self.extranonce1 == None: raise Exception("Not connected")
+
+  def getwork(self):
+    return self.getworkbatch(1)[0]
+
+  def getworkbatch(self, count):
+    with self.workcondition:
+      deadline = time.time() + self.getworktimeout
+      while self.template == None or self.extranonce1 == None:
+        if time.time() >= deadline: raise Exception("No work available")
+        self.workcondition.wait(deadline - time.time())
+    return [self.createjob() for i in range(count)]
+
+  def sendresult(self, job, data, nonce, difficulty, worker):
+    starttime = time.time()
+    def callback(result, error):
+      if result == True:
+        self.submitlatency.record(time.time() - starttime)
+        return job.uploadcallback(nonce, worker, True, difficulty)
+      if error == "Connection lost":
+        self.miner.log("%s: Lost share %s (difficulty %.5f) because the connection was lost\n" % (self.name, binascii.hexlify(nonce).decode("ascii"), difficulty), "rB")
+        with self.statlock: self.uploadretries = self.uploadretries + 1
+        return
+      self.submitlatency.record(time.time() - starttime)
+      if isinstance(error, list) and len(error) > 1: error = error[1]
+      job.uploadcallback(nonce, worker, error, difficulty)
+    params = [self.username, job.jobid, binascii.hexlify(job.extranonce2).decode("ascii"), \
+              binascii.hexlify(data[68:72]).decode("ascii"), binascii.hexlify(nonce).decode("ascii")]
+    try: self.call("mining.submit", params, callback)
+    except Exception as e:
+      self.miner.log("Error while uploading share %s (difficulty %.5f) to %s: %s\n" % (binascii.hexlify(nonce).decode("ascii"), difficulty, self.name, e), "rB")
+      with self.statlock:
+        self.uploadretries = self.uploadretries + 1
+        self.score = self.score + self.miner.uploadfailbias
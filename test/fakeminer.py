@@ -0,0 +1,77 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+########################################
+# Miner core stand-in for work sources #
+########################################
+
+# Provides just enough of the miner core for work source modules to run on their own,
+# and records what they report back to it.
+
+
+import struct
+import binascii
+import threading
+
+
+# Finds a nonce that meets the job's target. Test servers use targets that are too easy
+# for Job.checkresult(), which expects the last 32 bits of the hash to be zero.
+def solve(job):
+  for nonce in range(100000):
+    nonce = struct.pack(">I", nonce)
+    hash = job.hashnonce(nonce)
+    if int(binascii.hexlify(hash[::-1]), 16) <= job.targetvalue:
+      return (job.data[:76] + nonce + job.data[80:], nonce)
+  raise Exception("No nonce found")
+
+
+class FakeMiner(object):
+  def __init__(self):
+    self.useragent = "MPBM test"
+    self.getworktimeout = 2
+    self.sendsharetimeout = 2
+    self.longpolltimeout = 10
+    self.uploadfailbias = -100
+    self.sharebias = 4000
+    self.stalebias = -15000
+    self.lock = threading.Lock()
+    self.messages = []
+    self.newblocks = []
+
+  def log(self, str, format = ""):
+    with self.lock: self.messages.append(str)
+
+  def newblock(self, job, pool = None, followers = []):
+    with self.lock: self.newblocks.append((job, pool))
+
+
+class FakeWorker(object):
+  def __init__(self):
+    self.name = "Test worker"
+    self.statlock = threading.RLock()
+    self.accepted = 0
+    self.rejected = 0
+    self.results = []
+    self.event = threading.Event()
+
+  def uploadcallback(self, job, nonce, result):
+    self.results.append(result)
+    self.event.set()
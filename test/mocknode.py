@@ -0,0 +1,199 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+#####################################
+# Mock bitcoin node JSON RPC server #
+#####################################
+
+# Serves getblocktemplate, submitblock and getblockcount on a local port. Submitted blocks
+# are fully parsed and checked against the template: header, proof of work, merkle root,
+# transaction list and the BIP34 height push at the start of the coinbase script.
+
+
+import os
+import json
+import time
+import struct
+import hashlib
+import binascii
+import threading
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+except ImportError:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+
+
+def doublesha256(data):
+  return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+def readvarint(data, pos):
+  value = ord(data[pos:pos + 1])
+  if value < 0xfd: return (value, pos + 1)
+  if value == 0xfd: return (struct.unpack_from("<H", data, pos + 1)[0], pos + 3)
+  if value == 0xfe: return (struct.unpack_from("<I", data, pos + 1)[0], pos + 5)
+  return (struct.unpack_from("<Q", data, pos + 1)[0], pos + 9)
+
+# Returns the txid, input scripts and the position after the transaction
+def parsetransaction(data, pos):
+  start = pos
+  witness = data[pos + 4:pos + 6] == b"\0\1"
+  pos = pos + (6 if witness else 4)
+  (count, pos) = readvarint(data, pos)
+  scripts = []
+  for i in range(count):
+    (length, pos) = readvarint(data, pos + 36)
+    scripts.append(data[pos:pos + length])
+    pos = pos + length + 4
+  (count, pos) = readvarint(data, pos)
+  for i in range(count):
+    (length, pos) = readvarint(data, pos + 8)
+    pos = pos + length
+  witnessstart = pos
+  if witness:
+    for script in scripts:
+      (count, pos) = readvarint(data, pos)
+      for i in range(count):
+        (length, pos) = readvarint(data, pos)
+        pos = pos + length
+  stripped = data[start:start + 4] + data[start + (6 if witness else 4):witnessstart] + data[pos:pos + 4]
+  return (doublesha256(stripped), scripts, pos + 4)
+
+# What bitcoind's CScript() << height produces
+def heightpush(height):
+  if height == 0: return b"\0"
+  if height <= 16: return struct.pack("<B", 0x50 + height)
+  data = b""
+  while height > 0:
+    data = data + struct.pack("<B", height & 0xff)
+    height = height >> 8
+  if ord(data[-1:]) & 0x80: data = data + b"\0"
+  return struct.pack("<B", len(data)) + data
+
+
+class MockNode(object):
+  def __init__(self, height = 12345, longpoll = False, transactions = 3):
+    self.height = height
+    self.longpoll = longpoll
+    self.target = "7fffff" + "00" * 29
+    self.condition = threading.Condition()
+    self.prevhash = os.urandom(32)
+    self.transactions = [self.faketransaction(i) for i in range(transactions)]
+    self.templaterequests = 0
+    self.longpollrequests = 0
+    self.submitted = []
+    class Handler(MockNodeHandler): node = self
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self.port = self.server.server_address[1]
+    self.thread = threading.Thread(None, self.server.serve_forever, "mocknode")
+    self.thread.daemon = True
+    self.thread.start()
+
+  def close(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def faketransaction(self, index):
+    return struct.pack("<I", 1) + b"\1" + os.urandom(36) + b"\5" + os.urandom(5) + b"\xff\xff\xff\xff" \
+         + b"\1" + struct.pack("<Q", 1000 + index) + b"\3" + os.urandom(3) + b"\0\0\0\0"
+
+  # Moves the chain forward, answering pending long polls
+  def newblock(self):
+    with self.condition:
+      self.prevhash = os.urandom(32)
+      self.height = self.height + 1
+      self.condition.notify_all()
+
+  def template(self):
+    result = { \
+      "version": 0x20000000, \
+      "previousblockhash": binascii.hexlify(self.prevhash[::-1]).decode("ascii"), \
+      "transactions": [{"data": binascii.hexlify(tx).decode("ascii"), "txid": binascii.hexlify(doublesha256(tx)[::-1]).decode("ascii")} for tx in self.transactions], \
+      "coinbasevalue": 5000000000, \
+      "bits": "207fffff", \
+      "target": self.target, \
+      "height": self.height, \
+      "curtime": int(time.time()), \
+      "default_witness_commitment": "6a24aa21a9ed" + "11" * 32, \
+    }
+    if self.longpoll: result["longpollid"] = binascii.hexlify(self.prevhash).decode("ascii")
+    return result
+
+  def getblocktemplate(self, params):
+    with self.condition:
+      longpollid = params.get("longpollid")
+      if longpollid != None:
+        self.longpollrequests = self.longpollrequests + 1
+        while longpollid == binascii.hexlify(self.prevhash).decode("ascii"): self.condition.wait()
+      self.templaterequests = self.templaterequests + 1
+      return self.template()
+
+  # Returns None if the block is valid, or the reason for rejecting it
+  def checkblock(self, block):
+    header = block[:80]
+    if header[4:36] != self.prevhash: return "bad-prevblk"
+    if int(binascii.hexlify(doublesha256(header)[::-1]), 16) > int(self.target, 16): return "high-hash"
+    (count, pos) = readvarint(block, 80)
+    if count != len(self.transactions) + 1: return "bad-txns-count"
+    txids = []
+    for i in range(count):
+      (txid, scripts, pos) = parsetransaction(block, pos)
+      if i == 0: coinbasescript = scripts[0]
+      txids.append(txid)
+    if pos != len(block): return "bad-length"
+    if txids[1:] != [doublesha256(tx) for tx in self.transactions]: return "bad-txns"
+    while len(txids) > 1:
+      if len(txids) % 2 == 1: txids.append(txids[-1])
+      txids = [doublesha256(txids[i] + txids[i + 1]) for i in range(0, len(txids), 2)]
+    if txids[0] != header[36:68]: return "bad-txnmrklroot"
+    if not coinbasescript.startswith(heightpush(self.height)): return "bad-cb-height"
+    return None
+
+  def submitblock(self, data):
+    with self.condition:
+      result = self.checkblock(binascii.unhexlify(data.encode("ascii")))
+      self.submitted.append(result)
+      return result
+
+
+class MockNodeHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def log_message(self, *args): pass
+
+  def do_POST(self):
+    request = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf_8"))
+    (result, error) = (None, None)
+    if request["method"] == "getblocktemplate": result = self.node.getblocktemplate(request["params"][0])
+    elif request["method"] == "submitblock": result = self.node.submitblock(request["params"][0])
+    elif request["method"] == "getblockcount": result = self.node.height - 1
+    else: error = {"code": -32601, "message": "Method not found"}
+    body = json.dumps({"result": result, "error": error, "id": request["id"]}).encode("utf_8")
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
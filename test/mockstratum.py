@@ -0,0 +1,160 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+##################################
+# Stand-in stratum mining server #
+##################################
+
+# Speaks just enough of the stratum protocol for the stratum work source: subscribe,
+# authorize, set_difficulty, notify and submit. Every session gets its own extranonce1.
+# Submitted shares are checked by rebuilding the block header from the session's jobs.
+
+
+import os
+import json
+import time
+import socket
+import struct
+import hashlib
+import binascii
+import threading
+
+
+def doublesha256(data):
+  return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+class MockStratumSession(object):
+  def __init__(self, server, sock):
+    self.server = server
+    self.socket = sock
+    self.sendlock = threading.Lock()
+    self.extranonce1 = os.urandom(4)
+    self.jobs = {}
+    self.authorized = False
+
+  def send(self, message):
+    with self.sendlock: self.socket.sendall((json.dumps(message) + "\n").encode("utf_8"))
+
+  def run(self):
+    reader = self.socket.makefile("rb")
+    try:
+      while True:
+        line = reader.readline()
+        if len(line) == 0: break
+        self.handle(json.loads(line.decode("utf_8")))
+    except: pass
+    self.server.removesession(self)
+
+  def handle(self, message):
+    if message["method"] == "mining.subscribe":
+      self.send({"id": message["id"], "result": [[["mining.notify", "0"]], binascii.hexlify(self.extranonce1).decode("ascii"), 4], "error": None})
+    elif message["method"] == "mining.authorize":
+      self.send({"id": message["id"], "result": True, "error": None})
+      self.send({"id": None, "method": "mining.set_difficulty", "params": [self.server.difficulty]})
+      self.authorized = True
+      self.notify(self.server.job, True)
+    elif message["method"] == "mining.submit":
+      (result, error) = self.checkshare(*message["params"])
+      self.server.submitted.append((self.extranonce1, result, error))
+      self.send({"id": message["id"], "result": result, "error": error})
+
+  def notify(self, job, clean):
+    self.jobs[job["jobid"]] = job
+    params = [job["jobid"], binascii.hexlify(job["prevhash"]).decode("ascii"), binascii.hexlify(job["coinbase1"]).decode("ascii"), \
+              binascii.hexlify(job["coinbase2"]).decode("ascii"), [binascii.hexlify(branch).decode("ascii") for branch in job["branches"]], \
+              job["version"], job["nbits"], job["ntime"], clean]
+    self.send({"id": None, "method": "mining.notify", "params": params})
+
+  def checkshare(self, username, jobid, extranonce2, ntime, nonce):
+    job = self.jobs.get(jobid)
+    if job == None: return (None, [21, "Job not found", None])
+    merkleroot = doublesha256(job["coinbase1"] + self.extranonce1 + binascii.unhexlify(extranonce2.encode("ascii")) + job["coinbase2"])
+    for branch in job["branches"]: merkleroot = doublesha256(merkleroot + branch)
+    header = struct.pack("<I", int(job["version"], 16)) + struct.pack("<8I", *struct.unpack(">8I", job["prevhash"])) + merkleroot \
+           + struct.pack("<III", int(ntime, 16), int(job["nbits"], 16), int(nonce, 16))
+    if int(binascii.hexlify(doublesha256(header)[::-1]), 16) > 0xffff * 2**208 / self.server.difficulty: return (None, [23, "Low difficulty share", None])
+    return (True, None)
+
+
+class MockStratumServer(object):
+  def __init__(self, difficulty = 2**-24):
+    self.difficulty = difficulty
+    self.lock = threading.Lock()
+    self.sessions = []
+    self.submitted = []
+    self.jobid = 0
+    self.prevhash = os.urandom(32)
+    self.job = self.createjob()
+    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.socket.bind(("127.0.0.1", 0))
+    self.socket.listen(16)
+    self.port = self.socket.getsockname()[1]
+    thread = threading.Thread(None, self.listener, "mockstratum")
+    thread.daemon = True
+    thread.start()
+
+  def close(self):
+    self.socket.close()
+    self.dropsessions()
+
+  def listener(self):
+    while True:
+      try: (sock, address) = self.socket.accept()
+      except: return
+      session = MockStratumSession(self, sock)
+      with self.lock: self.sessions.append(session)
+      thread = threading.Thread(None, session.run, "mockstratum_session")
+      thread.daemon = True
+      thread.start()
+
+  def removesession(self, session):
+    with self.lock:
+      if session in self.sessions: self.sessions.remove(session)
+
+  def createjob(self):
+    self.jobid = self.jobid + 1
+    return { \
+      "jobid": "%x" % self.jobid, \
+      "prevhash": self.prevhash, \
+      "coinbase1": os.urandom(40), \
+      "coinbase2": os.urandom(30), \
+      "branches": [os.urandom(32) for i in range(3)], \
+      "version": "00000002", \
+      "nbits": "1a05db8b", \
+      "ntime": "%08x" % int(time.time()), \
+    }
+
+  # Sends a new job to all sessions. If newblock is set, it builds on a new previous block.
+  def notify(self, clean, newblock = False):
+    with self.lock:
+      if newblock: self.prevhash = os.urandom(32)
+      self.job = self.createjob()
+      sessions = [session for session in self.sessions if session.authorized]
+    for session in sessions: session.notify(self.job, clean)
+
+  # Closes all connections, like a server restart would
+  def dropsessions(self):
+    with self.lock: sessions = list(self.sessions)
+    for session in sessions:
+      try: session.socket.shutdown(socket.SHUT_RDWR)
+      except: pass
+      session.socket.close()
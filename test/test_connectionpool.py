@@ -0,0 +1,141 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+##############################
+# HTTP connection pool tests #
+##############################
+
+
+import sys
+import time
+import socket
+import threading
+import unittest
+import common
+from test.fakeminer import FakeMiner
+
+
+# Answers the first request on every connection. What happens to the second one depends on
+# the mode: "drop" closes the connection without answering (like a server that timed out the
+# idle connection just as it was reused), "stall" doesn't answer for a few seconds.
+class KeepAliveServer(object):
+  def __init__(self, mode):
+    self.mode = mode
+    self.requests = 0
+    self.lock = threading.Lock()
+    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.socket.bind(("127.0.0.1", 0))
+    self.socket.listen(16)
+    self.port = self.socket.getsockname()[1]
+    thread = threading.Thread(None, self.listener, "keepaliveserver")
+    thread.daemon = True
+    thread.start()
+
+  def close(self):
+    self.socket.close()
+
+  def listener(self):
+    while True:
+      try: (sock, address) = self.socket.accept()
+      except: return
+      thread = threading.Thread(None, self.handler, "keepaliveserver_connection", (sock,))
+      thread.daemon = True
+      thread.start()
+
+  def readrequest(self, file):
+    length = 0
+    while True:
+      line = file.readline()
+      if len(line) == 0: return False
+      if line.strip() == b"": break
+      if line.lower().startswith(b"content-length:"): length = int(line.split(b":")[1])
+    file.read(length)
+    with self.lock: self.requests = self.requests + 1
+    return True
+
+  def handler(self, sock):
+    file = sock.makefile("rb")
+    first = True
+    while self.readrequest(file):
+      if not first:
+        if self.mode == "drop": break
+        if self.mode == "stall": time.sleep(3)
+      first = False
+      sock.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+    file.close()
+    sock.close()
+
+
+class ConnectionPoolTest(unittest.TestCase):
+  def createpool(self, port):
+    return common.HTTPConnectionPool("127.0.0.1", port)
+
+  def request(self, pool, timeout = 1):
+    return pool.request("POST", "/", b"{}", {"Content-Type": "application/json"}, timeout)[1]
+
+  def server(self, mode):
+    server = KeepAliveServer(mode)
+    self.addCleanup(server.close)
+    return server
+
+  def test_retry_on_dropped_connection(self):
+    server = self.server("drop")
+    pool = self.createpool(server.port)
+    self.assertEqual(self.request(pool), b"ok")
+    self.assertEqual(self.request(pool), b"ok")
+    self.assertEqual(server.requests, 3)
+    self.assertEqual(pool.connects, 2)
+
+  # The server may be processing the request, sending it again could e.g. duplicate a share
+  def test_no_retry_on_timeout(self):
+    server = self.server("stall")
+    pool = self.createpool(server.port)
+    self.assertEqual(self.request(pool), b"ok")
+    starttime = time.time()
+    self.assertRaises(Exception, self.request, pool)
+    self.assertLess(time.time() - starttime, 2)
+    self.assertEqual(server.requests, 2)
+    self.assertEqual(pool.connects, 1)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "The async engine needs Python 3")
+class AsyncConnectionPoolTest(ConnectionPoolTest):
+  def createpool(self, port):
+    import asyncengine
+    return asyncengine.AsyncHTTPConnectionPool(asyncengine.getengine(FakeMiner()), "127.0.0.1", port)
+
+
+  # The loop serves all work sources, so a failing DNS lookup must not block it
+  def test_dns_failure_off_loop(self):
+    import asyncio
+    import asyncengine
+    calls = []
+    def resolve():
+      try:
+        asyncio.get_running_loop()
+        calls.append("loop")
+      except RuntimeError: calls.append("executor")
+      raise socket.gaierror("Lookup failed")
+    resolver = common.Resolver("mpbm.invalid", 80, refresh = False)
+    resolver.resolve = resolve
+    pool = asyncengine.AsyncHTTPConnectionPool(asyncengine.getengine(FakeMiner()), "mpbm.invalid", 80, resolver = resolver)
+    self.assertRaises(socket.gaierror, self.request, pool)
+    self.assertEqual(calls, ["executor"])
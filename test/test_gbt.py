@@ -0,0 +1,98 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+######################################
+# getblocktemplate work source tests #
+######################################
+
+
+import time
+import threading
+import unittest
+from pool.theseven import gbt
+from test.mocknode import MockNode
+from test.fakeminer import FakeMiner, FakeWorker, solve
+
+
+class GetBlockTemplateTest(unittest.TestCase):
+  def createpool(self, node, **options):
+    self.miner = FakeMiner()
+    options.update({"host": "127.0.0.1", "port": node.port, "address": "1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh"})
+    return gbt.GetBlockTemplatePool(self.miner, None, options)
+
+  def submit(self, height):
+    node = MockNode(height)
+    self.addCleanup(node.close)
+    pool = self.createpool(node)
+    job = pool.getwork()
+    worker = FakeWorker()
+    (data, nonce) = solve(job)
+    pool.sendresult(job, data, nonce, 1, worker)
+    self.assertTrue(worker.event.wait(5))
+    self.assertEqual(node.submitted, [None])
+    self.assertEqual(worker.results, [True])
+    self.assertEqual(pool.accepted, 1)
+
+  def test_pushnumber(self):
+    self.assertEqual(gbt.pushnumber(0), b"\0")
+    self.assertEqual(gbt.pushnumber(1), b"\x51")
+    self.assertEqual(gbt.pushnumber(16), b"\x60")
+    self.assertEqual(gbt.pushnumber(17), b"\1\x11")
+    self.assertEqual(gbt.pushnumber(128), b"\2\x80\0")
+    self.assertEqual(gbt.pushnumber(12345), b"\2\x39\x30")
+
+  def test_submit_block(self):
+    self.submit(12345)
+
+  # Regtest starts at height 1, where BIP34 needs OP_N instead of a data push
+  def test_submit_block_small_height(self):
+    for height in (1, 16, 17): self.submit(height)
+
+  def test_refresh_detects_new_block(self):
+    node = MockNode()
+    self.addCleanup(node.close)
+    pool = self.createpool(node, templaterefresh = 0.2)
+    pool.getwork()
+    time.sleep(0.3)
+    pool.getwork()
+    self.assertEqual(node.templaterequests, 2)
+    self.assertEqual(self.miner.newblocks, [])
+    node.newblock()
+    time.sleep(0.3)
+    # Concurrent fetchers must not refresh the template (and announce the block) more than once
+    threads = [threading.Thread(None, pool.getworkbatch, None, (2,)) for i in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    self.assertEqual(node.templaterequests, 3)
+    self.assertEqual(len(self.miner.newblocks), 1)
+    self.assertEqual(self.miner.newblocks[0][0].template["height"], node.height)
+
+  def test_longpoll_detects_new_block(self):
+    node = MockNode(longpoll = True)
+    self.addCleanup(node.close)
+    pool = self.createpool(node)
+    pool.getwork()
+    deadline = time.time() + 5
+    while node.longpollrequests == 0 and time.time() < deadline: time.sleep(0.01)
+    node.newblock()
+    while len(self.miner.newblocks) == 0 and time.time() < deadline: time.sleep(0.01)
+    self.assertEqual(len(self.miner.newblocks), 1)
+    self.assertEqual(self.miner.newblocks[0][0].template["height"], node.height)
@@ -0,0 +1,93 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+#############################
+# Stratum work source tests #
+#############################
+
+
+import time
+import unittest
+from pool.theseven import stratum
+from test.mockstratum import MockStratumServer
+from test.fakeminer import FakeMiner, FakeWorker, solve
+
+
+def waitfor(condition, timeout = 10):
+  deadline = time.time() + timeout
+  while not condition():
+    if time.time() > deadline: return False
+    time.sleep(0.01)
+  return True
+
+
+class StratumTest(unittest.TestCase):
+  def setUp(self):
+    self.server = MockStratumServer()
+    self.addCleanup(self.server.close)
+    self.miner = FakeMiner()
+    self.pool = stratum.StratumPool(self.miner, None, {"host": "127.0.0.1", "port": self.server.port})
+
+  def getwork(self):
+    self.assertTrue(waitfor(lambda: self.pool.longpolling == True and self.pool.template != None))
+    return self.pool.getwork()
+
+  def submit(self, job):
+    worker = FakeWorker()
+    (data, nonce) = solve(job)
+    self.pool.sendresult(job, data, nonce, job.difficulty, worker)
+    self.assertTrue(worker.event.wait(5))
+    return worker.results[0]
+
+  def test_submit_share(self):
+    self.assertEqual(self.submit(self.getwork()), True)
+    self.assertEqual(self.pool.accepted, 1)
+
+  def test_new_block(self):
+    job = self.getwork()
+    self.server.notify(True, True)
+    self.assertTrue(waitfor(lambda: len(self.miner.newblocks) == 1))
+    self.assertNotEqual(self.miner.newblocks[0][0].data[4:36], job.data[4:36])
+
+  # Servers also set clean_jobs if only the coinbase or the merkle branches changed
+  def test_clean_jobs_without_new_block(self):
+    job = self.getwork()
+    self.server.notify(True)
+    self.assertTrue(waitfor(lambda: len(self.miner.newblocks) == 1))
+    self.assertEqual(self.miner.newblocks[0][0].data[4:36], job.data[4:36])
+
+  def test_notify_without_clean_jobs(self):
+    self.getwork()
+    self.server.notify(False)
+    self.assertTrue(waitfor(lambda: self.pool.template["jobid"] == self.server.job["jobid"]))
+    self.assertEqual(self.miner.newblocks, [])
+    self.assertEqual(self.submit(self.pool.getwork()), True)
+
+  # Work from the old session is built on its extranonce1 and job IDs, which the new session rejects
+  def test_reconnect(self):
+    oldjob = self.getwork()
+    self.server.dropsessions()
+    self.assertTrue(waitfor(lambda: len(self.miner.newblocks) == 1))
+    self.assertEqual(self.miner.newblocks[0], (None, self.pool))
+    self.assertTrue(waitfor(lambda: self.pool.template != None and self.pool.extranonce1 != None))
+    self.assertNotEqual(self.submit(oldjob), True)
+    self.assertEqual(self.submit(self.pool.getwork()), True)
+    self.assertEqual(len(self.miner.newblocks), 1)
@@ -28,6 +28,7 @@
 #   deviceid: Serial number of the device to be used (default: take first available device)
 #   firmware: Path to the firmware file (default: "worker/fpgamining/firmware/x6500.bit")
 #   jobinterval: New work is sent to the device at least every that many seconds (default: 30)
+#   jobhistory: Number of recent jobs that found nonces are matched against (default: 3)
 #   pollinterval: Nonce poll interval in seconds (default: 0.1)
 #   useftd2xx: Use FTDI D2XX driver instead direct access via PyUSB (default: false)
 #   takeover: Forcibly grab control over the USB device (default: false, not supported by D2XX)
@@ -39,7 +40,6 @@ import common
 import binascii
 import threading
 import time
-import hashlib
 import struct
 import atexit
 from .util.ft232r import FT232R, FT232R_PyUSB, FT232R_D2XX, FT232R_PortList
@@ -87,6 +87,7 @@ class X6500Worker(object):
       self.dead = True
     self.firmware = getattr(self, "firmware", "worker/fpgamining/firmware/x6500.bit")
     self.jobinterval = getattr(self, "jobinterval", 30)
+    self.jobhistory = getattr(self, "jobhistory", 3)
     self.pollinterval = getattr(self, "pollinterval", 0.1)
     self.jobspersecond = 0  # Used by work buffering algorithm, we don't ever process jobs ourself
 
@@ -98,6 +99,7 @@ class X6500Worker(object):
     self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
     self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
     self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
     self.starttime = time.time()  # Start timestamp (to get average MH/s from MHashes)
 
     # Statistics lock, ensures that the UI can get a consistent statistics state
@@ -125,6 +127,7 @@ class X6500Worker(object):
         "accepted": self.accepted + self.miner.calculatefieldsum(childstats, "accepted"), \
         "rejected": self.rejected + self.miner.calculatefieldsum(childstats, "rejected"), \
         "invalid": self.invalid + self.miner.calculatefieldsum(childstats, "invalid"), \
+        "duplicates": self.duplicates + self.miner.calculatefieldsum(childstats, "duplicates"), \
         "starttime": self.starttime, \
         "currentpool": "Not applicable", \
       }
@@ -237,6 +240,7 @@ class X6500FPGA(object):
     # Fetch config information
     self.name = fpga.name
     self.jobinterval = parent.jobinterval
+    self.jobhistory = parent.jobhistory
     self.pollinterval = parent.pollinterval
     self.jobspersecond = 0  # Used by work buffering algorithm, we don't ever process jobs ourself
     
@@ -250,6 +254,7 @@ class X6500FPGA(object):
     self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
     self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
     self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
     self.starttime = time.time()  # Start timestamp (to get average MH/s from MHashes)
     self.temperature = None
 
@@ -260,6 +265,9 @@ class X6500FPGA(object):
     # Placeholder for device response listener thread (will be started after synchronization)
     self.listenerthread = None
 
+    # Ring of recently processed jobs, used to figure out which job a nonce belongs to
+    self.history = common.JobHistory(self.jobhistory)
+
     # Initialize wakeup flag for the main thread
     self.wakeup = threading.Condition()
 
@@ -283,6 +291,7 @@ class X6500FPGA(object):
         "accepted": self.accepted, \
         "rejected": self.rejected, \
         "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
         "starttime": self.starttime, \
         "temperature": self.temperature, \
         "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
@@ -334,6 +343,9 @@ class X6500FPGA(object):
         # Job that is currently being uploaded to the device but not yet being processed.
         self.nextjob = None
 
+        # Forget about jobs from before the restart, the device won't send nonces for them.
+        self.history.clear()
+
         # We keep control of the wakeup lock at all times unless we're sleeping
         self.wakeup.acquire()
         # Set validation success flag to false
@@ -493,14 +505,10 @@ class X6500FPGA(object):
       # Stop time measurement
       now = time.time()
       # Pass the nonce that we found to the work source, if there is one.
+      # It might belong to the job that is being uploaded or to a recently replaced one,
+      # the share verification threads will figure out which one it is.
       # Do this before calculating the hash rate as it is latency critical.
-      if oldjob != None:
-        if nextjob != None:
-          data = oldjob.data[:76] + nonce + oldjob.data[80:]
-          hash = hashlib.sha256(hashlib.sha256(struct.pack("<20I", *struct.unpack(">20I", data[:80]))).digest()).digest()
-          if hash[-4:] != b"\0\0\0\0": nextjob.sendresult(nonce, self)
-        else: oldjob.sendresult(nonce, self)
-      else: oldjob.sendresult(nonce, self)
+      self.history.sendresult(nonce, self, nextjob)
       if oldjob.check != None:
         # This is a validation job. Validate that the nonce is correct, and complain if not.
         if oldjob.check != nonce:
@@ -562,5 +570,6 @@ class X6500FPGA(object):
     # Acknowledge the job by moving it from nextjob to job
     self.job = self.nextjob
     self.job.starttime = now
+    self.history.add(self.job)
     self.nextjob = None
         
@@ -27,6 +27,7 @@
 #   name: Display name for this work source (default: "X6500 hotplug controller")
 #   firmware: Path to the firmware file (default: "worker/fpgamining/firmware/x6500.bit")
 #   jobinterval: New work is sent to the device at least every that many seconds (default: 30)
+#   jobhistory: Number of recent jobs that found nonces are matched against (default: 3)
 #   pollinterval: Nonce poll interval in seconds (default: 0.1)
 #   useftd2xx: Use FTDI D2XX driver instead direct access via PyUSB (default: false)
 #   takeover: Forcibly grab control over the USB device (default: true, requires PyUSB)
@@ -63,6 +64,7 @@ class X6500HotplugWorker(object):
     self.uploadfirmware = getattr(self, "uploadfirmware", False)
     self.firmware = getattr(self, "firmware", "worker/fpgamining/firmware/x6500.bit")
     self.jobinterval = getattr(self, "jobinterval", 30)
+    self.jobhistory = getattr(self, "jobhistory", 3)
     self.pollinterval = getattr(self, "pollinterval", 0.1)
     self.scaninterval = getattr(self, "scaninterval", 10)
     self.jobspersecond = 0  # Used by work buffering algorithm, we don't ever process jobs ourself
@@ -75,6 +77,7 @@ class X6500HotplugWorker(object):
     self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
     self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
     self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
     self.starttime = time.time() # Start timestamp (to get average MH/s from MHashes)
 
     # Statistics lock, ensures that the UI can get a consistent statistics state
@@ -101,6 +104,7 @@ class X6500HotplugWorker(object):
         "accepted": self.accepted + self.miner.calculatefieldsum(childstats, "accepted"), \
         "rejected": self.rejected + self.miner.calculatefieldsum(childstats, "rejected"), \
         "invalid": self.invalid + self.miner.calculatefieldsum(childstats, "invalid"), \
+        "duplicates": self.duplicates + self.miner.calculatefieldsum(childstats, "duplicates"), \
         "starttime": self.starttime, \
         "currentpool": "Not applicable", \
       }
@@ -138,6 +142,7 @@ class X6500HotplugWorker(object):
               self.accepted = self.accepted + stats["accepted"]
               self.rejected = self.rejected + stats["rejected"]
               self.invalid = self.invalid + stats["invalid"]
+              self.duplicates = self.duplicates + stats["duplicates"]
             
         boards = []
         if self.useftd2xx:
@@ -205,6 +210,7 @@ class X6500HotplugWorker(object):
               "deviceid": deviceid, \
               "firmware": self.firmware, \
               "jobinterval": self.jobinterval, \
+              "jobhistory": self.jobhistory, \
               "pollinterval": self.pollinterval, \
               "useftd2xx": self.useftd2xx, \
               "takeover": False, \
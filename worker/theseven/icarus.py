@@ -28,6 +28,7 @@
 #   port: Name (Windows) or device node (*nix) of the RS232 interface to use (default: "/dev/ttyUSBS0")
 #   baudrate: Baud rate that should be used (default: 115200)
 #   jobinterval: New work is sent to the device at least every that many seconds (default: 30)
+#   jobhistory: Number of recent jobs that found nonces are matched against (default: 3)
 
 
 import sys
@@ -59,6 +60,7 @@ class IcarusWorker(object):
     self.baudrate = getattr(self, "baudrate", 115200)
     self.name = getattr(self, "name", "Icarus board on " + self.port)
     self.jobinterval = getattr(self, "jobinterval", 30)
+    self.jobhistory = getattr(self, "jobhistory", 3)
     self.jobspersecond = 1. / self.jobinterval  # Used by work buffering algorithm
 
     # Initialize object properties (for statistics)
@@ -68,6 +70,7 @@ class IcarusWorker(object):
     self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
     self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
     self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
     self.starttime = time.time()  # Start timestamp (to get average MH/s from MHashes)
 
     # Statistics lock, ensures that the UI can get a consistent statistics state
@@ -77,6 +80,9 @@ class IcarusWorker(object):
     # Placeholder for device response listener thread (will be started after synchronization)
     self.listenerthread = None
 
+    # Ring of recently processed jobs, used to figure out which job a nonce belongs to
+    self.history = common.JobHistory(self.jobhistory)
+
     # Initialize wakeup flag for the main thread
     self.wakeup = threading.Condition()
 
@@ -100,6 +106,7 @@ class IcarusWorker(object):
         "accepted": self.accepted, \
         "rejected": self.rejected, \
         "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
         "starttime": self.starttime, \
         "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
       }
@@ -147,6 +154,9 @@ class IcarusWorker(object):
         # Job that is currently being uploaded to the device but not yet being processed.
         self.nextjob = None
 
+        # Forget about jobs from before the restart, the device won't send nonces for them.
+        self.history.clear()
+
         # Get handle for the serial port
         self.handle = serial.Serial(self.port, self.baudrate, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, 1, False, False, None, False, None)
 
@@ -275,8 +285,9 @@ class IcarusWorker(object):
         # Stop time measurement
         now = time.time()
         # Pass the nonce that we found to the work source, if there is one.
+        # It might belong to a recently replaced job, so check those as well.
         # Do this before calculating the hash rate as it is latency critical.
-        self.job.sendresult(nonce, self)
+        self.history.sendresult(nonce, self)
         # Calculate actual on-device processing time (not including transfer times) of the job.
         delta = (now - self.job.starttime) - 40. / self.baudrate
         # Calculate the hash rate based on the processing time and number of neccessary MHashes.
@@ -323,5 +334,6 @@ class IcarusWorker(object):
       self.job.starttime = None
     self.job = self.nextjob
     self.job.starttime = now
+    self.history.add(self.job)
     self.nextjob = None
     
\ No newline at end of file
@@ -0,0 +1,317 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+#####################################
+# NumPy CPU worker interface module #
+#####################################
+
+# Module configuration options:
+#   name: Display name for this worker (default: "NumPy CPU worker")
+#   processes: Number of hashing processes (default: number of CPU cores).
+#              If set to 0, hashing will be done by the worker thread itself.
+#   batchsize: Number of nonces that are hashed in one go (default: 262144)
+#   jobinterval: New work is fetched at least every that many seconds (default: 30)
+
+# This worker isn't meant to make any money, it is way too slow for that.
+# It allows testing and benchmarking the whole stack on machines without mining hardware.
+
+
+import common
+import numpy
+import binascii
+import multiprocessing
+import signal
+import threading
+import collections
+import time
+import struct
+
+
+# SHA-256 round constants and initial state
+K = [ \
+  0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5, \
+  0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174, \
+  0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da, \
+  0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967, \
+  0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85, \
+  0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070, \
+  0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3, \
+  0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2, \
+]
+IV = [0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]
+
+
+# The helpers below work on python integers as well as on numpy uint32 arrays.
+# Constant parts of the calculation are done on integers and only broadcast to arrays once they
+# get mixed with something that depends on the nonce.
+
+def rotr(x, n):
+  return ((x >> n) | (x << (32 - n))) & 0xffffffff
+
+# Integers are summed up first, otherwise their sum might not fit into an uint32 array element
+def add(*values):
+  result = 0
+  arrays = []
+  for value in values:
+    if isinstance(value, numpy.ndarray): arrays.append(value)
+    else: result = result + value
+  result = result & 0xffffffff
+  for value in arrays: result = result + value
+  return result & 0xffffffff
+
+def expand(w, count):
+  for i in range(len(w), count):
+    s0 = rotr(w[i - 15], 7) ^ rotr(w[i - 15], 18) ^ (w[i - 15] >> 3)
+    s1 = rotr(w[i - 2], 17) ^ rotr(w[i - 2], 19) ^ (w[i - 2] >> 10)
+    w.append(add(w[i - 16], s0, w[i - 7], s1))
+  return w
+
+def rounds(state, w, first, last):
+  (a, b, c, d, e, f, g, h) = state
+  for i in range(first, last):
+    t1 = add(h, rotr(e, 6) ^ rotr(e, 11) ^ rotr(e, 25), (e & f) ^ ((e ^ 0xffffffff) & g), K[i], w[i])
+    t2 = add(rotr(a, 2) ^ rotr(a, 13) ^ rotr(a, 22), (a & b) ^ (a & c) ^ (b & c))
+    (a, b, c, d, e, f, g, h) = (add(t1, t2), a, b, c, add(d, t1), e, f, g)
+  return [a, b, c, d, e, f, g, h]
+
+
+# Prepares the nonce independent part of the work: The midstate covers the first block of the
+# header, and the first three rounds of the second block only depend on data that doesn't change.
+def precompute(state, data):
+  midstate = list(struct.unpack("<8I", state))
+  w = list(struct.unpack("<3I", data[64:76]))
+  return (midstate, w, rounds(midstate, w + [0] * 61, 0, 3))
+
+
+# Hashes count nonces starting at start and returns the ones whose hash ends with 32 zero bits.
+# This is a module level function to allow calling it from a multiprocessing pool.
+def scanhash(midstate, w, precomputed, start, count):
+  nonces = numpy.arange(start, start + count, dtype = numpy.uint64).astype(numpy.uint32)
+  # Second block of the first hash: Nonce goes into word 3, followed by padding
+  w = expand(w + [nonces, 0x80000000, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 640], 64)
+  state = rounds(precomputed, w, 3, 64)
+  state = [add(x, y) for x, y in zip(midstate, state)]
+  # Second hash, over the 32 byte result of the first one. Only the last state word matters, and
+  # that one is already known after round 60, so the last three rounds can be skipped.
+  w = expand(state + [0x80000000, 0, 0, 0, 0, 0, 0, 256], 61)
+  state = rounds(IV, w, 0, 61)
+  found = nonces[add(state[4], IV[7]) == 0]
+  return [int(nonce) for nonce in found]
+
+
+# Keeps children from complaining about Ctrl+C, the main process will take care of that
+def initprocess():
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# Stand-in for multiprocessing's AsyncResult if hashing is done by the worker thread itself
+class ImmediateResult(object):
+  def __init__(self, result):
+    self.result = result
+
+  def get(self):
+    return self.result
+
+
+# Worker main class, referenced from config.py
+class NumPyCPUWorker(object):
+
+  # Constructor, gets passed a reference to the miner core and the config dict for this worker
+  def __init__(self, miner, dict):
+
+    # Make config dict entries accessible via self.foo
+    self.__dict__ = dict
+
+    # Store reference to the miner core object
+    self.miner = miner
+
+    # Initialize child array (we won't ever have any)
+    self.children = []
+
+    # Validate arguments, filling them with default values if not present
+    self.name = getattr(self, "name", "NumPy CPU worker")
+    self.processes = getattr(self, "processes", multiprocessing.cpu_count())
+    self.batchsize = getattr(self, "batchsize", 262144)
+    self.jobinterval = getattr(self, "jobinterval", 30)
+    self.jobspersecond = 1. / self.jobinterval  # Used by work buffering algorithm
+    self.noncerange = True  # We can process jobs which cover only part of the nonce range
+
+    # Initialize object properties (for statistics)
+    self.mhps = 0          # Current MH/s
+    self.mhashes = 0       # Total megahashes calculated since startup
+    self.jobsaccepted = 0  # Total jobs accepted
+    self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
+    self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
+    self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
+    self.starttime = time.time()  # Start timestamp (to get average MH/s from MHashes)
+
+    # Statistics lock, ensures that the UI can get a consistent statistics state
+    # Needs to be acquired during all operations that affect the above values
+    self.statlock = threading.RLock()
+
+    # Job that is currently being processed and job cancellation (long poll) flag
+    self.job = None
+    self.canceled = False
+
+    # Hashing processes, started by the main thread
+    self.processpool = None
+
+    # Start main thread (fetches work and distributes it to the hashing processes)
+    self.mainthread = threading.Thread(None, self.main, self.name + "_main")
+    self.mainthread.daemon = True
+    self.mainthread.start()
+
+
+  # Report statistics about this worker module and its (non-existant) children.
+  def getstatistics(self, childstats):
+    # Acquire the statistics lock to stop statistics from changing while we deal with them
+    with self.statlock:
+      # Calculate statistics
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "mhashes": self.mhashes, \
+        "mhps": self.mhps, \
+        "jobsaccepted": self.jobsaccepted, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
+        "starttime": self.starttime, \
+        "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
+      }
+    # Return result
+    return statistics
+
+
+  # This function should interrupt processing of the current piece of work if possible.
+  # We check the flag after every batch, so this takes effect within a fraction of a second.
+  def cancel(self, blockchain):
+    job = self.job
+    if job != None and job.pool != None and job.pool.blockchain == blockchain:
+      self.canceled = True
+
+
+  # Hands a batch of nonces to the hashing processes (or hashes it right away)
+  def dispatch(self, precomputed, start, count):
+    if self.processpool == None: return ImmediateResult(scanhash(*(precomputed + (start, count))))
+    return self.processpool.apply_async(scanhash, precomputed + (start, count))
+
+
+  # Hashes a job until the job interval expires, the job gets canceled or the nonce range
+  # has been exhausted. Returns the number of hashes calculated.
+  def hashjob(self, job, start, end, deadline):
+    precomputed = precompute(job.state, job.data)
+    pending = collections.deque()
+    hashes = 0
+    position = start
+    lasttime = time.time()
+    while True:
+      # Keep enough batches in flight to keep all processes busy
+      while not self.canceled and position < end and len(pending) < max(2, 2 * self.processes) and time.time() < deadline:
+        count = min(self.batchsize, end - position)
+        pending.append((count, self.dispatch(precomputed, position, count)))
+        position = position + count
+      if len(pending) == 0: return hashes
+      (count, result) = pending.popleft()
+      for found in result.get():
+        nonce = struct.pack("<I", found)
+        # Validation jobs don't have a work source, just remember what we found for those
+        if job.check != None: self.checknonces.append(nonce)
+        else: job.sendresult(nonce, self)
+      hashes = hashes + count
+      # Update hash rate measurement, averaged over the last couple of batches
+      now = time.time()
+      if now > lasttime:
+        weight = min(1, (now - lasttime) / 3.)
+        self.mhps = (1 - weight) * self.mhps + weight * count / 1000000. / (now - lasttime)
+        lasttime = now
+
+
+  # Main thread entry point
+  # This thread is responsible for fetching work and distributing it to the hashing processes.
+  def main(self):
+
+    # Loop forever. If anything fails, restart.
+    while True:
+      try:
+
+        # Initialize megahashes per second to zero, will be measured later.
+        self.mhps = 0
+        self.job = None
+
+        # Start the hashing processes
+        if self.processes > 0 and self.processpool == None:
+          self.processpool = multiprocessing.Pool(self.processes, initprocess)
+
+        # Validate that hashing works correctly using the genesis block, and measure hash rate
+        state = binascii.unhexlify(b"339a90bcf0bf58637daccc90a8ca591ee9d8c8c3c803014f3687b1961bf91947")
+        data = binascii.unhexlify(b"000000010000000000000000000000000000000000000000000000000000000000000000fdeda33bb2127b7a3e2cc77a618f7667c31bc87f32518a88aab89f3a4a5e1e4b495fab291d00ffff7c2bac1d000000800000000000000000000000000000000000000000000000000000000000000000000000000000000080020000")
+        check = struct.unpack("<I", data[76:80])[0]
+        start = max(0, check - self.batchsize * max(1, self.processes))
+        self.canceled = False
+        self.checknonces = []
+        job = common.Job(self.miner, None, None, state, data, None, data[76:80])
+        begin = time.time()
+        hashes = self.hashjob(job, start, check + 1, float("inf"))
+        if self.checknonces != [job.check]:
+          raise Exception("Hashing is not working correctly (returned %s instead of %s)" % (b", ".join(binascii.hexlify(nonce) for nonce in self.checknonces).decode("ascii"), binascii.hexlify(job.check).decode("ascii")))
+        self.mhps = hashes / 1000000. / (time.time() - begin)
+        self.miner.log(self.name + ": Running at %f MH/s\n" % self.mhps, "B")
+        self.miner.updatehashrate(self)
+
+        # Main loop, continues until something goes wrong.
+        while True:
+
+          # Fetch a job. Blocks until one is available.
+          self.canceled = False
+          job = self.miner.getjob(self)
+          # Doesn't need acquisition of the statlock because we're the only one who modifies this.
+          self.jobsaccepted = self.jobsaccepted + 1
+
+          # If a new block was found while we were fetching that job,
+          # check the long poll epoch to verify that the work that we got isn't stale.
+          # If it is, just discard it and get a new one.
+          if self.canceled == True:
+            if job.longpollepoch != job.pool.blockchain.longpollepoch: continue
+          self.canceled = False
+
+          # Hash its nonce range until it's time to get a new one, and credit the work to the work source
+          self.job = job
+          job.starttime = time.time()
+          hashes = self.hashjob(job, job.startnonce, job.endnonce, job.starttime + self.jobinterval)
+          job.finish(hashes / 1000000., self)
+          job.starttime = None
+
+      # If something went wrong...
+      except Exception as e:
+        # ...complain about it!
+        self.miner.log(self.name + ": %s\n" % e, "rB")
+        # We're not doing productive work any more, update stats
+        self.mhps = 0
+        # Throw away the hashing processes, they might be in a bad state
+        try: self.processpool.terminate()
+        except: pass
+        self.processpool = None
+        # Wait for a second to avoid 100% CPU load if something fails reproducibly
+        time.sleep(1)
+        # Restart (handled by "while True:" loop above)
@@ -0,0 +1,243 @@
+# Modular Python Bitcoin Miner
+# Copyright (C) 2011-2012 Michael Sparmann (TheSeven)
+#
+#     This program is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 2
+#     of the License, or (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, write to the Free Software
+#     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# Please consider donating to 1PLAPWDejJPJnY2ppYCgtw5ko8G5Q4hPzh if you
+# want to support further development of the Modular Python Bitcoin Miner.
+
+
+###########################################
+# Synthetic load generating worker module #
+###########################################
+
+# Module configuration options:
+#   name: Display name for this worker (default: "Synthetic worker")
+#   hashrate: Hash rate that this worker pretends to have, in MH/s (default: 1000)
+#   jobinterval: New work is fetched every that many seconds (default: 30)
+#   sharespersecond: Number of shares that are produced per second (default: 10). With 0, the
+#                    worker only fetches jobs and accounts for the hashes it pretends to do.
+#   invalidfraction: Fraction of the produced shares that will be invalid (default: 0)
+#   blockfraction: Fraction of the valid shares that will be handled as block solutions
+#                  (default: 0)
+#   testpools: Names of work sources that may get shares even though they don't run on this
+#              machine (default: none). Shares are only produced for work on localhost otherwise.
+
+# This worker doesn't hash anything. It is meant for stress testing the share handling
+# of the MPBM core and work source modules, e.g. against a local test pool.
+# Valid shares are produced by replaying the headers of some early blocks of the bitcoin
+# blockchain (whose nonces are known), with the target of the work source's job attached.
+# Those shares will pass MPBM's own checks, but a real pool will of course reject them,
+# which would hurt its score. That's why only test pools get any shares.
+# Invalid shares are produced by sending random nonces for the actual job.
+
+
+import common
+import binascii
+import threading
+import random
+import time
+import struct
+
+
+# Midstates and headers (in getwork byte order) of blocks 0 to 3
+winners = [ \
+  (b"339a90bcf0bf58637daccc90a8ca591ee9d8c8c3c803014f3687b1961bf91947", b"000000010000000000000000000000000000000000000000000000000000000000000000fdeda33bb2127b7a3e2cc77a618f7667c31bc87f32518a88aab89f3a4a5e1e4b495fab291d00ffff7c2bac1d"), \
+  (b"2313f6a9302abb7fd4a26c066978617de00ebdcc757b75286f64f25fac01750e", b"000000010a8ce26f72b3f1b646a2a6c14ff763ae65831e939c085ae10019d66800000000fd51209844a74b1e0e68bebb6714ee1fc3a3a17bb1f70b54e806b6cd0e3e23574966bc611d00ffff9962e301"), \
+  (b"cc0e0fbc8efbb56de6fef9fc0fa3d4badd0535e20620a0c96407e432740ebd66", b"0000000118eb604820161bbf90947ee375428afcd76f411486ab5951839a8e680000000054ccfdd51cde251eeddd5a7ab85848f29f5c66bb4e74ef3660312ce49b0fc9224966bcb01d00ffff61bdd208"), \
+  (b"7ad1482f5524b222391529b71abd2184c5da9d0fdd9fce34ad3b5c707960f5d2", b"00000001cc99ddbda19da3fd1ace08b18d03705dac7b960a636b8bb66a625f06000000002272f6445dd89060fbf2a9b9960f5ffeaf87b309fbb7e57b7c76a1b7999e1c834966be5d1d00ffff6dede005"), \
+]
+winners = [(binascii.unhexlify(state), binascii.unhexlify(data)) for state, data in winners]
+
+# SHA-256 padding of an 80 byte header, in getwork byte order
+padding = binascii.unhexlify(b"000000800000000000000000000000000000000000000000000000000000000000000000000000000000000080020000")
+
+
+# Worker main class, referenced from config.py
+class SyntheticWorker(object):
+
+  # Constructor, gets passed a reference to the miner core and the config dict for this worker
+  def __init__(self, miner, dict):
+
+    # Make config dict entries accessible via self.foo
+    self.__dict__ = dict
+
+    # Store reference to the miner core object
+    self.miner = miner
+
+    # Initialize child array (we won't ever have any)
+    self.children = []
+
+    # Validate arguments, filling them with default values if not present
+    self.name = getattr(self, "name", "Synthetic worker")
+    self.hashrate = getattr(self, "hashrate", 1000)
+    self.jobinterval = getattr(self, "jobinterval", 30)
+    self.sharespersecond = max(0, getattr(self, "sharespersecond", 10))
+    self.invalidfraction = getattr(self, "invalidfraction", 0)
+    self.blockfraction = getattr(self, "blockfraction", 0)
+    self.testpools = getattr(self, "testpools", [])
+    self.jobspersecond = 1. / self.jobinterval  # Used by work buffering algorithm
+    self.noncerange = True  # We can process jobs which cover only part of the nonce range
+
+    # Initialize object properties (for statistics)
+    self.mhps = 0          # Current MH/s
+    self.mhashes = 0       # Total megahashes calculated since startup
+    self.jobsaccepted = 0  # Total jobs accepted
+    self.accepted = 0      # Number of accepted shares produced by this worker * difficulty
+    self.rejected = 0      # Number of rejected shares produced by this worker * difficulty
+    self.invalid = 0       # Number of invalid shares produced by this worker
+    self.duplicates = 0    # Number of duplicate shares produced by this worker
+    self.starttime = time.time()  # Start timestamp (to get average MH/s from MHashes)
+
+    # Statistics lock, ensures that the UI can get a consistent statistics state
+    # Needs to be acquired during all operations that affect the above values
+    self.statlock = threading.RLock()
+
+    # Job that is currently being processed and job cancellation (long poll) flag
+    self.job = None
+    self.canceled = False
+
+    # Work sources that we refused to send shares to
+    self.refused = set()
+
+    # Initialize wakeup flag for the main thread
+    self.wakeup = threading.Condition()
+
+    # Start main thread (fetches work and produces shares)
+    self.mainthread = threading.Thread(None, self.main, self.name + "_main")
+    self.mainthread.daemon = True
+    self.mainthread.start()
+
+
+  # Report statistics about this worker module and its (non-existant) children.
+  def getstatistics(self, childstats):
+    # Acquire the statistics lock to stop statistics from changing while we deal with them
+    with self.statlock:
+      # Calculate statistics
+      statistics = { \
+        "name": self.name, \
+        "children": childstats, \
+        "mhashes": self.mhashes, \
+        "mhps": self.mhps, \
+        "jobsaccepted": self.jobsaccepted, \
+        "accepted": self.accepted, \
+        "rejected": self.rejected, \
+        "invalid": self.invalid, \
+        "duplicates": self.duplicates, \
+        "starttime": self.starttime, \
+        "currentpool": self.job.pool.name if self.job != None and self.job.pool != None else None, \
+      }
+    # Return result
+    return statistics
+
+
+  # This function should interrupt processing of the current piece of work if possible.
+  # This function is usually called when the work source gets a long poll response.
+  # If we're currently doing work for a different blockchain, we don't need to care.
+  def cancel(self, blockchain):
+    with self.wakeup:
+      if self.job != None and self.job.pool != None and self.job.pool.blockchain == blockchain:
+        self.canceled = True
+        self.wakeup.notify()
+
+
+  # Checks whether the work source is a test pool that may get our shares
+  def istestpool(self, pool):
+    if pool.name in self.testpools: return True
+    host = getattr(pool, "host", "").lower()
+    return host == "localhost" or host.startswith("127.") or host == "::1"
+
+
+  # Produces a single share for the specified job
+  def sendshare(self, job):
+    if random.random() < self.invalidfraction:
+      job.sendresult(struct.pack("<I", random.randrange(job.startnonce, job.endnonce)), self)
+    else:
+      (state, data) = random.choice(winners)
+      share = common.Job(self.miner, job.pool, job.longpollepoch, state, data + padding, job.target)
+      # The replayed headers are actual blocks, only the selected fraction should be treated as such
+      if random.random() >= self.blockfraction: share.blocktargetvalue = 0
+      share.sendresult(data[76:80], self)
+
+
+  # Main thread entry point
+  # This thread is responsible for fetching work and producing shares for it.
+  def main(self):
+
+    # Loop forever. If anything fails, restart.
+    while True:
+      try:
+
+        self.job = None
+        self.mhps = self.hashrate
+        self.miner.updatehashrate(self)
+
+        # We keep control of the wakeup lock at all times unless we're sleeping
+        self.wakeup.acquire()
+
+        # Main loop, continues until something goes wrong.
+        while True:
+
+          # Fetch a job. Blocks until one is available. Because of this we need to release the
+          # wake lock temporarily in order to avoid possible deadlocks.
+          self.canceled = False
+          self.wakeup.release()
+          job = self.miner.getjob(self)
+          # Doesn't need acquisition of the statlock because we're the only one who modifies this.
+          self.jobsaccepted = self.jobsaccepted + 1
+          self.wakeup.acquire()
+
+          # If a new block was found while we were fetching that job,
+          # check the long poll epoch to verify that the work that we got isn't stale.
+          # If it is, just discard it and get a new one.
+          if self.canceled == True:
+            if job.longpollepoch != job.pool.blockchain.longpollepoch: continue
+          self.canceled = False
+
+          # Produce shares at the configured rate until the job interval expires or
+          # the job gets canceled. Shares are sent in bursts to allow for high share rates.
+          self.job = job
+          job.starttime = time.time()
+          end = job.starttime + self.jobinterval
+          sent = 0
+          # Pretend that we hashed without finding anything if this isn't a test pool
+          testpool = self.istestpool(job.pool)
+          if not testpool and job.pool not in self.refused:
+            self.refused.add(job.pool)
+            self.miner.log("%s: %s isn't a test pool, not sending any shares to it\n" % (self.name, job.pool.name), "rB")
+          while not self.canceled:
+            now = time.time()
+            due = int((min(now, end) - job.starttime) * self.sharespersecond) if testpool else 0
+            while sent < due:
+              self.sendshare(job)
+              sent = sent + 1
+            if now >= end: break
+            if self.sharespersecond == 0 or not testpool: self.wakeup.wait(end - now)
+            else: self.wakeup.wait(min(end - now, max(0.01, 1. / self.sharespersecond)))
+          job.finish((time.time() - job.starttime) * self.mhps, self)
+          job.starttime = None
+
+      # If something went wrong...
+      except Exception as e:
+        # ...complain about it!
+        self.miner.log(self.name + ": %s\n" % e, "rB")
+        # We're not doing productive work any more, update stats
+        self.mhps = 0
+        # Release the wake lock. Ignore it if that goes wrong.
+        try: self.wakeup.release()
+        except: pass
+        # Wait for a second to avoid 100% CPU load if something fails reproducibly
+        time.sleep(1)
+        # Restart (handled by "while True:" loop above)